@@ -0,0 +1,92 @@
+"""
+Локальные заменители внешних API для бенчмарков (meteosource, exchangerate-api)
+с настраиваемой задержкой и долей ошибок. Redis в памяти — общий с тестами
+tests.fakes.FakeRedis.
+"""
+import asyncio
+import random
+
+import httpx
+
+
+def weather_payload(hours: int = 48, days: int = 7) -> dict:
+    """Ответ meteosource с sections=all примерно реального размера."""
+    return {
+        "current": {
+            "temperature": 18.2,
+            "summary": "Partly cloudy",
+            "icon_num": 3,
+            "wind": {"speed": 4.1, "dir": "NW", "angle": 310},
+            "cloud_cover": 40,
+            "precipitation": {"total": 0.0, "type": "none"},
+        },
+        "hourly": {
+            "data": [
+                {
+                    "date": f"2024-01-{1 + h // 24:02d}T{h % 24:02d}:00:00",
+                    "weather": "partly_cloudy",
+                    "icon": 3,
+                    "summary": "Partly cloudy",
+                    "temperature": 15 + (h % 10) * 0.5,
+                    "wind": {"speed": 3.5, "dir": "W", "angle": 270},
+                    "cloud_cover": {"total": 40},
+                    "precipitation": {"total": 0.1 * (h % 3), "type": "rain"},
+                }
+                for h in range(hours)
+            ]
+        },
+        "daily": {
+            "data": [
+                {
+                    "day": f"2024-01-{d + 1:02d}",
+                    "weather": "partly_cloudy",
+                    "icon": 3,
+                    "summary": "Partly cloudy, temperature 10/20 °C.",
+                    "all_day": {
+                        "weather": "partly_cloudy",
+                        "icon": 3,
+                        "temperature": 15,
+                        "temperature_min": 10 + d,
+                        "temperature_max": 20 + d,
+                        "wind": {"speed": 3.0, "dir": "W", "angle": 270},
+                        "cloud_cover": {"total": 40},
+                        "precipitation": {"total": 0.5, "type": "rain"},
+                    },
+                }
+                for d in range(days)
+            ]
+        },
+    }
+
+
+CURRENCIES = ["USD", "EUR", "GBP", "JPY", "CHF", "CNY", "RUB", "TRY", "KZT", "AMD"]
+
+
+def rates_payload(base: str) -> dict:
+    rng = random.Random(base)
+    return {"base_code": base, "conversion_rates": {c: 1 if c == base else round(rng.uniform(0.01, 100), 4) for c in CURRENCIES}}
+
+
+class FakeUpstream:
+    """
+    Обработчик для httpx.MockTransport: отвечает за оба внешних API,
+    добавляя задержку latency (сек) и ошибки 503 с вероятностью error_rate.
+    """
+
+    def __init__(self, latency: float = 0.05, error_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._weather = weather_payload()
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.error_rate and self._rng.random() < self.error_rate:
+            return httpx.Response(503, json={"error": "unavailable"})
+        if "meteosource" in request.url.host:
+            return httpx.Response(200, json=self._weather)
+        base = request.url.path.rsplit("/", 1)[-1]
+        return httpx.Response(200, json=rates_payload(base))
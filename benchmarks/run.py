@@ -0,0 +1,286 @@
+"""
+Нагрузочные сценарии и микробенчмарки.
+
+Настоящее FastAPI-приложение гоняется через httpx.ASGITransport,
+внешние API заменены FakeUpstream (задержка и доля ошибок настраиваются),
+Redis — tests.fakes.FakeRedis (Lua-скрипты квот и локов выполняются). Результаты пишутся в JSON, чтобы сравнивать прогоны:
+
+    python -m benchmarks.run --output benchmarks/results/after.json \
+        --compare benchmarks/results/before.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from pathlib import Path
+
+import httpx
+
+from benchmarks.fakes import CURRENCIES, FakeUpstream, weather_payload
+from src.core.config import settings
+from src.main import app
+from src.services.forecast import ForecastSeries
+from src.services.weather_service import shape_weather
+from src.utils import codec, utils
+from src.utils.refresh import make_entry
+from tests.fakes import FakeRedis
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies: list[float], wall: float, upstream_calls: int, errors: int) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "upstream_calls": upstream_calls,
+        "throughput_rps": round(len(latencies) / wall, 1) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+class Harness:
+    def __init__(self, latency: float, error_rate: float, concurrency: int):
+        self.upstream = FakeUpstream(latency=latency, error_rate=error_rate)
+        self.redis = FakeRedis()
+        self.concurrency = concurrency
+
+    def reset(self):
+        self.redis.store.clear()
+        self.redis.published.clear()
+        utils.local_cache.clear()
+        utils.fallback_cache.clear()
+        utils.redis_health.reset()
+        self.upstream.calls = 0
+
+    async def drive(self, client: httpx.AsyncClient, requests: list[tuple[str, dict]]) -> dict:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        latencies = []
+        errors = 0
+
+        async def one(path, params):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(path, params=params)
+                latencies.append(time.perf_counter() - start)
+                if response.status_code >= 400:
+                    errors += 1
+
+        calls_before = self.upstream.calls
+        start = time.perf_counter()
+        await asyncio.gather(*(one(path, params) for path, params in requests))
+        wall = time.perf_counter() - start
+        return summarize(latencies, wall, self.upstream.calls - calls_before, errors)
+
+
+def weather_requests(cities: list[str]) -> list[tuple[str, dict]]:
+    return [("/weather", {"city": city}) for city in cities]
+
+
+def currency_requests(n: int, rng: random.Random) -> list[tuple[str, dict]]:
+    return [
+        ("/currency", {"from_cur": rng.choice(CURRENCIES), "to": rng.choice(CURRENCIES), "amount": 100})
+        for _ in range(n)
+    ]
+
+
+async def run_scenarios(args) -> dict:
+    harness = Harness(args.latency, args.error_rate, args.concurrency)
+    # квоты бесплатных тарифов не должны ограничивать прогон
+    for provider in ("weather", "currency"):
+        setattr(settings, f"{provider}_minute_quota", 10**9)
+        setattr(settings, f"{provider}_daily_quota", 10**9)
+    settings.rate_history_dir = tempfile.mkdtemp(prefix="bench-rate-history-")
+    utils._redis_client = harness.redis
+    app.state.http_transport = httpx.MockTransport(harness.upstream)
+    rng = random.Random(args.seed)
+
+    results = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            # cold: каждый запрос — новый город, всё идёт во внешний API
+            harness.reset()
+            cities = [f"city-{i}" for i in range(args.requests)]
+            results["weather_cold"] = await harness.drive(client, weather_requests(cities))
+
+            # warm: горячий набор городов уже в кэше
+            hot = [f"city-{i}" for i in range(args.hot_keys)]
+            harness.reset()
+            await harness.drive(client, weather_requests(hot))
+            picks = [rng.choice(hot) for _ in range(args.requests)]
+            results["weather_warm"] = await harness.drive(client, weather_requests(picks))
+
+            # stampede: ключ только что истёк, все запросы одновременно за одним городом
+            harness.reset()
+            results["weather_stampede"] = await harness.drive(
+                client, weather_requests(["moscow"] * args.requests)
+            )
+
+            harness.reset()
+            results["currency_cold"] = await harness.drive(client, currency_requests(args.requests, rng))
+            results["currency_warm"] = await harness.drive(client, currency_requests(args.requests, rng))
+
+    return results
+
+
+def micro_benchmarks(number: int) -> dict:
+    payload = weather_payload()
+    shaped = shape_weather("moscow", payload)
+    entry = make_entry(shaped, 1800)
+    encoded = codec.encode(entry)
+    series = ForecastSeries.from_payload("hourly", payload).pack()
+
+    def per_call_us(fn) -> float:
+        return round(min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6, 3)
+
+    return {
+        "shape_weather_us": per_call_us(lambda: shape_weather("moscow", payload)),
+        "cache_encode_us": per_call_us(lambda: codec.encode(entry)),
+        "cache_decode_us": per_call_us(lambda: codec.decode(encoded)),
+        "cache_entry_bytes": len(encoded),
+        "cache_codec": settings.cache_codec,
+        # полный почасовой ряд: колоночный блок против исходного JSON
+        "forecast_hourly_bytes": len(series),
+        "forecast_hourly_json_bytes": len(json.dumps(payload["hourly"]["data"])),
+        "forecast_slice_us": per_call_us(
+            lambda: (lambda s: s.to_columns(s.window(0, 24)))(ForecastSeries.unpack(series))
+        ),
+    }
+
+
+# запускается в отдельном интерпретаторе: импорт приложения и его lifespan startup;
+# с preload — как у воркера python -m src.serve, которому мастер всё загрузил до fork
+_STARTUP_SCRIPT = """
+import asyncio, json, sys, time
+start = time.perf_counter()
+if sys.argv[1] == "preload":
+    from src.serve import preload
+    preload()
+from src.main import app
+imported = time.perf_counter()
+
+async def startup():
+    async with app.router.lifespan_context(app):
+        return time.perf_counter()
+
+ready = asyncio.run(startup())
+print(json.dumps({"import": imported - start, "lifespan": ready - imported}))
+"""
+
+
+def _cold_start(mode: str, env: dict) -> tuple[float, dict]:
+    start = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, "-c", _STARTUP_SCRIPT, mode], env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return time.perf_counter() - start, json.loads(out.strip().splitlines()[-1])
+
+
+def startup_benchmarks(runs: int) -> dict:
+    """Холодный старт процесса API: медианы по runs запускам, миллисекунды."""
+    env = {
+        **os.environ,
+        # без фоновых задач и файлов снимка — меряем только сам старт
+        "SNAPSHOT_ENABLED": "false",
+        "PREWARM_ENABLED": "false",
+        "L1_INVALIDATION": "false",
+    }
+    samples = {name: [] for name in ("process", "import_app", "lifespan_startup", "preload", "worker_lifespan")}
+    for _ in range(runs):
+        total, result = _cold_start("plain", env)
+        samples["process"].append(total)
+        samples["import_app"].append(result["import"])
+        samples["lifespan_startup"].append(result["lifespan"])
+        _, result = _cold_start("preload", env)
+        samples["preload"].append(result["import"])
+        samples["worker_lifespan"].append(result["lifespan"])
+    return {f"{name}_ms": round(statistics.median(values) * 1000, 1) for name, values in samples.items()}
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def compare(current: dict, baseline: dict) -> list[str]:
+    lines = []
+    for section in ("scenarios", "micro", "startup"):
+        for name, values in current.get(section, {}).items():
+            old = baseline.get(section, {}).get(name)
+            if old is None:
+                continue
+            if isinstance(values, dict):
+                for metric, value in values.items():
+                    before = old.get(metric)
+                    if isinstance(value, (int, float)) and before:
+                        lines.append(f"{name}.{metric}: {before} -> {value} ({(value - before) / before:+.1%})")
+            elif isinstance(values, (int, float)) and old:
+                lines.append(f"{name}: {old} -> {values} ({(values - old) / old:+.1%})")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Weather & Currency API benchmarks")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--hot-keys", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.05, help="upstream latency, seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="upstream 503 probability")
+    parser.add_argument("--micro-number", type=int, default=2000)
+    parser.add_argument("--startup-runs", type=int, default=5, help="cold starts to measure, 0 — skip")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--compare", type=Path, help="previous results JSON")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "scenarios": asyncio.run(run_scenarios(args)),
+        "micro": micro_benchmarks(args.micro_number),
+    }
+    if args.startup_runs:
+        report["startup"] = startup_benchmarks(args.startup_runs)
+
+    output = args.output or RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}-{report['revision']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+
+    print(json.dumps(report["scenarios"], indent=2))
+    print(json.dumps(report["micro"], indent=2))
+    if "startup" in report:
+        print(json.dumps(report["startup"], indent=2))
+    print(f"saved to {output}")
+
+    if args.compare:
+        for line in compare(report, json.loads(args.compare.read_text())):
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,15 @@ export async function fetchWeather(city: string): Promise<WeatherData> {
   return res.json();
 }
 
+// Обновления погоды по SSE: сервер присылает данные только при их изменении.
+export function subscribeWeather(
+  city: string, onUpdate: (data: WeatherData) => void
+): () => void {
+  const source = new EventSource(`${BASE}/stream/weather?city=${encodeURIComponent(city)}`);
+  source.addEventListener("update", (e) => onUpdate(JSON.parse((e as MessageEvent).data)));
+  return () => source.close();
+}
+
 export async function fetchCurrency(
   from: string, to: string, amount: number
 ): Promise<ConversionData> {
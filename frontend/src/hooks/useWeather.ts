@@ -1,20 +1,29 @@
-import { useState } from "react";
-import { fetchWeather } from "../api";
+import { useEffect, useState } from "react";
+import { fetchWeather, subscribeWeather } from "../api";
 import type { WeatherData } from "../types";
 
 export function useWeather() {
   const [weather, setWeather] = useState<WeatherData | null>(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
+  const [city, setCity] = useState<string | null>(null);
+
+  // после удачного поиска держим данные свежими через поток, без опроса
+  useEffect(() => {
+    if (!city) return;
+    return subscribeWeather(city, setWeather);
+  }, [city]);
 
   const search = async (city: string) => {
     if (!city.trim()) return;
     setLoading(true);
     setError(null);
     setWeather(null);
+    setCity(null);
     try {
       const data = await fetchWeather(city.trim());
       setWeather(data);
+      setCity(city.trim());
     } catch (e: any) {
       setError(e.message);
     } finally {
@@ -1,25 +1,44 @@
-import os
 import asyncio
 import sys
-from aiogram import Bot, Dispatcher, types
-from aiogram.client.bot import DefaultBotProperties
-from aiogram.filters import Command
-from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
-from dotenv import load_dotenv
+from typing import TYPE_CHECKING
 import logging
 
-load_dotenv()
+# настройки (.env) читаются один раз при импорте src.core.config
+from src.core.config import settings
+from src.core.http import create_http_client
+from src.integrations.policy import UpstreamUnavailable
+from src.utils.utils import close_redis, flush_writes, run_invalidation_listener
+from src.utils.snapshot import load_snapshot
+from src.services.weather_service import get_weather, peek_weather
+from src.services.currency_service import convert_currency
 
-from src.services.services import get_weather, convert_currency
+# aiogram импортируется в create_dispatcher() и main(): импорт занимает секунды,
+# а обработчики — обычные функции, их можно вызывать и тестировать без него
+if TYPE_CHECKING:
+    from aiogram import Bot, Dispatcher, types
+    from aiohttp import web
 
 logger = logging.getLogger(__name__)
 
-TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+# общий пул соединений к внешним API, создаётся в main()
+http_client = None
+
+
+class ConcurrencyLimit:
+    """Не больше limit апдейтов обрабатываются одновременно — остальные ждут (outer middleware)."""
+
+    def __init__(self, limit: int):
+        self._semaphore = asyncio.Semaphore(limit)
+
+    async def __call__(self, handler, event, data):
+        async with self._semaphore:
+            return await handler(event, data)
 
-dp = Dispatcher()
 
 # Функция для создания клавиатуры с кнопками
 def weather_buttons(city: str):
+    from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [
             InlineKeyboardButton(text="Сейчас", callback_data=f"weather_now|{city}"),
@@ -30,58 +49,86 @@ def weather_buttons(city: str):
     return keyboard
 
 
-@dp.message(Command("start"))
-async def start(msg: types.Message):
+# секции, которые нужны каждой кнопке
+CALLBACK_SECTIONS = {
+    "weather_now": ("current",),
+    "weather_today": ("daily",),
+    "weather_tomorrow": ("daily",),
+}
+
+
+def format_weather(action: str, data: dict) -> str:
+    if action == "weather_now":
+        return f"Погода сейчас: {data['description']}, {data['temperature']}°C"
+    if action == "weather_today":
+        return (
+            f"Погода сегодня: {data['summary_today']}, "
+            f"{data['temp_min']}…{data['temp_max']}°C"
+        )
+    return (
+        f"Прогноз на завтра: {data['summary_tomorrow']}, "
+        f"{data['temp_min_tomorrow']}…{data['temp_max_tomorrow']}°C"
+    )
+
+
+async def start(msg: "types.Message"):
     await msg.reply(
     "Привет! Я Weather & Currency бот.\n"
     "Используй /weather &lt;city&gt; или /convert &lt;amount&gt; &lt;from currency&gt; &lt;to currency&gt;"
 )
 
-@dp.message(Command("weather"))
-async def weather_cmd(msg: types.Message):
+async def weather_cmd(msg: "types.Message"):
     args = msg.text.split(maxsplit=1)  # разделяем "/weather Moscow" на ['/weather', 'Moscow']
     if len(args) < 2:
         await msg.reply("Укажи город, например: /weather Moscow")
         return
     city = args[1]  # "Moscow"
-    
+
     try:
-        data = await get_weather(city)
-        print(data)
+        # все секции одним запросом — кнопки потом отвечают из кэша
+        data = await get_weather(city, http_client)
         await msg.reply(
-            f"Погода в {data['city']}:\n{data['temperature_c_now']}°C, {data['description']}",
+            f"Погода в {data['city']}:\n{data['temperature']}°C, {data['description']}",
             reply_markup=weather_buttons(city)  # Добавляем кнопки
         )
+    except UpstreamUnavailable as e:
+        logger.warning(f"Weather API unavailable: {e}, city: {city}")
+        await msg.reply("Сервис погоды временно недоступен. Попробуй позже.")
     except Exception as e:
         logger.error(f"Weather API error: {e}, city: {city}, user: {msg.from_user.id}")
         await msg.reply("Не удалось получить данные о погоде. Проверь название города и попробуй снова.")
 
-@dp.message(Command("convert"))
-async def conver_cmd(msg: types.Message):
+async def conver_cmd(msg: "types.Message"):
     args = msg.text.split()
     if len(args) != 4:
         await msg.reply("Используй формат: /convert &lt;amount&gt; &lt;from currency&gt; &lt;to currency&gt;")
         return
     try:
         amount = float(args[1])
-        from_cur = args[2].upper()
-        to_cur = args[3].upper()
-        converted = await convert_currency(from_cur, to_cur, amount)
-        await msg.reply(f"{amount} {from_cur.upper()} = {converted:.2f} {to_cur.upper()}")
-
     except ValueError as e:
         logger.warning(f"Invalid number format: {e}, user: {msg.from_user.id}, input: {msg.text}")
         await msg.reply("Неверный формат числа. Убедись, что сумма - это число.")
-    
-    except ConnectionError as e:
-        logger.error(f"Connection error in currency conversion: {e}")
+        return
+
+    from_cur = args[2].upper()
+    to_cur = args[3].upper()
+    try:
+        result = await convert_currency(from_cur, to_cur, amount, http_client)
+        await msg.reply(f"{amount} {from_cur} = {result['converted']:.2f} {to_cur}")
+
+    except ValueError as e:
+        logger.warning(f"Currency error: {e}, user: {msg.from_user.id}, input: {msg.text}")
+        await msg.reply("Не удалось найти курс. Проверь коды валют.")
+
+    except UpstreamUnavailable as e:
+        logger.warning(f"Currency API unavailable: {e}")
         await msg.reply("Сервис конвертации временно недоступен. Попробуй позже.")
-    
+
     except Exception as e:
         logger.error(f"Unexpected error in convert command: {e}, user: {msg.from_user.id}, input: {msg.text}")
         await msg.reply("Произошла непредвиденная ошибка. Попробуй еще раз или обратись к администратору.")
 
-async def handle_weather_callback(callback: types.CallbackQuery):
+async def handle_weather_callback(callback: "types.CallbackQuery"):
 
     raw = callback.data or ""
     try:
@@ -89,43 +136,129 @@ async def handle_weather_callback(callback: types.CallbackQuery):
     except ValueError:
         await callback.answer("Неправильные данные", show_alert=True)
         return
+    sections = CALLBACK_SECTIONS.get(action)
+    if sections is None:
+        await callback.answer("Неправильные данные", show_alert=True)
+        return
 
     await callback.answer()  # закрывает "loading" у кнопки
 
-    weather_data = await get_weather(city)
+    # кнопки появляются после /weather, поэтому данные обычно уже в кэше
+    weather_data = await peek_weather(city, sections)
+    if weather_data is None:
+        try:
+            weather_data = await get_weather(city, http_client, sections)
+        except Exception as e:
+            logger.error(f"Weather API error in callback: {e}, city: {city}")
+            await callback.message.answer("Не удалось получить данные о погоде. Попробуй позже.")
+            return
 
-    if action == "weather_now":
-        # Отправить прогноз на сегодня
+    await callback.message.answer(format_weather(action, weather_data))
+
+
+def create_dispatcher() -> "Dispatcher":
+    """Диспетчер с обработчиками; здесь же впервые импортируется aiogram."""
+    from aiogram import Dispatcher
+    from aiogram.filters import Command
+
+    dp = Dispatcher()
+    dp.update.outer_middleware(ConcurrencyLimit(settings.bot_max_concurrent_updates))
+    dp.message.register(start, Command("start"))
+    dp.message.register(weather_cmd, Command("weather"))
+    dp.message.register(conver_cmd, Command("convert"))
+    dp.callback_query.register(handle_weather_callback)
+    return dp
+
+
+async def _set_webhook(bot: "Bot"):
+    await bot.set_webhook(
+        settings.bot_webhook_url,
+        secret_token=settings.bot_webhook_secret or None,
+        allowed_updates=["message", "callback_query"],
+        # Telegram держит не больше стольких параллельных запросов к вебхуку
+        max_connections=min(100, settings.bot_max_concurrent_updates),
+    )
 
-        await callback.message.answer(f"Погода сегодня: {weather_data['description']}, {weather_data['temperature_c_now']}°C")
 
-    elif action == "weather_today":
-        # Отправить прогноз на сегодня
+def create_webhook_app(dp: "Dispatcher", bot: "Bot") -> "web.Application":
+    """
+    aiohttp-приложение для режима вебхука. Экземпляров может быть несколько
+    за балансировщиком: состояние (кэш, квоты, breaker) общее через Redis.
+    Апдейт обрабатывается до ответа Telegram, поэтому при перегрузке
+    он сам ждёт, а не копит задачи в памяти.
+    """
+    # сервер вебхука нужен только в этом режиме — в polling не импортируется
+    from aiohttp import web
+    from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 
-        await callback.message.answer(f"Погода сегодня: {weather_data['temperature_c_today']}")
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        handle_in_background=False,
+        secret_token=settings.bot_webhook_secret or None,
+    ).register(app, path=settings.bot_webhook_path)
 
-    elif action == "weather_tomorrow":
-        # Отправить прогноз на завтра 
+    async def health(request):
+        return web.Response(text="ok")
 
-        await callback.message.answer(f"Прогноз на завтра: {weather_data['temperature_c_tomorrow']}")
+    app.router.add_get("/healthz", health)
+    setup_application(app, dp, bot=bot)
+    return app
 
 
 async def main() -> None:
+    from aiogram import Bot
+    from aiogram.client.bot import DefaultBotProperties
+
+    global http_client
+    dp = create_dispatcher()
+    http_client = create_http_client()
+    load_snapshot()
+
+    invalidation = None
+    if settings.l1_invalidation:
+        invalidation = asyncio.create_task(run_invalidation_listener())
+
     # Initialize Bot instance with default bot properties which will be passed to all API calls
     default_props = DefaultBotProperties(parse_mode="HTML")
 
-    bot = Bot(token=TOKEN, default=default_props)
+    bot = Bot(token=settings.telegram_bot_token, default=default_props)
 
-    dp.callback_query.register(handle_weather_callback)
-    
-    # And the run events dispatching
-    await dp.start_polling(
-        bot, 
-        allowed_updates=["message", "callback_query"]
-    )
+    try:
+        if settings.bot_mode == "webhook":
+            from aiohttp import web
+
+            if settings.bot_webhook_url:
+                await _set_webhook(bot)
+            runner = web.AppRunner(create_webhook_app(dp, bot))
+            await runner.setup()
+            await web.TCPSite(runner, settings.bot_webhook_host, settings.bot_webhook_port).start()
+            logger.info("Webhook server listening on %s:%d", settings.bot_webhook_host, settings.bot_webhook_port)
+            try:
+                await asyncio.Event().wait()
+            finally:
+                await runner.cleanup()
+        else:
+            # вебхук и long polling не совмещаются
+            await bot.delete_webhook()
+            await dp.start_polling(
+                bot,
+                allowed_updates=["message", "callback_query"]
+            )
+    finally:
+        if invalidation is not None:
+            invalidation.cancel()
+        await flush_writes()
+        await http_client.aclose()
+        await close_redis()
 
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO, stream=sys.stdout)
-    asyncio.run(main())
-
+    try:
+        import uvloop
+    except ImportError:  # uvloop необязателен — без него стандартный event loop
+        asyncio.run(main())
+    else:
+        uvloop.run(main())
@@ -0,0 +1,161 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+
+from src.core.config import settings
+from src.core.metrics import Counter, Gauge, Histogram
+
+# приоритеты очереди: меньше — раньше
+CACHED = 0
+UPSTREAM = 1
+
+ADMISSION_REJECTED = Counter(
+    "admission_rejected_total", "Requests shed by admission control", ("route", "reason")
+)
+ADMISSION_WAIT = Histogram(
+    "admission_wait_seconds", "Time spent waiting for an admission slot", ("route",),
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+
+class Overloaded(Exception):
+    """Запрос отклонён до начала обработки — отвечаем 503 с Retry-After."""
+
+    def __init__(self, route: str, reason: str, retry_after: float):
+        super().__init__(f"{route}: {reason}")
+        self.route = route
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionGate:
+    """
+    Не больше limit одновременных запросов маршрута; остальные ждут в очереди
+    длиной до max_queue по приоритету (ответы из кэша раньше запросов к API).
+    Если по средней длительности обработки место не освободится за
+    admission_queue_timeout, запрос отклоняется сразу, а не после ожидания.
+    """
+
+    def __init__(self, route: str, limit: int, max_queue: int):
+        self.route = route
+        self.limit = limit
+        self.max_queue = max_queue
+        self.active = 0
+        self.waiting = 0
+        # (приоритет, порядковый номер, future); отменённые выкидываются при выдаче места
+        self._queue: list = []
+        self._seq = itertools.count()
+        # скользящее среднее времени, на которое запрос держит место
+        self.service_time = 0.05
+
+    def _expected_wait(self, priority: int) -> float:
+        ahead = sum(1 for p, _, fut in self._queue if p <= priority and not fut.done())
+        return (ahead + 1) * self.service_time / self.limit
+
+    def _reject(self, reason: str, retry_after: float):
+        ADMISSION_REJECTED.labels(self.route, reason).inc()
+        raise Overloaded(self.route, reason, retry_after)
+
+    async def acquire(self, priority: int):
+        if self.active < self.limit and not self.waiting:
+            self.active += 1
+            return
+
+        timeout = settings.admission_queue_timeout
+        expected = self._expected_wait(priority)
+        if self.waiting >= self.max_queue:
+            self._reject("queue_full", expected)
+        if expected > timeout:
+            self._reject("deadline", expected)
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), future))
+        self.waiting += 1
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            # место могли выдать в тот же момент — тогда оно наше
+            if not future.done():
+                future.cancel()
+                self._reject("timeout", self._expected_wait(priority))
+        except asyncio.CancelledError:
+            if future.done():
+                # место уже выдано, но ждавший отменён — передаём его дальше
+                self.release()
+            else:
+                future.cancel()
+            raise
+        finally:
+            self.waiting -= 1
+        ADMISSION_WAIT.labels(self.route).observe(time.perf_counter() - start)
+
+    def release(self, held: float | None = None):
+        if held is not None:
+            self.service_time += (held - self.service_time) * 0.1
+        while self._queue:
+            _, _, future = heapq.heappop(self._queue)
+            if not future.done():
+                # место переходит ожидающему, active не меняется
+                future.set_result(None)
+                return
+        self.active -= 1
+
+
+def parse_limits(value: str) -> dict[str, int]:
+    """"weather=50,currency=100" -> {"weather": 50, "currency": 100}."""
+    limits = {}
+    for item in value.split(","):
+        name, _, limit = item.partition("=")
+        if name.strip() and limit.strip():
+            limits[name.strip()] = int(limit)
+    return limits
+
+
+_gates: dict[str, AdmissionGate] = {}
+
+
+def get_gate(route: str) -> AdmissionGate | None:
+    gate = _gates.get(route)
+    if gate is None:
+        limit = parse_limits(settings.admission_limits).get(route)
+        if not limit:
+            return None
+        gate = _gates[route] = AdmissionGate(route, limit, settings.admission_max_queue)
+    return gate
+
+
+def reset_gates():
+    _gates.clear()
+
+
+@asynccontextmanager
+async def admit(route: str, priority: int = UPSTREAM):
+    """Место в лимите маршрута на время блока; Overloaded, если его не дождаться."""
+    gate = get_gate(route) if settings.admission_enabled else None
+    if gate is None:
+        yield
+        return
+    await gate.acquire(priority)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        gate.release(time.perf_counter() - start)
+
+
+def retry_after(exc: Overloaded) -> str:
+    return str(max(1, math.ceil(exc.retry_after)))
+
+
+Gauge(
+    "admission_queue_depth", "Requests waiting for an admission slot", ("route",),
+    collect=lambda: {(route,): gate.waiting for route, gate in _gates.items()},
+)
+Gauge(
+    "admission_active", "Requests holding an admission slot", ("route",),
+    collect=lambda: {(route,): gate.active for route, gate in _gates.items()},
+)
@@ -0,0 +1,117 @@
+import gzip
+from collections import OrderedDict
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from src.core.config import settings
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен — без него только gzip
+    brotli = None
+
+_COMPRESSIBLE = ("application/json", "text/plain", "text/html", "text/csv")
+
+
+def _accepted(accept_encoding: str) -> set[str]:
+    accepted = set()
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if q > 0:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+def choose_encoding(accept_encoding: str) -> str | None:
+    accepted = _accepted(accept_encoding)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(encoding: str, body: bytes) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=settings.compression_brotli_quality)
+    return gzip.compress(body, compresslevel=settings.compression_gzip_level, mtime=0)
+
+
+class CompressionMiddleware:
+    """
+    ASGI-middleware: gzip/brotli для ответов больше compression_min_size.
+    Сжимаются только ответы одним сообщением (потоковые, например SSE, идут как есть).
+    У ответов со строгим ETag сжатый вариант запоминается по ETag,
+    поэтому повторная отдача закэшированного тела не сжимает его заново.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._cache: OrderedDict[tuple[str, str], bytes] = OrderedDict()
+
+    def _compressed(self, encoding: str, body: bytes, etag: str | None) -> bytes:
+        if etag is None or etag.startswith("W/"):
+            return compress(encoding, body)
+        key = (etag, encoding)
+        data = self._cache.get(key)
+        if data is None:
+            data = self._cache[key] = compress(encoding, body)
+            if len(self._cache) > settings.compression_cache_entries:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(key)
+        return data
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.compression_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+
+        async def send_wrapper(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+
+            pending, start = start, None
+            headers = MutableHeaders(raw=pending["headers"])
+            body = message.get("body", b"")
+            if (
+                message.get("more_body", False)
+                or len(body) < settings.compression_min_size
+                or "content-encoding" in headers
+                or not headers.get("content-type", "").startswith(_COMPRESSIBLE)
+            ):
+                await send(pending)
+                await send(message)
+                return
+
+            etag = headers.get("etag")
+            data = self._compressed(encoding, body, etag)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(data))
+            headers.add_vary_header("Accept-Encoding")
+            if etag and etag.endswith('"'):
+                # у сжатого представления свой строгий ETag
+                headers["ETag"] = f'{etag[:-1]}-{encoding}"'
+            await send(pending)
+            await send({"type": "http.response.body", "body": data})
+
+        await self.app(scope, receive, send_wrapper)
@@ -1,18 +1,215 @@
+import logging
+from typing import Optional
+
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
 
+logger = logging.getLogger(__name__)
+
+_WEATHER_SECTION_TTLS = ("cache_ttl_weather_current", "cache_ttl_weather_hourly", "cache_ttl_weather_daily")
+
 
 class Settings(BaseSettings):
     weather_api_key: str = "test"
     currencyrate_api_key: str = "test"
 
-    redis_url: str = "redis://localhost:6379"
+    redis_url: str = "redis://localhost:6379/0"
+
+    # пул соединений и таймауты Redis (секунды)
+    redis_max_connections: int = 50
+    redis_pool_timeout: float = 0.5
+    redis_socket_timeout: float = 0.5
+    redis_connect_timeout: float = 0.5
+    redis_health_check_interval: int = 30
+    # после стольких ошибок связи подряд Redis пропускается на cooldown секунд
+    redis_breaker_threshold: int = 3
+    redis_breaker_cooldown: float = 5
+    # запасное хранилище в памяти, пока Redis недоступен
+    redis_fallback_max_entries: int = 5000
+    redis_fallback_max_bytes: int = 16 * 1024 * 1024
+    # фоновые записи в Redis сверх этого числа отбрасываются
+    redis_max_pending_writes: int = 1000
 
-    cache_ttl_weather: int = 1800
+    # погода кэшируется по секциям: текущая меняется чаще прогноза
+    cache_ttl_weather_current: int = 600
+    cache_ttl_weather_hourly: int = 1800
+    cache_ttl_weather_daily: int = 10800
+    # устаревшая общая настройка (CACHE_TTL_WEATHER): если задана, служит
+    # значением по умолчанию для секций, не заданных явно
+    cache_ttl_weather: Optional[int] = None
+    # "город не найден" тоже кэшируется, чтобы опечатки не ходили в API
+    cache_ttl_weather_missing: int = 300
     cache_ttl_currency: int = 3600
 
+    # справочник городов: алиасы -> place_id и подсказки /weather/suggest
+    places_file: str = "src/data/places.json"
+    # сколько правок допускается в подсказках городов (0 — только префикс)
+    places_fuzzy_max_distance: int = 2
+    places_suggest_limit: int = 10
+
+    # формат значений в Redis: "msgpack" (компактнее, нужен пакет msgpack) или "json"
+    cache_codec: str = "msgpack"
+    # значения больше этого размера сжимаются zlib (0 — не сжимать)
+    cache_compress_min_bytes: int = 1024
+    cache_compress_level: int = 6
+
+    # хранить готовые байты HTTP-ответов /weather (у /currency тело зависит от суммы — не хранится)
+    response_cache_enabled: bool = True
+
+    telegram_bot_token: str = ""
+
+    # Telegram-бот: "polling" или "webhook" (aiohttp-сервер, можно за балансировщиком)
+    bot_mode: str = "polling"
+    bot_webhook_url: str = ""
+    bot_webhook_path: str = "/telegram/webhook"
+    bot_webhook_secret: str = ""
+    bot_webhook_host: str = "0.0.0.0"
+    bot_webhook_port: int = 8081
+    bot_max_concurrent_updates: int = 50
+
+    # SSE/WebSocket-потоки: как часто перечитывать значение темы из кэша,
+    # как часто слать keep-alive и делиться ли изменениями между воркерами через Redis
+    stream_poll_interval: float = 5
+    stream_heartbeat: float = 15
+    stream_pubsub: bool = True
+
+    # сжатие ответов (brotli, если установлен и клиент его принимает, иначе gzip)
+    compression_enabled: bool = True
+    compression_min_size: int = 1024
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 4
+    # сколько сжатых вариантов ответов со строгим ETag держать в памяти
+    compression_cache_entries: int = 1024
+
+    # трейсинг запросов: Server-Timing в каждом ответе, доля запросов
+    # с полным трейсом в памяти (GET /debug/traces) и размер этого буфера
+    tracing_enabled: bool = True
+    tracing_sample_rate: float = 0.0
+    tracing_buffer_size: int = 200
+    # токен для /debug/* и профилирования запроса (X-Admin-Token); пустой — выключено
+    admin_token: str = ""
+    # период сэмплирования профайлера (секунды) и сколько профилей хранить
+    profile_interval: float = 0.001
+    profile_buffer_size: int = 20
+
+    # после TTL значение ещё столько секунд отдаётся сразу, а обновляется в фоне
+    cache_stale_window: int = 300
+    # сколько ещё отдавать устаревшее значение, если внешний API недоступен
+    cache_stale_grace: int = 3600
+
+    # опорная валюта для кросс-курсов, если таблицы нужной базы нет в кэше
+    currency_pivot: str = "USD"
+    currency_cross_rate_precision: int = 10
+    currency_batch_max_rows: int = 100_000
+
+    # история курсов: каждая загруженная таблица дописывается в колоночные файлы
+    rate_history_enabled: bool = True
+    rate_history_dir: str = "data/rate_history"
+    rate_history_min_interval: int = 60
+    rate_history_max_points: int = 10000
+
+    # снимок горячих ключей на диске: новый воркер отвечает из него, пока Redis пуст
+    snapshot_enabled: bool = True
+    snapshot_path: str = "data/cache.snap"
+    snapshot_interval: int = 300
+    snapshot_max_entries: int = 10000
+
+    # L1-кэш в памяти процесса перед Redis
+    l1_enabled: bool = True
+    l1_max_entries: int = 10000
+    l1_max_bytes: int = 64 * 1024 * 1024
+    # сбрасывать L1 на других воркерах через Redis pub/sub при записи
+    l1_invalidation: bool = False
+
+    # склейка одновременных промахов кэша: "local" (в процессе) или "redis"
+    singleflight_mode: str = "local"
+    singleflight_lock_ttl: float = 15.0
+    singleflight_wait: float = 3.0
+    singleflight_poll_interval: float = 0.1
+
     weather_base_url: str = "https://www.meteosource.com/api/v1/free/point"
     currency_base_url: str = "https://v6.exchangerate-api.com/v6"
 
+    # circuit breaker для внешних API (состояние общее через Redis)
+    breaker_failure_threshold: int = 5
+    breaker_cooldown: float = 30.0
+    breaker_sync_interval: float = 1.0
+
+    # повторы: не больше retry_max_attempts на запрос и не больше
+    # retry_budget_ratio от общего числа запросов
+    retry_max_attempts: int = 2
+    retry_budget_ratio: float = 0.2
+    retry_backoff_base: float = 0.1
+
+    # таймаут = перцентиль удачных задержек × множитель, в пределах
+    # [adaptive_timeout_min, weather_timeout / currency_timeout]
+    adaptive_timeout_percentile: float = 0.99
+    adaptive_timeout_multiplier: float = 2.0
+    adaptive_timeout_min: float = 1.0
+    adaptive_timeout_min_samples: int = 20
+
+    # квоты бесплатных тарифов внешних API на один ключ (общие для всех процессов через Redis)
+    weather_daily_quota: int = 400
+    weather_minute_quota: int = 10
+    currency_daily_quota: int = 50
+    currency_minute_quota: int = 30
+
+    # несколько ключей одного провайдера через запятую — нагрузка делится между ними
+    weather_api_keys: str = ""
+    currencyrate_api_keys: str = ""
+
+    # фоновый прогрев популярных ключей перед истечением TTL
+    prewarm_enabled: bool = False
+    prewarm_interval: float = 60.0
+    prewarm_lead_time: int = 120
+    prewarm_top_n: int = 100
+    prewarm_quota_share: float = 0.5
+
+    # admission control: одновременных запросов на маршрут ("маршрут=лимит" через запятую),
+    # длина очереди ожидающих и сколько в ней ждать — дольше сразу 503 с Retry-After
+    admission_enabled: bool = True
+    admission_limits: str = "weather=64,weather_batch=8,currency=64,currency_batch=16"
+    admission_max_queue: int = 128
+    admission_queue_timeout: float = 2.0
+
+    # GET/POST /weather/batch: concurrency и timeout — на город (один запрос к API за его секциями)
+    weather_batch_max_cities: int = 50
+    weather_batch_concurrency: int = 8
+    weather_batch_timeout: float = 5.0
+
+    # общий пул HTTP-соединений к внешним API
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry: float = 30.0
+    http2: bool = False
+    http_connect_timeout: float = 5.0
+    http_default_timeout: float = 10.0
+
+    # таймауты отдельно для каждого внешнего API
+    weather_timeout: float = 10.0
+    currency_timeout: float = 10.0
+
+    # python -m src.serve: воркеры (0 — по числу CPU) и сколько секунд
+    # при остановке ждать завершения начатых запросов
+    web_host: str = "0.0.0.0"
+    web_port: int = 8000
+    web_workers: int = 0
+    web_backlog: int = 2048
+    web_graceful_timeout: float = 30
+
+
+    @model_validator(mode="after")
+    def apply_legacy_weather_ttl(self):
+        if self.cache_ttl_weather is not None:
+            logger.warning(
+                "CACHE_TTL_WEATHER is deprecated, use CACHE_TTL_WEATHER_CURRENT/_HOURLY/_DAILY; "
+                "applying %d s to sections that are not set explicitly",
+                self.cache_ttl_weather,
+            )
+            for name in _WEATHER_SECTION_TTLS:
+                if name not in self.model_fields_set:
+                    setattr(self, name, self.cache_ttl_weather)
+        return self
 
     class Config:
         env_file = ".env"
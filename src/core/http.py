@@ -0,0 +1,50 @@
+import functools
+import logging
+import ssl
+from importlib.util import find_spec
+
+import httpx
+
+from src.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=None)
+def ssl_context() -> ssl.SSLContext:
+    """
+    Загрузка корневых сертификатов — самая долгая часть создания клиента,
+    поэтому контекст общий для всех клиентов процесса (и воркеров после fork).
+    """
+    return httpx.create_ssl_context()
+
+
+def create_http_client(transport: httpx.AsyncBaseTransport | None = None) -> httpx.AsyncClient:
+    """
+    Общий долгоживущий клиент для внешних API (meteosource, exchangerate-api).
+    Создаётся один раз на процесс: в lifespan приложения или в main() бота,
+    чтобы соединения переиспользовались (keep-alive) между запросами.
+    transport позволяет подменить сеть в тестах (httpx.MockTransport).
+    """
+    http2 = settings.http2
+    if http2 and find_spec("h2") is None:
+        logger.warning("HTTP/2 requested but the 'h2' package is not installed, using HTTP/1.1")
+        http2 = False
+
+    limits = httpx.Limits(
+        max_connections=settings.http_max_connections,
+        max_keepalive_connections=settings.http_max_keepalive_connections,
+        keepalive_expiry=settings.http_keepalive_expiry,
+    )
+    timeout = httpx.Timeout(
+        settings.http_default_timeout,
+        connect=settings.http_connect_timeout,
+    )
+
+    return httpx.AsyncClient(
+        limits=limits,
+        timeout=timeout,
+        http2=http2,
+        verify=ssl_context(),
+        transport=transport,
+    )
@@ -0,0 +1,43 @@
+import os
+import sys
+import threading
+from collections import Counter
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Сэмплирующий профайлер: отдельный поток раз в interval снимает стек потока
+    event loop. Стеки копятся в формате folded ("a;b;c count") — его понимают
+    flamegraph.pl и speedscope. Поток loop общий, поэтому в профиль попадает
+    и работа параллельных запросов; ожидание ввода-вывода видно как select.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.target = threading.get_ident()
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.target)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def stop(self) -> str:
+        self._stop.set()
+        self._thread.join()
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common())
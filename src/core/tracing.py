@@ -0,0 +1,168 @@
+import hmac
+import random
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Optional
+from urllib.parse import parse_qs
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from src.core.config import settings
+
+# Спаны запроса: with span("redis"): ... — время попадает в Server-Timing.
+# Без активного трейса (фоновые задачи, бот, отключённый трейсинг) span()
+# отдаёт общий пустой контекст: ни замеров, ни аллокаций.
+
+_NOOP = nullcontext()
+
+
+class Trace:
+    __slots__ = ("id", "start", "wall", "spans", "sampled", "status")
+
+    def __init__(self, sampled: bool):
+        self.id = uuid.uuid4().hex[:16]
+        self.start = time.perf_counter()
+        self.wall = time.time()
+        # (имя, начало от старта запроса, длительность), секунды
+        self.spans: list[tuple[str, float, float]] = []
+        self.sampled = sampled
+        self.status = 500
+
+    def server_timing(self, total: float) -> str:
+        """
+        Суммы по именам спанов. Параллельные спаны (секции погоды, пакеты)
+        складываются, поэтому сумма может быть больше total.
+        """
+        durations: dict[str, float] = {}
+        for name, _, duration in self.spans:
+            durations[name] = durations.get(name, 0.0) + duration
+        parts = [f"{name};dur={duration * 1000:.2f}" for name, duration in durations.items()]
+        parts.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(parts)
+
+    def as_dict(self, method: str, path: str, total: float) -> dict:
+        return {
+            "id": self.id,
+            "method": method,
+            "path": path,
+            "status": self.status,
+            "timestamp": self.wall,
+            "duration_ms": round(total * 1000, 3),
+            "spans": [
+                {"name": name, "start_ms": round(start * 1000, 3), "duration_ms": round(duration * 1000, 3)}
+                for name, start, duration in self.spans
+            ],
+        }
+
+
+_current: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+
+
+class _Span:
+    __slots__ = ("trace", "name", "start")
+
+    def __init__(self, trace: Trace, name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        self.trace.spans.append((self.name, self.start - self.trace.start, end - self.start))
+        return False
+
+
+def span(name: str):
+    trace = _current.get()
+    return _NOOP if trace is None else _Span(trace, name)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+# последние сэмплированные трейсы и профили (в памяти воркера)
+recent_traces: deque = deque(maxlen=settings.tracing_buffer_size)
+profiles: OrderedDict[str, str] = OrderedDict()
+
+
+def is_admin(headers: Headers) -> bool:
+    token = headers.get("x-admin-token", "")
+    return bool(settings.admin_token) and hmac.compare_digest(token, settings.admin_token)
+
+
+def _profile_requested(scope, headers: Headers) -> bool:
+    if headers.get("x-profile") == "1":
+        requested = True
+    else:
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        requested = query.get("profile") == ["1"]
+    return requested and is_admin(headers)
+
+
+def _store_profile(profile_id: str, folded: str):
+    profiles[profile_id] = folded
+    while len(profiles) > settings.profile_buffer_size:
+        profiles.popitem(last=False)
+
+
+class TracingMiddleware:
+    """
+    ASGI-middleware: трейс на каждый запрос и заголовок Server-Timing.
+    Доля tracing_sample_rate запросов целиком сохраняется в recent_traces.
+    Админ (X-Admin-Token) может запросить профиль запроса: X-Profile: 1 или ?profile=1 —
+    профиль сохраняется, его id приходит в заголовке X-Profile-Id.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.tracing_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        profiler = None
+        if _profile_requested(scope, Headers(scope=scope)):
+            # профайлер нужен только по запросу админа — модуль грузится при первом профиле
+            from src.core.profiler import SamplingProfiler
+
+            profiler = SamplingProfiler(settings.profile_interval)
+        rate = settings.tracing_sample_rate
+        trace = Trace(sampled=profiler is not None or (rate > 0 and random.random() < rate))
+
+        async def send_wrapper(message):
+            nonlocal profiler
+            if message["type"] == "http.response.start":
+                trace.status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", trace.server_timing(time.perf_counter() - trace.start))
+                if trace.sampled:
+                    headers["X-Trace-Id"] = trace.id
+                if profiler is not None:
+                    _store_profile(trace.id, profiler.stop())
+                    profiler = None
+                    headers["X-Profile-Id"] = trace.id
+            await send(message)
+
+        token = _current.set(trace)
+        if profiler is not None:
+            profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            if profiler is not None:
+                _store_profile(trace.id, profiler.stop())
+            if trace.sampled:
+                route = scope.get("route")
+                path = route.path if route is not None else scope["path"]
+                recent_traces.append(
+                    trace.as_dict(scope["method"], path, time.perf_counter() - trace.start)
+                )
@@ -2,22 +2,43 @@ import httpx
 from decimal import Decimal
 
 from src.core.config import settings
+from src.core.metrics import track_upstream
+from src.core.tracing import span
+from src.integrations.quota import acquire_api_key
+from src.integrations.policy import call_upstream
 
 
-async def fetch_rate(from_currency: str, to_currency: str, client: httpx.AsyncClient):
-    url = f"{settings.currency_base_url}/{settings.currencyrate_api_key}/latest/{from_currency}"
+async def fetch_rates(base_currency: str, client: httpx.AsyncClient):
+    """Полная таблица курсов `conversion_rates` для базовой валюты."""
+    async def attempt(timeout: float):
+        api_key = await acquire_api_key("currency")
+        url = f"{settings.currency_base_url}/{api_key}/latest/{base_currency}"
+        with track_upstream("currency"), span("currency_api"):
+            r = await client.get(url, timeout=timeout)
+            r.raise_for_status()
+        return r
 
     try:
-        r = await client.get(url, timeout=10)
-        r.raise_for_status()
+        r = await call_upstream("currency", attempt)
     except httpx.HTTPError as e:
         raise ValueError("Currency API error") from e
 
     data = r.json()
 
-    rate = data.get("conversion_rates", {}).get(to_currency)
-    
+    rates = data.get("conversion_rates")
+
+    if not rates:
+        raise ValueError("Currency not found")
+
+    return {code: Decimal(str(value)) for code, value in rates.items()}
+
+
+async def fetch_rate(from_currency: str, to_currency: str, client: httpx.AsyncClient):
+    rates = await fetch_rates(from_currency, client)
+
+    rate = rates.get(to_currency)
+
     if rate is None:
         raise ValueError("Currency not found")
 
-    return Decimal(str(rate))
\ No newline at end of file
+    return rate
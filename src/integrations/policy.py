@@ -0,0 +1,234 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable
+
+import httpx
+
+from src.core.config import settings
+from src.core.metrics import Counter, Gauge
+from src.utils.utils import redis_op
+
+logger = logging.getLogger(__name__)
+
+BREAKER_STATE = Gauge(
+    "upstream_breaker_open", "1 if the upstream circuit breaker is open or half-open", ("upstream",)
+)
+RETRIES = Counter("upstream_retries_total", "Retried upstream requests", ("upstream",))
+REJECTED = Counter(
+    "upstream_rejected_total", "Upstream calls rejected without a request", ("upstream", "reason")
+)
+
+
+class UpstreamUnavailable(Exception):
+    """Внешний API сейчас недоступен (открыт breaker или нет квоты) — запрос не отправлялся."""
+
+    def __init__(self, upstream: str, reason: str, retry_after: float = 0):
+        super().__init__(f"{upstream} unavailable: {reason}")
+        self.upstream = upstream
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class LatencyTracker:
+    """Скользящее окно удачных задержек; таймаут = перцентиль × множитель."""
+
+    def __init__(self, max_timeout: float, size: int = 200):
+        self.max_timeout = max_timeout
+        self._samples: deque[float] = deque(maxlen=size)
+
+    def observe(self, seconds: float):
+        self._samples.append(seconds)
+
+    def timeout(self) -> float:
+        if len(self._samples) < settings.adaptive_timeout_min_samples:
+            return self.max_timeout
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(settings.adaptive_timeout_percentile * len(ordered)))
+        value = ordered[index] * settings.adaptive_timeout_multiplier
+        return min(self.max_timeout, max(settings.adaptive_timeout_min, value))
+
+
+class RetryBudget:
+    """
+    Бюджет повторов: каждый запрос добавляет ratio токена, каждый повтор
+    забирает один. Так повторов не больше ratio от общего трафика, и при
+    деградации API мы не умножаем на него нагрузку.
+    """
+
+    def __init__(self, ratio: float, max_tokens: float = 10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+
+    def deposit(self):
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class CircuitBreaker:
+    """
+    closed -> open после failure_threshold ошибок подряд;
+    open -> half-open через cooldown секунд, пропускается один пробный запрос;
+    удачная проба закрывает breaker, неудачная снова открывает.
+    Открытие публикуется в Redis (breaker:<name> с TTL = cooldown),
+    поэтому остальные воркеры перестают ходить в API сразу, а не после своих ошибок.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._remote_checked_at = 0.0
+        self._remote_open_until = 0.0
+
+    @property
+    def _redis_key(self) -> str:
+        return f"breaker:{self.name}"
+
+    async def _remote_open_for(self) -> float:
+        """Сколько ещё breaker открыт по данным Redis (проверяется не чаще раза в секунду)."""
+        now = time.monotonic()
+        if now - self._remote_checked_at >= settings.breaker_sync_interval:
+            self._remote_checked_at = now
+            try:
+                pttl = await redis_op(lambda client: client.pttl(self._redis_key))
+                self._remote_open_until = now + pttl / 1000 if pttl and pttl > 0 else 0.0
+            except Exception as e:
+                logger.debug("Breaker sync error for %s: %s", self.name, e)
+        return max(0.0, self._remote_open_until - now)
+
+    async def before_call(self):
+        now = time.monotonic()
+        if self.state == self.OPEN:
+            if now - self.opened_at < settings.breaker_cooldown:
+                raise UpstreamUnavailable(
+                    self.name, "circuit open", settings.breaker_cooldown - (now - self.opened_at)
+                )
+            self.state = self.HALF_OPEN
+
+        if self.state == self.HALF_OPEN:
+            if self._probe_in_flight:
+                raise UpstreamUnavailable(self.name, "circuit half-open", 1)
+            self._probe_in_flight = True
+            return
+
+        remote = await self._remote_open_for()
+        if remote > 0:
+            raise UpstreamUnavailable(self.name, "circuit open", remote)
+
+    async def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info("Circuit breaker for %s closed", self.name)
+            try:
+                await redis_op(lambda client: client.delete(self._redis_key))
+            except Exception:
+                pass
+            self._remote_open_until = 0.0
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+        BREAKER_STATE.labels(self.name).set(0)
+
+    def abort_probe(self):
+        # запрос не дошёл до API (например, нет квоты) — проба не состоялась
+        self._probe_in_flight = False
+
+    async def record_failure(self):
+        self._probe_in_flight = False
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= settings.breaker_failure_threshold:
+            await self._open()
+
+    async def _open(self):
+        logger.warning("Circuit breaker for %s opened after %d failures", self.name, self.failures)
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        BREAKER_STATE.labels(self.name).set(1)
+        try:
+            await redis_op(lambda client: client.set(
+                self._redis_key, "open", px=int(settings.breaker_cooldown * 1000)
+            ))
+        except Exception as e:
+            logger.debug("Breaker publish error for %s: %s", self.name, e)
+
+
+class UpstreamPolicy:
+    def __init__(self, name: str, max_timeout: float):
+        self.name = name
+        self.breaker = CircuitBreaker(name)
+        self.budget = RetryBudget(settings.retry_budget_ratio)
+        self.latency = LatencyTracker(max_timeout)
+
+
+_policies: dict[str, UpstreamPolicy] = {}
+
+
+def get_policy(upstream: str) -> UpstreamPolicy:
+    policy = _policies.get(upstream)
+    if policy is None:
+        # верхняя граница таймаута — weather_timeout / currency_timeout из настроек
+        max_timeout = getattr(settings, f"{upstream}_timeout", settings.http_default_timeout)
+        policy = _policies[upstream] = UpstreamPolicy(upstream, max_timeout)
+    return policy
+
+
+def reset_policies():
+    _policies.clear()
+
+
+def _retryable(exc: Exception) -> bool:
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+        return status >= 500 or status == 429
+    return isinstance(exc, httpx.TransportError)
+
+
+async def call_upstream(upstream: str, attempt: Callable[[float], Awaitable[httpx.Response]]):
+    """
+    Вызов внешнего API по политике: breaker, повторы с джиттером в пределах
+    бюджета и таймаут по наблюдаемой задержке. attempt(timeout) делает один запрос
+    и сам вызывает raise_for_status(). 4xx считаются ответом здорового API.
+    """
+    policy = get_policy(upstream)
+    try:
+        await policy.breaker.before_call()
+    except UpstreamUnavailable:
+        REJECTED.labels(upstream, "circuit_open").inc()
+        raise
+
+    policy.budget.deposit()
+    retries = 0
+    while True:
+        start = time.perf_counter()
+        try:
+            response = await attempt(policy.latency.timeout())
+        except UpstreamUnavailable:
+            policy.breaker.abort_probe()
+            raise
+        except httpx.HTTPError as e:
+            if not _retryable(e):
+                await policy.breaker.record_success()
+                raise
+            if retries < settings.retry_max_attempts and policy.budget.withdraw():
+                retries += 1
+                RETRIES.labels(upstream).inc()
+                backoff = settings.retry_backoff_base * (2 ** (retries - 1))
+                await asyncio.sleep(random.uniform(0, backoff))
+                continue
+            await policy.breaker.record_failure()
+            raise
+        policy.latency.observe(time.perf_counter() - start)
+        await policy.breaker.record_success()
+        return response
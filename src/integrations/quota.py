@@ -0,0 +1,179 @@
+import hashlib
+import logging
+import time
+
+from src.core.config import settings
+from src.core.metrics import Gauge
+from src.integrations.policy import REJECTED, UpstreamUnavailable
+from src.utils.utils import RedisUnavailable, redis_op
+
+logger = logging.getLogger(__name__)
+
+QUOTA_REMAINING = Gauge(
+    "upstream_quota_remaining",
+    "Remaining upstream quota per API key (key is a short hash)",
+    ("upstream", "key", "window"),
+)
+
+
+class QuotaExceeded(UpstreamUnavailable):
+    """У всех ключей провайдера закончилась квота — запрос не отправлялся."""
+
+
+# Поминутный лимит — token bucket (ёмкость = лимит в минуту),
+# суточный — счётчик на UTC-сутки. Проверка и списание атомарны.
+# Возвращает {минутных токенов осталось, использовано за сутки};
+# -1 — кончилась суточная квота, -2 — поминутная.
+_ACQUIRE_SCRIPT = """
+local day = tonumber(redis.call("GET", KEYS[2]) or "0")
+if day >= tonumber(ARGV[4]) then
+    return {-1, day}
+end
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "ts")
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + (now - ts) / 1000 * rate)
+if tokens < 1 then
+    return {-2, day}
+end
+tokens = tokens - 1
+redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "ts", now)
+redis.call("PEXPIRE", KEYS[1], 120000)
+day = redis.call("INCR", KEYS[2])
+if day == 1 then
+    redis.call("EXPIRE", KEYS[2], ARGV[5])
+end
+return {math.floor(tokens), day}
+"""
+
+
+def _limits(provider: str) -> tuple[int, int]:
+    return (
+        getattr(settings, f"{provider}_minute_quota"),
+        getattr(settings, f"{provider}_daily_quota"),
+    )
+
+
+def api_keys(provider: str) -> list[str]:
+    """Ключи провайдера: *_api_keys через запятую или единственный *_api_key."""
+    single = settings.weather_api_key if provider == "weather" else settings.currencyrate_api_key
+    many = settings.weather_api_keys if provider == "weather" else settings.currencyrate_api_keys
+    keys = [key.strip() for key in many.split(",") if key.strip()]
+    return keys or [single]
+
+
+def _key_id(api_key: str) -> str:
+    # в Redis и метриках — только короткий хэш, а не сам ключ
+    return hashlib.sha1(api_key.encode()).hexdigest()[:8]
+
+
+def _day() -> str:
+    return time.strftime("%Y%m%d", time.gmtime())
+
+
+def _seconds_to_midnight() -> int:
+    return 86400 - int(time.time()) % 86400
+
+
+class _LocalBucket:
+    """Запасной учёт в памяти процесса, пока Redis недоступен."""
+
+    def __init__(self, capacity: int):
+        self.tokens = float(capacity)
+        self.ts = time.monotonic()
+        self.day = _day()
+        self.used = 0
+
+    def acquire(self, capacity: int, day_limit: int) -> tuple[int, int]:
+        if self.day != _day():
+            self.day, self.used = _day(), 0
+        if self.used >= day_limit:
+            return -1, self.used
+        now = time.monotonic()
+        self.tokens = min(capacity, self.tokens + (now - self.ts) * capacity / 60)
+        self.ts = now
+        if self.tokens < 1:
+            return -2, self.used
+        self.tokens -= 1
+        self.used += 1
+        return int(self.tokens), self.used
+
+
+_local: dict[str, _LocalBucket] = {}
+# последний известный остаток суточной квоты по ключу — для распределения нагрузки
+_day_remaining: dict[str, int] = {}
+
+
+async def _try_key(provider: str, api_key: str) -> tuple[int, int]:
+    minute_limit, day_limit = _limits(provider)
+    key_id = _key_id(api_key)
+    bucket_key = f"quota:{provider}:{key_id}:bucket"
+    day_key = f"quota:{provider}:{key_id}:{_day()}"
+    try:
+        tokens, used = await redis_op(lambda client: client.eval(
+            _ACQUIRE_SCRIPT, 2, bucket_key, day_key,
+            minute_limit, minute_limit / 60, int(time.time() * 1000),
+            day_limit, _seconds_to_midnight() + 3600,
+        ))
+        tokens, used = int(tokens), int(used)
+    except Exception as e:
+        if not isinstance(e, RedisUnavailable):
+            logger.warning("Quota check via Redis failed, using local counters: %s", e)
+        bucket = _local.setdefault(f"{provider}:{key_id}", _LocalBucket(minute_limit))
+        tokens, used = bucket.acquire(minute_limit, day_limit)
+
+    _day_remaining[f"{provider}:{key_id}"] = day_limit - used
+    QUOTA_REMAINING.labels(provider, key_id, "day").set(day_limit - used)
+    if tokens >= 0:
+        QUOTA_REMAINING.labels(provider, key_id, "minute").set(tokens)
+    return tokens, used
+
+
+async def acquire_api_key(provider: str) -> str:
+    """
+    Списывает один запрос с квоты и возвращает ключ, которым его делать.
+    Ключи пробуются по убыванию известного остатка суточной квоты,
+    так нагрузка распределяется между ними. Если квоты нет ни у одного,
+    сразу бросает QuotaExceeded — без запроса к внешнему API.
+    """
+    keys = api_keys(provider)
+    _, day_limit = _limits(provider)
+    ordered = sorted(keys, key=lambda k: _day_remaining.get(f"{provider}:{_key_id(k)}", day_limit), reverse=True)
+
+    day_exhausted = True
+    for api_key in ordered:
+        tokens, _ = await _try_key(provider, api_key)
+        if tokens >= 0:
+            return api_key
+        if tokens == -2:
+            day_exhausted = False
+
+    REJECTED.labels(provider, "quota").inc()
+    if day_exhausted:
+        raise QuotaExceeded(provider, "daily quota exhausted", _seconds_to_midnight())
+    minute_limit, _ = _limits(provider)
+    raise QuotaExceeded(provider, "rate limit", 60 / max(1, minute_limit))
+
+
+async def calls_today(provider: str) -> int:
+    """Сколько запросов к провайдеру уже сделано за сутки по всем его ключам."""
+    keys = api_keys(provider)
+    _, day_limit = _limits(provider)
+    # то, что насчитали сами (в том числе пока Redis был недоступен)
+    local = [day_limit - _day_remaining.get(f"{provider}:{_key_id(key)}", day_limit) for key in keys]
+    try:
+        day_keys = [f"quota:{provider}:{_key_id(key)}:{_day()}" for key in keys]
+        values = await redis_op(lambda client: client.mget(day_keys))
+    except Exception as e:
+        if not isinstance(e, RedisUnavailable):
+            logger.warning("Quota read error: %s", e)
+        return sum(local)
+    return sum(max(int(value or 0), seen) for value, seen in zip(values, local))
+
+
+def reset_local_quota():
+    _local.clear()
+    _day_remaining.clear()
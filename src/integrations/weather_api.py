@@ -1,14 +1,29 @@
 import httpx
 from src.core.config import settings
+from src.core.metrics import track_upstream
+from src.core.tracing import span
+from src.integrations.quota import acquire_api_key
+from src.integrations.policy import call_upstream
 
 
-async def fetch_weather(city: str, client: httpx.AsyncClient):
-    url = (
-        f"{settings.weather_base_url}"
-        f"?place_id={city}&sections=all&timezone=UTC&language=en&units=metric"
-        f"&key={settings.weather_api_key}"
-    )
+async def fetch_weather(city: str, client: httpx.AsyncClient, sections=("current", "daily", "hourly")):
+    """Ответ meteosource только с нужными секциями (current / daily / hourly)."""
+    async def attempt(timeout: float):
+        api_key = await acquire_api_key("weather")
+        # place_id может быть не латиницей (北京) — параметры кодирует httpx
+        params = {
+            "place_id": city,
+            "sections": ",".join(sections),
+            "timezone": "UTC",
+            "language": "en",
+            "units": "metric",
+            "key": api_key,
+        }
+        with track_upstream("weather"), span("weather_api"):
+            r = await client.get(settings.weather_base_url, params=params, timeout=timeout)
+            r.raise_for_status()
+        return r
 
-    r = await client.get(url, timeout=10)
-    r.raise_for_status()
-    return r.json()
\ No newline at end of file
+    r = await call_upstream("weather", attempt)
+    with span("decode"):
+        return r.json()
\ No newline at end of file
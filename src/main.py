@@ -1,14 +1,53 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from dotenv import load_dotenv
-
-load_dotenv()
 
+# настройки (.env) читаются один раз при импорте src.core.config
+from src.core.config import settings
+from src.core.http import create_http_client
+from src.core.admission import Overloaded, retry_after
+from src.core.compression import CompressionMiddleware
+from src.core.metrics import MetricsMiddleware
+from src.core.tracing import TracingMiddleware
+from src.utils.utils import close_redis, flush_writes, run_invalidation_listener
 from src.routes.routes import router
+from src.services.prewarm import run_prewarmer
+from src.utils.snapshot import load_snapshot, run_snapshotter
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # один пул соединений на процесс; в тестах можно заранее положить
+    # app.state.http_transport = httpx.MockTransport(...)
+    app.state.http_client = create_http_client(
+        transport=getattr(app.state, "http_transport", None)
+    )
+    # снимок только индексируется, значения читаются при промахах Redis
+    load_snapshot()
+    background = []
+    if settings.snapshot_enabled:
+        background.append(asyncio.create_task(run_snapshotter()))
+    if settings.l1_invalidation:
+        background.append(asyncio.create_task(run_invalidation_listener()))
+    if settings.prewarm_enabled:
+        background.append(asyncio.create_task(run_prewarmer(app.state.http_client)))
+    try:
+        yield
+    finally:
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        # фоновые записи в Redis не должны теряться при штатной остановке
+        await flush_writes()
+        await app.state.http_client.aclose()
+        await close_redis()
 
-app = FastAPI(title="Weather and Currency API")
+
+app = FastAPI(title="Weather and Currency API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -16,6 +55,10 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"]
 )
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
+# снаружи всех: total в Server-Timing включает сжатие и метрики
+app.add_middleware(TracingMiddleware)
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -34,4 +77,12 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
         },
     )
 
+@app.exception_handler(Overloaded)
+async def overloaded_exception_handler(request: Request, exc: Overloaded):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server is overloaded, retry later", "code": "overloaded"},
+        headers={"Retry-After": retry_after(exc)},
+    )
+
 app.include_router(router)
\ No newline at end of file
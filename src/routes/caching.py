@@ -0,0 +1,68 @@
+import hashlib
+import struct
+import time
+from typing import NamedTuple, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+# В кэше тело ответа хранится с заголовком: метка формата, срок свежести (unix)
+# и дайджест для ETag. Тела без метки (старый формат) считаются промахом.
+_MAGIC = b"B1"
+_HEADER = struct.Struct("!2sd16s")
+
+# суффиксы, которые CompressionMiddleware добавляет к ETag сжатых вариантов
+_ENCODING_SUFFIXES = ("-br", "-gzip")
+
+
+class CachedBody(NamedTuple):
+    body: bytes
+    etag: str
+    expires: float
+
+
+def make_cached_body(body: bytes, expires: float) -> CachedBody:
+    digest = hashlib.blake2b(body, digest_size=8).hexdigest()
+    return CachedBody(body, f'"{digest}"', expires)
+
+
+def pack(cached: CachedBody) -> bytes:
+    return _HEADER.pack(_MAGIC, cached.expires, cached.etag[1:-1].encode()) + cached.body
+
+
+def unpack(data: bytes) -> Optional[CachedBody]:
+    if len(data) < _HEADER.size or not data.startswith(_MAGIC):
+        return None
+    _, expires, digest = _HEADER.unpack_from(data)
+    return CachedBody(data[_HEADER.size:], f'"{digest.decode()}"', expires)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        for suffix in _ENCODING_SUFFIXES:
+            if candidate.endswith(f'{suffix}"'):
+                candidate = candidate[: -len(suffix) - 1] + '"'
+                break
+        if candidate == etag:
+            return True
+    return False
+
+
+def cached_response(request: Request, cached: CachedBody) -> Response:
+    """
+    Ответ с ETag и Cache-Control: max-age = оставшаяся свежесть данных.
+    Совпал If-None-Match — 304 без тела.
+    """
+    headers = {
+        "ETag": cached.etag,
+        "Cache-Control": f"public, max-age={max(0, int(cached.expires - time.time()))}",
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, cached.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
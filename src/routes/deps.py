@@ -1,7 +1,17 @@
 import httpx
-from fastapi import Depends
+from fastapi import HTTPException
+from starlette.requests import HTTPConnection
 
+from src.core.tracing import is_admin
 
-async def get_http_client():
-    async with httpx.AsyncClient() as client:
-        yield client
\ No newline at end of file
+
+async def get_http_client(connection: HTTPConnection) -> httpx.AsyncClient:
+    # клиент создаётся один раз в lifespan приложения (src/main.py);
+    # HTTPConnection — чтобы зависимость работала и в WebSocket-маршрутах
+    return connection.app.state.http_client
+
+
+async def require_admin(connection: HTTPConnection):
+    # без ADMIN_TOKEN отладочные эндпоинты выключены
+    if not is_admin(connection.headers):
+        raise HTTPException(status_code=404, detail="Not Found")
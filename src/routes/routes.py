@@ -1,58 +1,573 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import math
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 import httpx
 
-from src.routes.deps import get_http_client
-from src.services.weather_service import get_weather
-from src.services.currency_service import convert_currency
-from src.schemas.weather import WeatherResponse
-from src.schemas.currency import CurrencyConvertResponse
+from src.routes import caching
+from src.routes.caching import CachedBody
+from src.routes.deps import get_http_client, require_admin
+from src.core.config import settings
+from src.core import metrics
+from src.core import tracing
+from src.core.admission import CACHED, UPSTREAM, admit
+from src.core.tracing import span
+from src.integrations.policy import UpstreamUnavailable
+from src.integrations.quota import QuotaExceeded
+from src.services.weather_service import (
+    SECTIONS,
+    CityNotFound,
+    forecast_key,
+    get_forecast,
+    get_weather,
+    get_weather_many,
+    weather_key,
+)
+from src.services.currency_service import convert_currency, get_rate_table, rate_table_key
+from src.services.streams import STREAM_SUBSCRIBERS, hub
+from src.services.places import get_place_index
+from src.utils.utils import cached_locally, get_cache, get_cache_many, set_cache
+from src.schemas.weather import (
+    WeatherResponse,
+    WeatherSectionsResponse,
+    WeatherBatchRequest,
+    WeatherBatchResponse,
+    WeatherSuggestResponse,
+    WeatherHourlyResponse,
+    WeatherDailyResponse,
+)
+from src.schemas.currency import (
+    CurrencyConvertResponse,
+    CurrencyBatchRequest,
+    CurrencyBatchResponse,
+    CurrencyBatchColumnsResponse,
+    CurrencyHistoryResponse,
+    CurrencyAtResponse,
+    CurrencyRatesEvent,
+)
 
 router = APIRouter()
 
 
-@router.get("/weather", response_model=WeatherResponse)
+async def _cached_body(key: str) -> Optional[CachedBody]:
+    """Готовое тело ответа из кэша — отдаётся без валидации и сериализации."""
+    if not settings.response_cache_enabled:
+        return None
+    data = await get_cache(key)
+    return caching.unpack(data) if isinstance(data, bytes) else None
+
+
+async def _fresh_body(data_keys: List[str], body: bytes) -> CachedBody:
+    # тело свежо не дольше данных, из которых оно собрано;
+    # этот срок уходит клиенту в Cache-Control
+    entries = await get_cache_many(data_keys)
+    expires = time.time()
+    if len(entries) == len(data_keys):
+        expires = min(entry["soft"] for entry in entries.values())
+    return caching.make_cached_body(body, expires)
+
+
+async def _store_body(key: str, data_keys: List[str], body: bytes) -> CachedBody:
+    # тело живёт в кэше до soft-истечения данных, чтобы потом запрос дошёл до SWR и обновления
+    cached = await _fresh_body(data_keys, body)
+    ttl = int(cached.expires - time.time())
+    if settings.response_cache_enabled and ttl > 0:
+        await set_cache(key, caching.pack(cached), ttl)
+    return cached
+
+
+def _priority(data_keys: List[str]) -> int:
+    # данные уже в памяти процесса — запрос обслуживается без API и идёт в очереди первым
+    return CACHED if cached_locally(data_keys) else UPSTREAM
+
+
+def _unavailable(exc: UpstreamUnavailable) -> HTTPException:
+    if isinstance(exc, QuotaExceeded):
+        status_code, detail = 429, "External service quota exhausted"
+    else:
+        status_code, detail = 503, "External service temporarily unavailable"
+    return HTTPException(
+        status_code=status_code,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+    )
+
+
+def _parse_sections(value: Optional[str]) -> tuple:
+    if value is None:
+        return SECTIONS
+    requested = {section.strip().lower() for section in value.split(",") if section.strip()}
+    unknown = requested - set(SECTIONS)
+    if not requested or unknown:
+        raise HTTPException(
+            status_code=422,
+            detail=f"sections must be a comma-separated subset of {', '.join(SECTIONS)}",
+        )
+    # порядок фиксирован, чтобы "daily,current" и "current,daily" делили кэш
+    return tuple(section for section in SECTIONS if section in requested)
+
+
+@router.get("/weather", response_model=WeatherResponse | WeatherSectionsResponse)
 async def weather(
+    request: Request,
     city: str,
+    sections: Optional[str] = Query(None, description="current, daily, hourly (comma-separated)"),
     client: httpx.AsyncClient = Depends(get_http_client),
 ):
-    try:
-        return await get_weather(city, client)
+    selected = _parse_sections(sections)
+    partial = sections is not None
+    data_keys = [weather_key(city, section) for section in selected]
+    body_key = f"http:weather:{city.strip().lower()}:{','.join(selected) if partial else 'all'}"
 
-    except ValueError:
-        raise HTTPException(status_code=404, detail="City not found")
+    cached = await _cached_body(body_key)
+    if cached is not None:
+        return caching.cached_response(request, cached)
 
-    except httpx.HTTPError:
-        raise HTTPException(status_code=502, detail="External weather service error")
+    # ответы из кэша выше не ждут очереди; здесь — промахи, которым может понадобиться API
+    async with admit("weather", _priority(data_keys)):
+        try:
+            result = await get_weather(city, client, selected)
+            with span("serialize"):
+                if partial:
+                    model = WeatherSectionsResponse.model_validate(result)
+                    body = model.model_dump_json(exclude_unset=True).encode()
+                else:
+                    body = WeatherResponse.model_validate(result).model_dump_json().encode()
+            cached = await _store_body(body_key, data_keys, body)
+            return caching.cached_response(request, cached)
+
+        except UpstreamUnavailable as e:
+            raise _unavailable(e)
+
+        except ValueError:
+            raise HTTPException(status_code=404, detail="City not found")
+
+        except httpx.HTTPError:
+            raise HTTPException(status_code=502, detail="External weather service error")
+
+        except Exception:
+            raise HTTPException(status_code=500, detail="Internal server error")
+
+
+def _weather_error_detail(exc: BaseException) -> str:
+    if isinstance(exc, UpstreamUnavailable):
+        return "External weather service temporarily unavailable"
+    if isinstance(exc, ValueError):
+        return "City not found"
+    if isinstance(exc, asyncio.TimeoutError):
+        return "Weather service timeout"
+    if isinstance(exc, httpx.HTTPError):
+        return "External weather service error"
+    return "Internal server error"
 
-    except Exception:
-        raise HTTPException(status_code=500, detail="Internal server error")
+
+async def _weather_batch(cities: List[str], client: httpx.AsyncClient):
+    # "Moscow,Berlin" и повторяющиеся параметры дают один и тот же список
+    names = []
+    for value in cities:
+        for city in value.split(","):
+            city = city.strip()
+            if city and city not in names:
+                names.append(city)
+
+    if not names:
+        raise HTTPException(status_code=422, detail="At least one city is required")
+    if len(names) > settings.weather_batch_max_cities:
+        raise HTTPException(
+            status_code=422,
+            detail=f"At most {settings.weather_batch_max_cities} cities per request",
+        )
+
+    keys = [weather_key(city, section) for city in names for section in SECTIONS]
+    async with admit("weather_batch", _priority(keys)):
+        results = await get_weather_many(names, client)
+
+    items, errors = [], []
+    for city, result in results.items():
+        if isinstance(result, BaseException):
+            errors.append({"city": city, "detail": _weather_error_detail(result)})
+        else:
+            items.append(result)
+    return {"items": items, "errors": errors}
+
+
+@router.get("/weather/batch", response_model=WeatherBatchResponse)
+async def weather_batch(
+    cities: List[str] = Query(...),
+    client: httpx.AsyncClient = Depends(get_http_client),
+):
+    return await _weather_batch(cities, client)
+
+
+@router.post("/weather/batch", response_model=WeatherBatchResponse)
+async def weather_batch_post(
+    payload: WeatherBatchRequest,
+    client: httpx.AsyncClient = Depends(get_http_client),
+):
+    return await _weather_batch(payload.cities, client)
+
+
+@router.get("/weather/suggest", response_model=WeatherSuggestResponse)
+async def weather_suggest(
+    q: str = Query(..., min_length=1),
+    limit: Optional[int] = Query(None, ge=1),
+):
+    """Подсказки городов по началу названия (с опечатками и кириллицей) — без внешних запросов."""
+    limit = min(limit or settings.places_suggest_limit, settings.places_suggest_limit)
+    places = get_place_index().suggest(q, limit)
+    return {"items": [place._asdict() for place in places]}
+
+
+async def _forecast(city: str, section: str, start: float, limit: int, client: httpx.AsyncClient):
+    async with admit("weather", _priority([forecast_key(city, section)])):
+        try:
+            series = await get_forecast(city, section, client)
+        except UpstreamUnavailable as e:
+            raise _unavailable(e)
+        except CityNotFound:
+            raise HTTPException(status_code=404, detail="City not found")
+        except ValueError:
+            raise HTTPException(status_code=502, detail="External weather service error")
+
+    # срез колонок из кэша — без разбора JSON и построчной валидации Pydantic
+    return JSONResponse({"city": city, **series.to_columns(series.window(start, limit))})
+
+
+@router.get("/weather/hourly", response_model=WeatherHourlyResponse)
+async def weather_hourly(
+    city: str,
+    start: Optional[datetime] = Query(None, alias="from"),
+    limit: int = Query(24, ge=1),
+    client: httpx.AsyncClient = Depends(get_http_client),
+):
+    """Почасовой прогноз с часа from (по умолчанию — текущего), не больше limit часов."""
+    now = time.time()
+    return await _forecast(city, "hourly", _unix(start, now - now % 3600), limit, client)
+
+
+@router.get("/weather/daily", response_model=WeatherDailyResponse)
+async def weather_daily(
+    city: str,
+    start: Optional[datetime] = Query(None, alias="from"),
+    limit: int = Query(7, ge=1),
+    client: httpx.AsyncClient = Depends(get_http_client),
+):
+    """Прогноз по дням с дня from (по умолчанию — сегодняшнего, UTC), не больше limit дней."""
+    now = time.time()
+    return await _forecast(city, "daily", _unix(start, now - now % 86400), limit, client)
 
 
 @router.get("/currency", response_model=CurrencyConvertResponse)
 async def convert(
+    request: Request,
     from_cur: str,
     to: str,
     amount: float,
     client: httpx.AsyncClient = Depends(get_http_client),
 ):
-    try:
-        result = await convert_currency(from_cur.upper(), to.upper(), amount, client)
+    from_cur, to = from_cur.upper(), to.upper()
 
-        print(result)
+    # готовое тело не кэшируется: ключ с суммой неограничен (каждая сумма — новая запись
+    # в L1 и Redis), а ответ и так собирается из закэшированной таблицы курсов
+    async with admit("currency", _priority([rate_table_key(from_cur)])):
+        try:
+            result = await convert_currency(from_cur, to, amount, client)
 
-        return CurrencyConvertResponse(
-            from_currency=from_cur.upper(),
-            to_currency=to.upper(),
-            amount=amount,
-            converted_amount=result["converted"],
-            rate=result["rate"],
-        )
+            with span("serialize"):
+                body = CurrencyConvertResponse(
+                    from_currency=from_cur,
+                    to_currency=to,
+                    amount=amount,
+                    converted_amount=result["converted"],
+                    rate=result["rate"],
+                ).model_dump_json().encode()
+            cached = await _fresh_body([rate_table_key(from_cur)], body)
+            return caching.cached_response(request, cached)
+
+        except UpstreamUnavailable as e:
+            raise _unavailable(e)
+
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        except httpx.HTTPError:
+            raise HTTPException(status_code=502, detail="External currency service error")
+
+        except Exception:
+            raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.post(
+    "/currency/batch",
+    response_model=CurrencyBatchResponse | CurrencyBatchColumnsResponse,
+)
+async def convert_many(
+    payload: CurrencyBatchRequest,
+    client: httpx.AsyncClient = Depends(get_http_client),
+):
+    # numpy-сервисы импортируются при первом запросе — не замедляют старт приложения
+    from src.services.currency_batch import convert_batch
 
+    async with admit("currency_batch"):
+        try:
+            columns = await convert_batch(*payload.columns(), client)
+        except Exception:
+            raise HTTPException(status_code=500, detail="Internal server error")
+
+    # ответ уже собран из колонок — отдаём его без построчной валидации Pydantic
+    if payload.is_columnar:
+        return JSONResponse(columns)
+
+    keys = list(columns)
+    rows = [dict(zip(keys, row)) for row in zip(*columns.values())]
+    return JSONResponse({"results": rows})
+
+def _unix(value: Optional[datetime], default: float) -> float:
+    if value is None:
+        return default
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _finite(values) -> list:
+    return [v if math.isfinite(v) else None for v in values.tolist()]
+
+
+@router.get("/currency/history", response_model=CurrencyHistoryResponse)
+async def currency_history(
+    from_cur: str = Query(alias="from"),
+    to: str = Query(),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    step: Optional[float] = Query(None, gt=0, description="Seconds between points"),
+    amount: Optional[float] = Query(None, gt=0),
+):
+    """Курсы из локальной истории снимков, без запросов к внешнему API."""
+    import numpy as np
+    from src.services.rate_history import get_rate_history
+
+    from_cur, to = from_cur.upper(), to.upper()
+    end_ts = _unix(end, time.time())
+    start_ts = _unix(start, end_ts - 86400)
+    if start_ts > end_ts:
+        raise HTTPException(status_code=422, detail="start must not be after end")
+
+    try:
+        times, rates = get_rate_history().rates(from_cur, to, start_ts, end_ts, step)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Currency not found in history")
     except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
+        raise HTTPException(status_code=422, detail=str(e))
+
+    converted = None
+    if amount is not None:
+        converted = _finite(np.round(rates * amount, 2))
+
+    # колонки уже посчитаны numpy — без построчной валидации Pydantic
+    return JSONResponse({
+        "from_currency": from_cur,
+        "to_currency": to,
+        "amount": amount,
+        "timestamps": times.tolist(),
+        "rates": _finite(rates),
+        "converted_amount": converted,
+    })
+
+
+@router.get("/currency/at", response_model=CurrencyAtResponse)
+async def currency_at(
+    ts: datetime,
+    from_cur: str = Query(settings.currency_pivot, alias="from"),
+    to: Optional[str] = None,
+    amount: Optional[float] = Query(None, gt=0),
+):
+    """Курсы на момент ts (последний снимок не позже него)."""
+    from src.services.rate_history import get_rate_history
 
+    from_cur = from_cur.upper()
+    try:
+        snapshot = get_rate_history().at(_unix(ts, 0), from_cur)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Currency not found in history")
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="No rates recorded at this time")
+
+    snapshot_ts, rates = snapshot
+    if to is not None:
+        to = to.upper()
+        if to not in rates:
+            raise HTTPException(status_code=404, detail="Currency not found in history")
+        rates = {to: rates[to]}
+
+    converted = None
+    if amount is not None:
+        converted = {code: round(rate * amount, 2) for code, rate in rates.items()}
+
+    return {
+        "timestamp": snapshot_ts,
+        "from_currency": from_cur,
+        "amount": amount,
+        "rates": rates,
+        "converted_amount": converted,
+    }
+
+
+Loader = Callable[[], Awaitable[bytes]]
+
+
+def _currency_loader(base: str, client: httpx.AsyncClient) -> Loader:
+    async def load() -> bytes:
+        table = await get_rate_table(base, client)
+        return CurrencyRatesEvent(base=base, rates=table["rates"]).model_dump_json().encode()
+    return load
+
+
+def _weather_loader(city: str, sections: tuple, client: httpx.AsyncClient) -> Loader:
+    async def load() -> bytes:
+        result = await get_weather(city, client, sections)
+        if sections == SECTIONS:
+            return WeatherResponse.model_validate(result).model_dump_json().encode()
+        model = WeatherSectionsResponse.model_validate(result)
+        return model.model_dump_json(exclude_unset=True).encode()
+    return load
+
+
+async def _first(load: Loader, not_found: str) -> bytes:
+    """Текущее значение до открытия потока — ошибки отдаются обычным HTTP-статусом."""
+    try:
+        return await load()
+    except UpstreamUnavailable as e:
+        raise _unavailable(e)
+    except ValueError:
+        raise HTTPException(status_code=404, detail=not_found)
     except httpx.HTTPError:
-        raise HTTPException(status_code=502, detail="External currency service error")
+        raise HTTPException(status_code=502, detail="External service error")
+
+
+def _sse(topic: str, load: Loader, payload: bytes) -> StreamingResponse:
+    async def events():
+        STREAM_SUBSCRIBERS.labels("sse").inc()
+        try:
+            async with hub.subscribe(topic, load, payload) as queue:
+                while True:
+                    try:
+                        data = await asyncio.wait_for(queue.get(), timeout=settings.stream_heartbeat)
+                    except asyncio.TimeoutError:
+                        # комментарий держит соединение через прокси
+                        yield b": ping\n\n"
+                        continue
+                    yield b"event: update\ndata: " + data + b"\n\n"
+        finally:
+            STREAM_SUBSCRIBERS.labels("sse").dec()
 
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _websocket(websocket: WebSocket, topic: str, load: Loader):
+    try:
+        payload = await load()
     except Exception:
-        raise HTTPException(status_code=500, detail="Internal server error")
\ No newline at end of file
+        await websocket.close(code=1011, reason="Initial value unavailable")
+        return
+
+    await websocket.accept()
+    STREAM_SUBSCRIBERS.labels("websocket").inc()
+    try:
+        async with hub.subscribe(topic, load, payload) as queue:
+            async def send_updates():
+                while True:
+                    await websocket.send_text((await queue.get()).decode())
+
+            sender = asyncio.create_task(send_updates())
+            try:
+                # входящие сообщения не нужны — ждём только закрытия клиентом
+                while (await websocket.receive())["type"] != "websocket.disconnect":
+                    pass
+            finally:
+                sender.cancel()
+                await asyncio.gather(sender, return_exceptions=True)
+    finally:
+        STREAM_SUBSCRIBERS.labels("websocket").dec()
+
+
+@router.get("/stream/currency")
+async def stream_currency(
+    base: str = Query(settings.currency_pivot, pattern="^[A-Za-z]{3}$"),
+    client: httpx.AsyncClient = Depends(get_http_client),
+):
+    """SSE: таблица курсов base при каждом её изменении."""
+    base = base.upper()
+    load = _currency_loader(base, client)
+    payload = await _first(load, "Currency not found")
+    return _sse(f"currency:{base}", load, payload)
+
+
+@router.get("/stream/weather")
+async def stream_weather(
+    city: str,
+    sections: Optional[str] = Query(None, description="current, daily, hourly (comma-separated)"),
+    client: httpx.AsyncClient = Depends(get_http_client),
+):
+    """SSE: погода города при каждом её изменении."""
+    selected = _parse_sections(sections)
+    load = _weather_loader(city, selected, client)
+    payload = await _first(load, "City not found")
+    return _sse(f"weather:{city.strip().lower()}:{','.join(selected)}", load, payload)
+
+
+@router.websocket("/stream/currency")
+async def stream_currency_ws(
+    websocket: WebSocket,
+    base: str = settings.currency_pivot,
+    client: httpx.AsyncClient = Depends(get_http_client),
+):
+    base = base.upper()
+    await _websocket(websocket, f"currency:{base}", _currency_loader(base, client))
+
+
+@router.websocket("/stream/weather")
+async def stream_weather_ws(
+    websocket: WebSocket,
+    city: str,
+    sections: Optional[str] = None,
+    client: httpx.AsyncClient = Depends(get_http_client),
+):
+    try:
+        selected = _parse_sections(sections)
+    except HTTPException:
+        await websocket.close(code=1008, reason="Invalid sections")
+        return
+    await _websocket(
+        websocket,
+        f"weather:{city.strip().lower()}:{','.join(selected)}",
+        _weather_loader(city, selected, client),
+    )
+
+
+@router.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/debug/traces", include_in_schema=False, dependencies=[Depends(require_admin)])
+async def debug_traces(limit: int = Query(50, ge=1)):
+    """Последние сэмплированные трейсы этого воркера, новые первыми."""
+    return {"items": list(reversed(tracing.recent_traces))[:limit]}
+
+
+@router.get("/debug/profiles/{profile_id}", include_in_schema=False, dependencies=[Depends(require_admin)])
+async def debug_profile(profile_id: str):
+    """Профиль запроса в формате folded (flamegraph.pl, speedscope)."""
+    folded = tracing.profiles.get(profile_id)
+    if folded is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(folded)
@@ -1,5 +1,8 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from decimal import Decimal
+from typing import Dict, List, Optional
+
+from src.core.config import settings
 
 
 class CurrencyConvertRequest(BaseModel):
@@ -12,4 +15,97 @@ class CurrencyConvertResponse(BaseModel):
     to_currency: str
     amount: Decimal
     converted_amount: Decimal
-    rate: Decimal
\ No newline at end of file
+    rate: Decimal
+
+class CurrencyBatchItem(BaseModel):
+    # коды не валидируем здесь: ошибка в одной строке не должна ронять весь батч
+    from_currency: str = Field(example="USD")
+    to_currency: str = Field(example="EUR")
+    amount: float = Field(example=100)
+
+
+class CurrencyBatchRequest(BaseModel):
+    """
+    Либо список строк в items, либо колонки одинаковой длины
+    from_currency / to_currency / amount (быстрее для больших батчей).
+    """
+    items: Optional[List[CurrencyBatchItem]] = None
+    from_currency: Optional[List[str]] = None
+    to_currency: Optional[List[str]] = None
+    amount: Optional[List[float]] = None
+
+    @model_validator(mode="after")
+    def check_shape(self):
+        columns = (self.from_currency, self.to_currency, self.amount)
+        if self.items is not None:
+            if any(c is not None for c in columns):
+                raise ValueError("Use either items or columns, not both")
+            rows = len(self.items)
+        else:
+            if any(c is None for c in columns):
+                raise ValueError("Either items or all of from_currency, to_currency, amount are required")
+            rows = len(self.amount)
+            if len(self.from_currency) != rows or len(self.to_currency) != rows:
+                raise ValueError("Columns must have the same length")
+        if rows > settings.currency_batch_max_rows:
+            raise ValueError(f"Batch is limited to {settings.currency_batch_max_rows} rows")
+        return self
+
+    @property
+    def is_columnar(self) -> bool:
+        return self.items is None
+
+    def columns(self):
+        if self.items is None:
+            return self.from_currency, self.to_currency, self.amount
+        return (
+            [item.from_currency for item in self.items],
+            [item.to_currency for item in self.items],
+            [item.amount for item in self.items],
+        )
+
+
+class CurrencyBatchResult(BaseModel):
+    from_currency: str
+    to_currency: str
+    amount: Decimal
+    converted_amount: Optional[Decimal]
+    rate: Optional[Decimal]
+    error: Optional[str]
+
+
+class CurrencyBatchResponse(BaseModel):
+    results: List[CurrencyBatchResult]
+
+
+class CurrencyBatchColumnsResponse(BaseModel):
+    from_currency: List[str]
+    to_currency: List[str]
+    amount: List[Decimal]
+    converted_amount: List[Optional[Decimal]]
+    rate: List[Optional[Decimal]]
+    error: List[Optional[str]]
+
+
+class CurrencyHistoryResponse(BaseModel):
+    """Колонки: время снимка (unix, секунды), курс и, если задан amount, сумма."""
+    from_currency: str
+    to_currency: str
+    amount: Optional[float]
+    timestamps: List[float]
+    rates: List[Optional[float]]
+    converted_amount: Optional[List[Optional[float]]]
+
+
+class CurrencyAtResponse(BaseModel):
+    timestamp: float
+    from_currency: str
+    amount: Optional[float]
+    rates: Dict[str, float]
+    converted_amount: Optional[Dict[str, float]]
+
+
+class CurrencyRatesEvent(BaseModel):
+    """Событие /stream/currency: полная таблица курсов базовой валюты."""
+    base: str
+    rates: Dict[str, Decimal]
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, Field
+from typing import List, Optional
 
 class HourlyEntry(BaseModel):
     time: str
@@ -24,4 +24,72 @@ class WeatherResponse(BaseModel):
     summary_tomorrow: str
     temp_min_tomorrow: float
     temp_max_tomorrow: float
-    hourly: List[HourlyEntry]
\ No newline at end of file
+    hourly: List[HourlyEntry]
+
+
+class WeatherSectionsResponse(BaseModel):
+    """Ответ /weather?sections=...: только поля запрошенных секций."""
+    city: str
+    # current
+    temperature: Optional[float] = None
+    description: Optional[str] = None
+    icon: Optional[int] = None
+    wind_speed: Optional[float] = None
+    wind_dir: Optional[str] = None
+    cloud_cover: Optional[int] = None
+    precipitation: Optional[float] = None
+    precip_type: Optional[str] = None
+    # daily
+    temp_min: Optional[float] = None
+    temp_max: Optional[float] = None
+    summary_today: Optional[str] = None
+    summary_tomorrow: Optional[str] = None
+    temp_min_tomorrow: Optional[float] = None
+    temp_max_tomorrow: Optional[float] = None
+    # hourly
+    hourly: Optional[List[HourlyEntry]] = None
+
+
+class WeatherBatchRequest(BaseModel):
+    cities: List[str] = Field(min_length=1)
+
+
+class WeatherBatchError(BaseModel):
+    city: str
+    detail: str
+
+
+class WeatherBatchResponse(BaseModel):
+    items: List[WeatherResponse]
+    errors: List[WeatherBatchError]
+
+
+class PlaceSuggestion(BaseModel):
+    place_id: str
+    name: str
+    country: str
+
+
+class WeatherSuggestResponse(BaseModel):
+    items: List[PlaceSuggestion]
+
+
+class WeatherHourlyResponse(BaseModel):
+    """Колонки почасового прогноза: время (unix, секунды) и значения на каждый час."""
+    city: str
+    time: List[int]
+    temperature: List[Optional[float]]
+    precipitation: List[Optional[float]]
+    icon: List[int]
+    summary: List[str]
+
+
+class WeatherDailyResponse(BaseModel):
+    """Колонки прогноза по дням: начало дня (unix, UTC) и значения за день."""
+    city: str
+    time: List[int]
+    temp_min: List[Optional[float]]
+    temp_max: List[Optional[float]]
+    precipitation: List[Optional[float]]
+    icon: List[int]
+    summary: List[str]
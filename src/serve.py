@@ -0,0 +1,177 @@
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from importlib.util import find_spec
+
+import uvicorn
+
+from src.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Продакшен-запуск API несколькими процессами:
+#   python -m src.serve [--workers N] [--host HOST] [--port PORT]
+#
+# Мастер один раз импортирует приложение и читает настройки, открывает сокет
+# и делает fork воркеров — они получают уже загруженные модули (copy-on-write)
+# и принимают соединения с общего сокета. По SIGTERM/SIGINT воркеры перестают
+# принимать соединения, дожидаются начатых запросов (web_graceful_timeout)
+# и выполняют shutdown приложения: фоновые записи, пул HTTP, Redis.
+
+# воркер, упавший быстрее этого, перезапускается с паузой, а не в цикле
+_MIN_UPTIME = 1.0
+
+
+def worker_count() -> int:
+    return settings.web_workers or os.cpu_count() or 1
+
+
+def loop_setup() -> tuple[str, str]:
+    """uvloop и httptools, если установлены, иначе стандартные asyncio и h11."""
+    loop = "uvloop" if find_spec("uvloop") is not None else "asyncio"
+    http = "httptools" if find_spec("httptools") is not None else "h11"
+    return loop, http
+
+
+def preload():
+    """Всё, что воркеры иначе загрузили бы каждый сам: приложение, справочник городов, сертификаты."""
+    # транспорт httpx импортирует httpcore лениво, при создании первого клиента в lifespan
+    import httpcore  # noqa: F401
+
+    from src.core.http import ssl_context
+    from src.main import app
+    from src.services.places import get_place_index
+    # модули на numpy приложение импортирует лениво, при первом запросе;
+    # воркерам они достаются загруженными до fork
+    import src.services.currency_batch  # noqa: F401
+    import src.services.forecast  # noqa: F401
+    import src.services.rate_history  # noqa: F401
+
+    get_place_index()
+    ssl_context()
+    # объекты, созданные до fork, сборщик мусора больше не обходит —
+    # страницы памяти остаются общими с мастером
+    gc.collect()
+    gc.freeze()
+    return app
+
+
+def bind(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(settings.web_backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def make_server(app) -> uvicorn.Server:
+    loop, http = loop_setup()
+    config = uvicorn.Config(
+        app,
+        loop=loop,
+        http=http,
+        lifespan="on",
+        proxy_headers=True,
+        timeout_graceful_shutdown=settings.web_graceful_timeout,
+    )
+    return uvicorn.Server(config)
+
+
+class Supervisor:
+    """Держит workers воркеров, перезапускает упавших, при остановке — ждёт и добивает."""
+
+    def __init__(self, app, sock: socket.socket, workers: int):
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.children: dict[int, float] = {}  # pid -> время запуска
+        self.stopping = False
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            # в воркере сигналы обрабатывает uvicorn
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 0
+            try:
+                make_server(self.app).run(sockets=[self.sock])
+            except BaseException:
+                logger.exception("Worker %d crashed", os.getpid())
+                code = 1
+            finally:
+                logging.shutdown()
+                os._exit(code)
+        self.children[pid] = time.monotonic()
+
+    def stop(self, signum, frame):
+        if not self.stopping:
+            logger.info("Received %s, draining %d workers", signal.Signals(signum).name, len(self.children))
+        self.stopping = True
+        for pid in self.children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self) -> int:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for _ in range(self.workers):
+            self.spawn()
+        logger.info("Serving with %d workers (pid %d)", self.workers, os.getpid())
+
+        deadline = None
+        while self.children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                if self.stopping:
+                    deadline = deadline or time.monotonic() + settings.web_graceful_timeout + 5
+                    if time.monotonic() > deadline:
+                        for child in self.children:
+                            try:
+                                os.kill(child, signal.SIGKILL)
+                            except ProcessLookupError:
+                                pass
+                time.sleep(0.1)
+                continue
+
+            started = self.children.pop(pid)
+            if self.stopping:
+                continue
+            logger.warning("Worker %d exited with status %d, restarting", pid, os.waitstatus_to_exitcode(status))
+            if time.monotonic() - started < _MIN_UPTIME:
+                time.sleep(_MIN_UPTIME)
+            self.spawn()
+        return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m src.serve", description="Run the API with worker processes")
+    parser.add_argument("--workers", type=int, default=worker_count())
+    parser.add_argument("--host", default=settings.web_host)
+    parser.add_argument("--port", type=int, default=settings.web_port)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    app = preload()
+    loop, http = loop_setup()
+    logger.info("App preloaded in %.0f ms (loop=%s, http=%s)", (time.perf_counter() - started) * 1000, loop, http)
+
+    sock = bind(args.host, args.port)
+    if args.workers <= 1:
+        make_server(app).run(sockets=[sock])
+        return 0
+    return Supervisor(app, sock, args.workers).run()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout, format="%(asctime)s %(process)d %(name)s: %(message)s")
+    raise SystemExit(main())
@@ -0,0 +1,192 @@
+import asyncio
+from decimal import Decimal
+
+import httpx
+import numpy as np
+
+from src.core.config import settings
+from src.integrations.policy import UpstreamUnavailable
+from src.services.currency_service import derive_rate, get_rate_table, rate_table_key
+from src.utils.refresh import read_cached
+from src.utils.popularity import currency_popularity
+from src.utils.utils import get_cache
+
+
+async def resolve_rate_tables(bases: list[str], client) -> dict:
+    """
+    Таблицы курсов для всех нужных базовых валют за один проход.
+    Если таблицы базы нет в кэше, но её покрывает опорная таблица —
+    используем опорную, иначе грузим таблицу базы (с SWR и склейкой запросов).
+    Вместо таблицы может вернуться исключение — оно станет ошибкой строк.
+    """
+    entries = await asyncio.gather(*(get_cache(rate_table_key(base)) for base in bases))
+
+    pivot = settings.currency_pivot
+    pivot_table = None
+    if any(entry is None and base != pivot for base, entry in zip(bases, entries)):
+        pivot_table = await read_cached(rate_table_key(pivot))
+
+    async def resolve(base, entry):
+        if entry is None and pivot_table and base in pivot_table["rates"]:
+            currency_popularity.record(rate_table_key(pivot))
+            return pivot_table
+        return await get_rate_table(base, client, entry=entry)
+
+    tables = await asyncio.gather(
+        *(resolve(base, entry) for base, entry in zip(bases, entries)),
+        return_exceptions=True,
+    )
+    return dict(zip(bases, tables))
+
+
+def _error_message(exc: BaseException) -> str:
+    if isinstance(exc, UpstreamUnavailable):
+        return "External currency service temporarily unavailable"
+    if isinstance(exc, ValueError):
+        return str(exc)
+    if isinstance(exc, httpx.HTTPError):
+        return "External currency service error"
+    return "Internal server error"
+
+
+def build_rate_matrix(tables: list[dict]):
+    """
+    Матрица курсов: строка — таблица, столбец — валюта (по отсортированным кодам).
+    Отсутствующие курсы — NaN.
+    """
+    codes = np.array(sorted({code for table in tables for code in table["rates"]}))
+    matrix = np.full((len(tables), len(codes)), np.nan)
+    for row, table in enumerate(tables):
+        rates = table["rates"]
+        columns = np.searchsorted(codes, np.array(list(rates)))
+        matrix[row, columns] = np.array(list(rates.values()), dtype=np.float64)
+    return codes, matrix
+
+
+def _lookup(codes: np.ndarray, values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Индексы values в отсортированном codes и маска найденных."""
+    if len(codes) == 0:
+        return np.zeros(len(values), dtype=np.intp), np.zeros(len(values), dtype=bool)
+    idx = np.searchsorted(codes, values)
+    idx = np.minimum(idx, len(codes) - 1)
+    return idx, codes[idx] == values
+
+
+# относительная погрешность float-произведения с запасом: суммы, которые ближе
+# к границе округления, досчитываются в Decimal
+_ROUNDING_MARGIN = 1e-9
+# больше 2**53 центов float не различает соседние значения
+_MAX_EXACT_CENTS = 2.0 ** 53
+
+
+def _amount_strings(amounts: np.ndarray) -> np.ndarray:
+    """str(Decimal(str(amount))) — как amount в ответе GET /currency."""
+    text = np.array(list(map(repr, amounts.tolist())), dtype=object)
+    # repr пишет экспоненту вне [1e-4, 1e16), а nan/inf — иначе, чем Decimal
+    size = np.abs(amounts)
+    odd = ~np.isfinite(amounts) | (size >= 1e16) | ((size < 1e-4) & (size > 0))
+    for i in np.flatnonzero(odd).tolist():
+        text[i] = str(Decimal(repr(float(amounts[i]))))
+    return text
+
+
+def _cents_strings(cents: np.ndarray) -> np.ndarray:
+    """Целые центы (>= 0) -> "123.45"."""
+    whole = (cents // 100).astype(str)
+    frac = np.char.zfill((cents % 100).astype(str), 2)
+    return np.char.add(np.char.add(whole, "."), frac).astype(object)
+
+
+async def convert_batch(from_currency: list, to_currency: list, amount: list, client) -> dict:
+    """
+    Векторная конвертация колонок (from, to, amount).
+    Курс строки = M[t, to] / M[t, from], где t — таблица, по которой считается base,
+    поэтому и прямые курсы, и кросс-курсы через опорную таблицу считаются одной операцией.
+    Результат совпадает с GET /currency: курс — derive_rate (один Decimal на пару
+    валют), сумма — банковское округление Decimal(str(amount)) * rate до центов.
+    Float-произведение отличается от Decimal на ~1e-16, поэтому в Decimal досчитываются
+    только строки у самой границы половины цента.
+    Возвращает колонки результата (amount, converted_amount, rate — строками, как Decimal
+    в GET /currency); ошибки — построчно в колонке error.
+    """
+    n = len(amount)
+    from_arr = np.char.upper(np.asarray(from_currency, dtype=str).reshape(n))
+    to_arr = np.char.upper(np.asarray(to_currency, dtype=str).reshape(n))
+    amounts = np.asarray(amount, dtype=np.float64).reshape(n)
+
+    error = np.full(n, None, dtype=object)
+
+    valid_codes = (
+        (np.char.str_len(from_arr) == 3) & np.char.isalpha(from_arr)
+        & (np.char.str_len(to_arr) == 3) & np.char.isalpha(to_arr)
+    )
+    error[~valid_codes] = "Invalid currency code"
+    valid_amount = np.isfinite(amounts) & (amounts > 0)
+    error[valid_codes & ~valid_amount] = "Amount must be greater than 0"
+    ok = valid_codes & valid_amount
+
+    bases, base_idx = np.unique(from_arr, return_inverse=True)
+    needed = np.unique(base_idx[ok])
+    resolved = await resolve_rate_tables([str(bases[i]) for i in needed], client)
+
+    # номер строки матрицы для каждой базы; -1 — таблицу получить не удалось
+    table_rows = np.full(len(bases), -1, dtype=np.intp)
+    tables = []
+    for i in needed:
+        table = resolved[str(bases[i])]
+        if isinstance(table, BaseException):
+            error[ok & (base_idx == i)] = _error_message(table)
+            continue
+        table_rows[i] = len(tables)
+        tables.append(table)
+
+    row_table = table_rows[base_idx]
+    ok &= row_table >= 0
+
+    rate = np.full(n, np.nan)
+    codes = np.array([], dtype=str)
+    from_idx = to_idx = np.zeros(n, dtype=np.intp)
+    if tables:
+        codes, matrix = build_rate_matrix(tables)
+        from_idx, from_found = _lookup(codes, from_arr)
+        to_idx, to_found = _lookup(codes, to_arr)
+        found = ok & from_found & to_found
+        rate[found] = matrix[row_table[found], to_idx[found]] / matrix[row_table[found], from_idx[found]]
+
+    missing = ok & ~np.isfinite(rate)
+    error[missing] = "Currency not found"
+    ok &= ~missing
+
+    rate_text = np.full(n, None, dtype=object)
+    converted_text = np.full(n, None, dtype=object)
+    rows = np.flatnonzero(ok)
+    if rows.size:
+        # Decimal-курс — один раз на уникальную пару (таблица, from, to)
+        width = len(codes)
+        pair_codes = (row_table[rows] * width + from_idx[rows]) * width + to_idx[rows]
+        pairs, pair_of = np.unique(pair_codes, return_inverse=True)
+        pair_rates = [
+            derive_rate(tables[t], str(codes[f]), str(codes[c]))
+            for t, f, c in zip(*np.unravel_index(pairs, (len(tables), width, width)))
+        ]
+        rate_text[rows] = np.array([str(r) for r in pair_rates], dtype=object)[pair_of]
+
+        cents = amounts[rows] * rate[rows] * 100
+        distance = np.abs(cents - np.floor(cents) - 0.5)
+        exact = (distance > cents * _ROUNDING_MARGIN) & (cents < _MAX_EXACT_CENTS)
+        converted_text[rows[exact]] = _cents_strings(np.rint(cents[exact]).astype(np.int64))
+        for i, pair in zip(rows[~exact].tolist(), pair_of[~exact].tolist()):
+            try:
+                converted_text[i] = str(round(Decimal(str(float(amounts[i]))) * pair_rates[pair], 2))
+            except ArithmeticError:
+                rate_text[i] = None
+                error[i] = "Amount is too large"
+
+    return {
+        "from_currency": from_arr.tolist(),
+        "to_currency": to_arr.tolist(),
+        "amount": _amount_strings(amounts).tolist(),
+        "converted_amount": converted_text.tolist(),
+        "rate": rate_text.tolist(),
+        "error": error.tolist(),
+    }
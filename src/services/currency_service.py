@@ -1,24 +1,90 @@
-from decimal import Decimal
+from decimal import Decimal, localcontext
 
-from src.integrations.currency_api import fetch_rate
+from src.integrations.currency_api import fetch_rates
 from src.core.config import settings
-from src.utils.utils import get_cache, set_cache
+from src.utils.utils import get_cache
+from src.utils.refresh import cached_fetch, read_cached
+from src.utils.popularity import currency_popularity
 
 
-async def convert_currency(from_currency, to_currency, amount, client):
-    key = f"currency:{from_currency}_{to_currency}"
+def rate_table_key(base_currency: str) -> str:
+    return f"currency:rates:{base_currency}"
+
+
+def derive_rate(table: dict, from_currency: str, to_currency: str) -> Decimal:
+    """
+    Курс from -> to из закэшированной таблицы курсов.
+    Курсы в таблице — Decimal (или строки, если кэш в JSON).
+    """
+    rates = table["rates"]
+
+    if table["base"] == from_currency:
+        rate = rates.get(to_currency)
+        if rate is None:
+            raise ValueError("Currency not found")
+        return Decimal(rate)
+
+    # кросс-курс через чужую таблицу: base->to / base->from
+    from_rate = rates.get(from_currency)
+    to_rate = rates.get(to_currency)
+    if from_rate is None or to_rate is None:
+        raise ValueError("Currency not found")
+
+    with localcontext() as ctx:
+        ctx.prec = settings.currency_cross_rate_precision
+        return Decimal(to_rate) / Decimal(from_rate)
+
+
+async def load_rate_table(base_currency: str, client) -> dict:
+    """Одним запросом забирает всю таблицу курсов для базовой валюты."""
+    rates = await fetch_rates(base_currency, client)
+    table = {
+        "base": base_currency,
+        "rates": rates,
+    }
+    # история на numpy — импорт при первой загрузке, а не при старте
+    from src.services.rate_history import record_rate_table
+
+    await record_rate_table(table)
+    return table
 
-    cached = await get_cache(key)
-    if cached:
-        rate = Decimal(cached["rate"])
-    else:
-        rate = await fetch_rate(from_currency, to_currency, client)
-        await set_cache(key, {"rate": str(rate)}, settings.cache_ttl_currency)
+
+async def get_rate_table(base_currency: str, client, **kwargs) -> dict:
+    key = rate_table_key(base_currency)
+    currency_popularity.record(key)
+
+    return await cached_fetch(
+        key,
+        lambda: load_rate_table(base_currency, client),
+        settings.cache_ttl_currency,
+        **kwargs,
+    )
+
+
+async def get_rate(from_currency: str, to_currency: str, client) -> Decimal:
+    entry = await get_cache(rate_table_key(from_currency))
+
+    # таблицы для from нет — пробуем посчитать кросс-курс через опорную валюту
+    pivot = settings.currency_pivot
+    if entry is None and from_currency != pivot:
+        pivot_table = await read_cached(rate_table_key(pivot))
+        if pivot_table:
+            rates = pivot_table["rates"]
+            if from_currency in rates and to_currency in rates:
+                currency_popularity.record(rate_table_key(pivot))
+                return derive_rate(pivot_table, from_currency, to_currency)
+
+    table = await get_rate_table(from_currency, client, entry=entry)
+    return derive_rate(table, from_currency, to_currency)
+
+
+async def convert_currency(from_currency, to_currency, amount, client):
+    rate = await get_rate(from_currency, to_currency, client)
 
     return {
         "from": from_currency,
         "to": to_currency,
         "amount": amount,
-        "converted": round(amount * rate, 2),
+        "converted": round(Decimal(str(amount)) * rate, 2),
         "rate": rate,
-    }
\ No newline at end of file
+    }
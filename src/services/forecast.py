@@ -0,0 +1,148 @@
+import math
+import struct
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Полные ряды прогноза (hourly / daily) в колоночном виде: по массиву на поле
+# и общий список строк-описаний (в колонке summary — номер строки).
+# В кэше ряд лежит одним блоком байт; чтение — np.frombuffer без копирования.
+
+COLUMNS = {
+    "hourly": (
+        ("time", "<i8"),
+        ("temperature", "<f4"),
+        ("precipitation", "<f4"),
+        ("icon", "<i2"),
+        ("summary", "<u2"),
+    ),
+    "daily": (
+        ("time", "<i8"),
+        ("temp_min", "<f4"),
+        ("temp_max", "<f4"),
+        ("precipitation", "<f4"),
+        ("icon", "<i2"),
+        ("summary", "<u2"),
+    ),
+}
+SECTION_IDS = {"hourly": 1, "daily": 2}
+_SECTIONS = {v: k for k, v in SECTION_IDS.items()}
+
+_MAGIC = b"F1"
+_HEADER = struct.Struct("<2sBxII")  # метка, секция, число строк, длина блока строк
+_ALIGN = 8
+
+
+def _pad(size: int) -> int:
+    return -size % _ALIGN
+
+
+def _unix(value: str) -> int:
+    # API отвечает в UTC (timezone=UTC), даты без смещения
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def _today() -> int:
+    return int(time.time()) // 86400 * 86400
+
+
+def _float(value) -> float:
+    return math.nan if value is None else float(value)
+
+
+class ForecastSeries:
+    """Ряд прогноза: колонки-массивы numpy и интернированные описания."""
+
+    def __init__(self, section: str, columns: dict[str, np.ndarray], summaries: list[str]):
+        self.section = section
+        self.columns = columns
+        self.summaries = summaries
+
+    def __len__(self) -> int:
+        return len(self.columns["time"])
+
+    @property
+    def nbytes(self) -> int:
+        return sum(column.nbytes for column in self.columns.values()) + sum(
+            len(s.encode()) for s in self.summaries
+        )
+
+    @classmethod
+    def from_payload(cls, section: str, data: dict) -> "ForecastSeries":
+        """Ряд из ответа meteosource (весь data[section]["data"])."""
+        rows = data[section]["data"]
+        summaries: dict[str, int] = {}
+        values = {name: [] for name, _ in COLUMNS[section]}
+        for i, row in enumerate(rows):
+            if section == "hourly":
+                values["time"].append(_unix(row["date"]))
+                values["temperature"].append(_float(row.get("temperature")))
+                precipitation = row.get("precipitation") or {}
+            else:
+                day = row.get("day")
+                values["time"].append(_unix(day) if day else _today() + i * 86400)
+                all_day = row.get("all_day") or {}
+                values["temp_min"].append(_float(all_day.get("temperature_min")))
+                values["temp_max"].append(_float(all_day.get("temperature_max")))
+                precipitation = all_day.get("precipitation") or {}
+            values["precipitation"].append(_float(precipitation.get("total")))
+            values["icon"].append(row.get("icon") or 0)
+            values["summary"].append(summaries.setdefault(row.get("summary") or "", len(summaries)))
+
+        columns = {name: np.array(values[name], dtype=dtype) for name, dtype in COLUMNS[section]}
+        return cls(section, columns, list(summaries))
+
+    def pack(self) -> bytes:
+        strings = "\n".join(self.summaries).encode()
+        parts = [
+            _HEADER.pack(_MAGIC, SECTION_IDS[self.section], len(self), len(strings)),
+            strings,
+            b"\0" * _pad(_HEADER.size + len(strings)),
+        ]
+        for name, _ in COLUMNS[self.section]:
+            data = self.columns[name].tobytes()
+            parts.append(data)
+            parts.append(b"\0" * _pad(len(data)))
+        return b"".join(parts)
+
+    @classmethod
+    def unpack(cls, data: bytes) -> "ForecastSeries | None":
+        if len(data) < _HEADER.size or not data.startswith(_MAGIC):
+            return None
+        _, section_id, rows, strings_len = _HEADER.unpack_from(data)
+        section = _SECTIONS.get(section_id)
+        if section is None:
+            return None
+        offset = _HEADER.size
+        strings = data[offset:offset + strings_len].decode()
+        offset += strings_len + _pad(_HEADER.size + strings_len)
+
+        columns = {}
+        for name, dtype in COLUMNS[section]:
+            column = np.frombuffer(data, dtype=dtype, count=rows, offset=offset)
+            columns[name] = column
+            offset += column.nbytes + _pad(column.nbytes)
+        return cls(section, columns, strings.split("\n") if strings_len else [""])
+
+    def window(self, start: float, limit: int) -> slice:
+        """Строки с time >= start, не больше limit."""
+        lo = int(np.searchsorted(self.columns["time"], start, side="left"))
+        return slice(lo, min(lo + limit, len(self)))
+
+    def to_columns(self, rows: slice) -> dict:
+        """Срез как колонки для JSON: time (unix), поля ряда, summary; NaN -> None."""
+        out = {"time": self.columns["time"][rows].tolist()}
+        for name, _ in COLUMNS[self.section][1:-1]:
+            column = self.columns[name][rows]
+            if column.dtype.kind == "f":
+                # float32 -> округление, иначе 18.2 превращается в 18.200000762939453
+                values = np.round(column.astype(np.float64), 2).tolist()
+                out[name] = [None if math.isnan(v) else v for v in values]
+            else:
+                out[name] = column.tolist()
+        out["summary"] = [self.summaries[i] for i in self.columns["summary"][rows].tolist()]
+        return out
@@ -0,0 +1,174 @@
+import bisect
+import functools
+import json
+import logging
+import re
+import unicodedata
+from pathlib import Path
+from typing import NamedTuple
+
+from src.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_TRANSLIT = str.maketrans({
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e",
+    "ж": "zh", "з": "z", "и": "i", "й": "y", "к": "k", "л": "l", "м": "m",
+    "н": "n", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t", "у": "u",
+    "ф": "f", "х": "kh", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "shch",
+    "ъ": "", "ы": "y", "ь": "", "э": "e", "ю": "yu", "я": "ya",
+    "і": "i", "ї": "yi", "є": "ye", "ґ": "g", "ў": "u",
+})
+_SEPARATORS = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(name: str) -> str:
+    """
+    "  Москва " -> "moskva", "São Paulo" -> "sao-paulo", "New York" -> "new-york":
+    регистр, транслитерация кириллицы, без диакритики, разделители — дефис.
+    """
+    name = name.strip().casefold().translate(_TRANSLIT)
+    name = "".join(ch for ch in unicodedata.normalize("NFKD", name) if not unicodedata.combining(ch))
+    return _SEPARATORS.sub("-", name).strip("-")
+
+
+class Place(NamedTuple):
+    place_id: str
+    name: str
+    country: str
+
+
+def _distance(a: str, b: str, limit: int) -> int:
+    """Расстояние Левенштейна; больше limit — сразу limit + 1."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def _trigrams(name: str) -> set[str]:
+    padded = f"^{name}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class PlaceIndex:
+    """
+    Справочник городов в памяти процесса: алиасы (нормализованные) -> place_id.
+    Точное совпадение — словарь, префиксный поиск — bisect по отсортированным
+    алиасам, опечатки — кандидаты по общим триграммам и проверка Левенштейном.
+    Порядок мест в справочнике — их приоритет в подсказках.
+    """
+
+    def __init__(self, places: list[dict]):
+        self.places: dict[str, Place] = {}
+        self._rank: dict[str, int] = {}
+        self._aliases: dict[str, str] = {}
+        for rank, item in enumerate(places):
+            place = Place(item["place_id"], item["name"], item.get("country", ""))
+            self.places[place.place_id] = place
+            self._rank[place.place_id] = rank
+            for alias in (place.place_id, place.name, *item.get("aliases", ())):
+                key = normalize(alias)
+                if key:
+                    # при совпадении алиасов побеждает место выше в списке
+                    self._aliases.setdefault(key, place.place_id)
+
+        self._sorted = sorted(self._aliases)
+        self._by_trigram: dict[str, list[str]] = {}
+        for alias in self._sorted:
+            for gram in _trigrams(alias):
+                self._by_trigram.setdefault(gram, []).append(alias)
+
+    def __len__(self) -> int:
+        return len(self.places)
+
+    def lookup(self, name: str) -> Place | None:
+        """
+        Только точное совпадение по алиасу. Опечатки здесь не угадываются:
+        справочник маленький, и настоящий город вне его (Tomsk, Pinsk)
+        превратился бы в соседний (omsk, minsk) — они только в suggest().
+        """
+        place_id = self._aliases.get(normalize(name))
+        return self.places[place_id] if place_id else None
+
+    def _max_distance(self, key: str) -> int:
+        # в коротких названиях одна правка уже даёт другой город (Rome / Nome)
+        if len(key) < 5:
+            return 0
+        return min(settings.places_fuzzy_max_distance, 1 if len(key) <= 7 else 2)
+
+    def _fuzzy(self, key: str) -> str | None:
+        limit = self._max_distance(key)
+        if limit <= 0:
+            return None
+        grams = _trigrams(key)
+        shared: dict[str, int] = {}
+        for gram in grams:
+            for alias in self._by_trigram.get(gram, ()):
+                shared[alias] = shared.get(alias, 0) + 1
+
+        best, best_distance = None, limit + 1
+        # сначала алиасы с наибольшим числом общих триграмм
+        for alias, _ in sorted(shared.items(), key=lambda item: -item[1])[:50]:
+            distance = _distance(key, alias, limit)
+            if distance < best_distance or (
+                distance == best_distance and best is not None
+                and self._rank[self._aliases[alias]] < self._rank[self._aliases[best]]
+            ):
+                best, best_distance = alias, distance
+        return self._aliases[best] if best is not None else None
+
+    def suggest(self, prefix: str, limit: int = 10) -> list[Place]:
+        """Места, у которых алиас начинается с prefix; при пустом результате — по опечатке."""
+        key = normalize(prefix)
+        if not key:
+            return []
+        found = set()
+        start = bisect.bisect_left(self._sorted, key)
+        for alias in self._sorted[start:]:
+            if not alias.startswith(key):
+                break
+            found.add(self._aliases[alias])
+        if not found:
+            place_id = self._fuzzy(key)
+            if place_id:
+                found.add(place_id)
+        ranked = sorted(found, key=self._rank.__getitem__)[:limit]
+        return [self.places[place_id] for place_id in ranked]
+
+
+_index: PlaceIndex | None = None
+
+
+def get_place_index() -> PlaceIndex:
+    """Справочник загружается один раз на процесс; без файла — пустой."""
+    global _index
+    if _index is None:
+        try:
+            places = json.loads(Path(settings.places_file).read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            logger.warning("Places file %s not loaded: %s", settings.places_file, e)
+            places = []
+        _index = PlaceIndex(places)
+    return _index
+
+
+@functools.lru_cache(maxsize=4096)
+def resolve_place(city: str) -> str:
+    """
+    Канонический place_id для ввода пользователя. Городов вне справочника
+    это не отсекает: для них place_id — нормализованный ввод, а если после
+    нормализации ничего не осталось (北京, Αθήνα) — ввод в нижнем регистре,
+    иначе такие города делили бы один пустой ключ кэша.
+    """
+    place = get_place_index().lookup(city)
+    if place is not None:
+        return place.place_id
+    return normalize(city) or city.strip().casefold()
@@ -0,0 +1,113 @@
+import asyncio
+import logging
+import time
+
+import httpx
+
+from src.core.config import settings
+from src.integrations.quota import api_keys, calls_today
+from src.services.currency_service import load_rate_table
+from src.services.weather_service import parse_weather_key, section_loaders, section_ttl
+from src.utils.popularity import currency_popularity, weather_popularity
+from src.utils.refresh import refresh_key
+from src.utils.utils import acquire_lock, get_cache_many
+
+logger = logging.getLogger(__name__)
+
+
+def _weather_loaders(keys: list[str], client: httpx.AsyncClient) -> dict:
+    # все устаревшие секции города — одним запросом к API
+    place = parse_weather_key(keys[0])[0]
+    sections = [parse_weather_key(key)[1] for key in keys]
+    loaders = section_loaders(place, sections, client)
+    return {key: loaders[section] for key, section in zip(keys, sections)}
+
+
+def _targets(client: httpx.AsyncClient):
+    """
+    (провайдер, трекер популярности, TTL по ключу, суточная квота,
+    группа ключа, фабрика загрузчиков {key: loader} для ключей одной группы).
+    Ключи одной группы обновляются одним запросом к API.
+    """
+    return [
+        (
+            "weather",
+            weather_popularity,
+            lambda key: section_ttl(parse_weather_key(key)[1]),
+            settings.weather_daily_quota,
+            lambda key: parse_weather_key(key)[0],
+            lambda keys: _weather_loaders(keys, client),
+        ),
+        (
+            "currency",
+            currency_popularity,
+            lambda key: settings.cache_ttl_currency,
+            settings.currency_daily_quota,
+            lambda key: key,
+            lambda keys: {key: (lambda key=key: load_rate_table(key.rsplit(":", 1)[1], client)) for key in keys},
+        ),
+    ]
+
+
+async def prewarm_once(client: httpx.AsyncClient) -> int:
+    """
+    Один проход: обновляет самые популярные ключи, которым осталось
+    меньше settings.prewarm_lead_time до мягкого истечения.
+    Ключи группируются (секции одного города) — на группу один запрос к API;
+    на прогрев тратится не больше prewarm_quota_share суточной квоты провайдера.
+    Возвращает число обновлённых ключей.
+    """
+    refreshed = 0
+    for provider, tracker, ttl, quota, group_of, make_loaders in _targets(client):
+        quota *= len(api_keys(provider))
+        limit = int(quota * settings.prewarm_quota_share)
+        used = await calls_today(provider)
+
+        keys = [key for key, _ in tracker.top(settings.prewarm_top_n)]
+        entries = await get_cache_many(keys)
+        now = time.time()
+        groups: dict[str, list[str]] = {}
+        for key in keys:
+            entry = entries.get(key)
+            if entry and entry["soft"] - now > settings.prewarm_lead_time:
+                continue
+            groups.setdefault(group_of(key), []).append(key)
+
+        for group in groups.values():
+            if used >= limit:
+                logger.info("Prewarm budget for %s exhausted (%d/%d)", provider, used, quota)
+                break
+            used += 1
+            loaders = make_loaders(group)
+            results = await asyncio.gather(
+                *(refresh_key(key, loaders[key], ttl(key)) for key in group),
+                return_exceptions=True,
+            )
+            for key, result in zip(group, results):
+                if isinstance(result, Exception):
+                    logger.warning("Prewarm failed for key=%s: %s", key, result)
+                else:
+                    refreshed += 1
+    return refreshed
+
+
+async def run_prewarmer(client: httpx.AsyncClient):
+    """
+    Фоновый цикл прогрева. Запускается в каждом воркере, но проход
+    выполняет только тот, кто взял лок на интервал, — остальные пропускают.
+    Популярность у каждого воркера своя; при равномерной балансировке
+    top-N одного воркера хорошо приближает общий.
+    """
+    interval = settings.prewarm_interval
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if await acquire_lock("lock:prewarm", interval * 0.9) is None:
+                continue
+            refreshed = await prewarm_once(client)
+            if refreshed:
+                logger.info("Prewarmed %d cache keys", refreshed)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Prewarm cycle error: %s", e)
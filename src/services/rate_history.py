@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import os
+import re
+import time
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # не POSIX — пишет только один процесс
+    fcntl = None
+
+from src.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_DTYPE = np.dtype("<f8")
+_CODE = re.compile(r"^[A-Z]{3}$")
+_TS = "ts.f8"
+
+
+class RateHistory:
+    """
+    Append-only колоночное хранилище снимков курсов.
+    Каждая валюта — отдельный файл float64 (сколько её за 1 единицу опорной валюты),
+    ts.f8 — время снимков по возрастанию. Файлы читаются через np.memmap,
+    поэтому выборка диапазона — searchsorted и срез, без чтения всего файла.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._maps: dict[str, np.memmap] = {}
+
+    def __len__(self) -> int:
+        # число снимков определяет ts.f8: он дописывается последним
+        try:
+            return os.path.getsize(self.path / _TS) // _DTYPE.itemsize
+        except FileNotFoundError:
+            return 0
+
+    def codes(self) -> list[str]:
+        if not self.path.exists():
+            return []
+        return sorted(p.stem for p in self.path.glob("*.f8") if _CODE.match(p.stem))
+
+    def _map(self, name: str, n: int) -> np.ndarray:
+        # файлы только растут: отображение переоткрывается, когда в нём не хватает строк
+        mapped = self._maps.get(name)
+        if mapped is None or len(mapped) < n:
+            try:
+                mapped = np.memmap(self.path / name, dtype=_DTYPE, mode="r")
+            except FileNotFoundError:
+                raise KeyError(name)
+            except ValueError:  # пустой файл не отображается
+                return np.empty(0, dtype=_DTYPE)
+            self._maps[name] = mapped
+        return mapped[:n]
+
+    def timestamps(self, n: int | None = None) -> np.ndarray:
+        n = len(self) if n is None else n
+        return self._map(_TS, n) if n else np.empty(0, dtype=_DTYPE)
+
+    def column(self, code: str, n: int) -> np.ndarray:
+        if not _CODE.match(code):
+            raise KeyError(code)
+        return self._map(f"{code}.f8", n)
+
+    def _write(self, code: str, n: int, value: float):
+        with open(self.path / f"{code}.f8", "ab") as f:
+            size = f.tell() // _DTYPE.itemsize
+            if size > n:
+                # хвост от прерванной записи: ts.f8 до него не дошёл
+                f.truncate(n * _DTYPE.itemsize)
+            elif size < n:
+                # новая валюта — в прошлых снимках курса нет
+                f.write(np.full(n - size, np.nan, dtype=_DTYPE).tobytes())
+            f.write(np.array([value], dtype=_DTYPE).tobytes())
+
+    def append(self, ts: float, rates: dict) -> bool:
+        """
+        Дописывает снимок {код: курс к опорной валюте}.
+        Возвращает False, если прошлый снимок моложе rate_history_min_interval.
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        with open(self.path / ".lock", "w") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            n = len(self)
+            if n and ts - self.timestamps(n)[-1] < settings.rate_history_min_interval:
+                return False
+            codes = set(self.codes()) | {code for code in rates if _CODE.match(code)}
+            for code in codes:
+                self._write(code, n, float(rates.get(code, np.nan)))
+            with open(self.path / _TS, "ab") as f:
+                f.write(np.array([ts], dtype=_DTYPE).tobytes())
+        return True
+
+    def _cross(self, base: str, quote: str, n: int):
+        # KeyError, если валюты нет в истории
+        return self.column(base, n), self.column(quote, n)
+
+    def rates(self, base: str, quote: str, start: float, end: float, step: float | None = None):
+        """
+        Курсы base -> quote за [start, end].
+        Без step — все снимки диапазона; со step — значение на каждой точке сетки
+        (последний снимок не позже неё, NaN, если снимков ещё не было).
+        Возвращает (время, курс).
+        """
+        n = len(self)
+        ts = self.timestamps(n)
+        base_col, quote_col = self._cross(base, quote, n)
+
+        if step:
+            points = int((end - start) // step) + 1
+            if points > settings.rate_history_max_points:
+                raise ValueError(f"At most {settings.rate_history_max_points} points per request")
+            times = start + np.arange(points) * step
+            rows = np.searchsorted(ts, times, side="right") - 1
+            found = rows >= 0
+            rows = np.maximum(rows, 0)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                rate = quote_col[rows] / base_col[rows] if n else np.full(points, np.nan)
+            rate = np.where(found, rate, np.nan)
+            return times, rate
+
+        lo = np.searchsorted(ts, start, side="left")
+        hi = np.searchsorted(ts, end, side="right")
+        if hi - lo > settings.rate_history_max_points:
+            raise ValueError(
+                f"More than {settings.rate_history_max_points} snapshots in range, use step"
+            )
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rate = quote_col[lo:hi] / base_col[lo:hi]
+        return np.array(ts[lo:hi]), rate
+
+    def at(self, ts: float, base: str):
+        """Последний снимок не позже ts: (время снимка, {код: курс base -> код}) или None."""
+        n = len(self)
+        row = int(np.searchsorted(self.timestamps(n), ts, side="right")) - 1
+        if row < 0:
+            return None
+        base_rate = self.column(base, n)[row]
+        if not np.isfinite(base_rate):
+            raise KeyError(base)
+        rates = {}
+        for code in self.codes():
+            value = self.column(code, n)[row] / base_rate
+            if np.isfinite(value):
+                rates[code] = float(value)
+        return float(self.timestamps(n)[row]), rates
+
+
+_stores: dict[str, RateHistory] = {}
+
+
+def get_rate_history() -> RateHistory:
+    path = settings.rate_history_dir
+    store = _stores.get(path)
+    if store is None:
+        store = _stores[path] = RateHistory(path)
+    return store
+
+
+def _to_pivot(table: dict) -> dict | None:
+    """Таблица любой базы -> курсы за 1 единицу опорной валюты."""
+    rates = table["rates"]
+    pivot = settings.currency_pivot
+    if table["base"] == pivot:
+        per_pivot = 1.0
+    elif pivot in rates:
+        per_pivot = float(rates[pivot])
+    else:
+        return None
+    normalized = {code: float(value) / per_pivot for code, value in rates.items()}
+    normalized[pivot] = 1.0
+    return normalized
+
+
+async def record_rate_table(table: dict, ts: float | None = None):
+    """Сохраняет свежую таблицу курсов в историю; ошибки записи только логируются."""
+    if not settings.rate_history_enabled:
+        return
+    rates = _to_pivot(table)
+    if rates is None:
+        return
+    try:
+        await asyncio.to_thread(
+            get_rate_history().append, time.time() if ts is None else ts, rates
+        )
+    except Exception as e:
+        logger.warning("Rate history write error: %s", e)
@@ -0,0 +1,152 @@
+import asyncio
+import hashlib
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable
+
+from src.core.config import settings
+from src.core.metrics import Gauge
+from src.utils.utils import NODE_ID, get_redis_client, redis_op
+
+logger = logging.getLogger(__name__)
+
+STREAM_CHANNEL = "stream:changed"
+
+STREAM_SUBSCRIBERS = Gauge("stream_subscribers", "Open SSE/WebSocket subscriptions", ("kind",))
+
+
+class _Topic:
+    def __init__(self, name: str, load: Callable[[], Awaitable[bytes]], payload: bytes):
+        self.name = name
+        self.load = load
+        self.payload = payload
+        self.digest = hashlib.blake2b(payload, digest_size=8).digest()
+        self.subscribers: set[asyncio.Queue] = set()
+        self.wake = asyncio.Event()
+        self.task: asyncio.Task | None = None
+
+
+async def _until_next_poll(topic: _Topic):
+    """Следующий опрос — через stream_poll_interval или раньше, если тему разбудили."""
+    try:
+        await asyncio.wait_for(topic.wake.wait(), timeout=settings.stream_poll_interval)
+    except asyncio.TimeoutError:
+        pass
+
+
+def _offer(queue: asyncio.Queue, payload: bytes):
+    # медленному подписчику нужна только последняя версия
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(payload)
+
+
+class StreamHub:
+    """
+    Рассылка изменений закэшированных значений подписчикам SSE/WebSocket.
+    На каждую тему в воркере — одна задача, которая раз в stream_poll_interval
+    читает значение через обычный кэш (обновление ключа — как у любого запроса:
+    SWR и склейка), поэтому число подписчиков не влияет на запросы к API.
+    Изменение рассылается своим подписчикам и публикуется в Redis —
+    остальные воркеры сразу перечитывают тему, не дожидаясь своего опроса.
+    """
+
+    def __init__(self, wait: Callable[[_Topic], Awaitable[None]] = _until_next_poll):
+        self._topics: dict[str, _Topic] = {}
+        self._listener: asyncio.Task | None = None
+        # ожидание между опросами темы (тесты подставляют свои тики)
+        self._wait = wait
+
+    @asynccontextmanager
+    async def subscribe(
+        self, name: str, load: Callable[[], Awaitable[bytes]], payload: bytes
+    ) -> AsyncIterator[asyncio.Queue]:
+        """
+        Подписка на тему; payload — уже загруженное текущее значение.
+        Очередь отдаёт новые версии значения (байты), первая — текущая.
+        """
+        topic = self._topics.get(name)
+        if topic is None:
+            topic = self._topics[name] = _Topic(name, load, payload)
+            topic.task = asyncio.create_task(self._poll(topic))
+            self._ensure_listener()
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        queue.put_nowait(topic.payload)
+        topic.subscribers.add(queue)
+        try:
+            yield queue
+        finally:
+            topic.subscribers.discard(queue)
+            if not topic.subscribers and self._topics.get(name) is topic:
+                del self._topics[name]
+                topic.task.cancel()
+                if not self._topics and self._listener is not None:
+                    self._listener.cancel()
+                    self._listener = None
+
+    def _update(self, topic: _Topic, payload: bytes) -> bool:
+        digest = hashlib.blake2b(payload, digest_size=8).digest()
+        if digest == topic.digest:
+            return False
+        topic.payload, topic.digest = payload, digest
+        for queue in topic.subscribers:
+            _offer(queue, payload)
+        return True
+
+    async def _poll(self, topic: _Topic):
+        while True:
+            await self._wait(topic)
+            topic.wake.clear()
+            try:
+                payload = await topic.load()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # подписчики остаются с последним значением до следующего опроса
+                logger.warning("Stream refresh failed for %s: %s", topic.name, e)
+                continue
+            if self._update(topic, payload):
+                await self._announce(topic.name)
+
+    async def _announce(self, name: str):
+        if not settings.stream_pubsub:
+            return
+        try:
+            await redis_op(lambda client: client.publish(STREAM_CHANNEL, f"{NODE_ID} {name}"))
+        except Exception as e:
+            logger.debug("Stream publish error for %s: %s", name, e)
+
+    def _ensure_listener(self):
+        if settings.stream_pubsub and self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        """Изменения из других воркеров: будим опрос темы, если у нас есть подписчики."""
+        client = get_redis_client()
+        while True:
+            try:
+                async with client.pubsub() as pubsub:
+                    await pubsub.subscribe(STREAM_CHANNEL)
+                    async for message in pubsub.listen():
+                        if message.get("type") != "message":
+                            continue
+                        data = message["data"]
+                        if isinstance(data, bytes):
+                            data = data.decode()
+                        node, _, name = data.partition(" ")
+                        topic = self._topics.get(name)
+                        if node != NODE_ID and topic is not None:
+                            topic.wake.set()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Stream listener error: %s", e)
+                await asyncio.sleep(1)
+
+    @property
+    def topics(self) -> int:
+        return len(self._topics)
+
+
+hub = StreamHub()
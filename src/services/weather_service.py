@@ -1,51 +1,289 @@
+import asyncio
+import time
+from typing import TYPE_CHECKING
+
 import httpx
 from src.core.config import settings
-from src.utils.utils import get_cache, set_cache
+from src.core.tracing import span
+from src.utils.utils import get_cache_many, set_cache
+from src.utils.refresh import cached_fetch, cached_fetch_many, refresh_key
+from src.utils.popularity import weather_popularity
 from src.integrations.weather_api import fetch_weather
+from src.services.places import resolve_place
+
+if TYPE_CHECKING:
+    from src.services.forecast import ForecastSeries
+
+SECTIONS = ("current", "daily", "hourly")
+# секции, полный ряд которых хранится отдельно (/weather/hourly, /weather/daily)
+FORECAST_SECTIONS = ("daily", "hourly")
+
+# ответы API на неизвестный place_id
+_NOT_FOUND_STATUSES = (400, 404, 422)
+
+
+class CityNotFound(ValueError):
+    """API не знает такого города (ответ может быть взят из негативного кэша)."""
+
+
+def weather_key(city: str, section: str) -> str:
+    # "Москва", "moskva" и "Moscow" делят один ключ
+    return f"weather:{resolve_place(city)}:{section}"
+
+
+def missing_key(city: str) -> str:
+    return f"missing:weather:{resolve_place(city)}"
+
+
+def forecast_key(city: str, section: str) -> str:
+    # полный ряд секции hourly / daily (ForecastSeries.pack)
+    return f"forecast:{resolve_place(city)}:{section}"
+
+
+def parse_weather_key(key: str) -> tuple[str, str]:
+    city, section = key.split(":", 1)[1].rsplit(":", 1)
+    return city, section
+
+
+def section_ttl(section: str) -> int:
+    return getattr(settings, f"cache_ttl_weather_{section}")
+
+
+class _SharedFetch:
+    """
+    Один запрос к API на несколько секций города: загрузчик каждой секции
+    ждёт общий запрос и берёт из ответа свою часть.
+    """
+
+    def __init__(self, city: str, client: httpx.AsyncClient, sections, writes: dict | None = None):
+        self.city = city
+        self.client = client
+        self.sections = tuple(sections)
+        self.writes = writes
+        self._task = None
+
+    def loader(self, section: str):
+        async def load():
+            if self._task is None:
+                self._task = asyncio.ensure_future(load_sections(self.city, self.sections, self.client, self.writes))
+            # shield — отмена одного ожидающего не должна отменять общий запрос
+            return (await asyncio.shield(self._task))[section]
+        return load
+
+
+def section_loaders(city: str, sections, client: httpx.AsyncClient) -> dict:
+    """{секция: загрузчик}; все загрузчики делят один запрос к API за sections."""
+    shared = _SharedFetch(city, client, sections)
+    return {section: shared.loader(section) for section in sections}
+
+
+async def get_weather(city: str, client: httpx.AsyncClient, sections=SECTIONS):
+    """
+    Погода по выбранным секциям. Каждая секция — свой ключ кэша со своим TTL;
+    в API идёт один запрос только за теми секциями, что устарели или отсутствуют.
+    """
+    keys = {section: weather_key(city, section) for section in sections}
+    for key in keys.values():
+        weather_popularity.record(key)
+
+    # негативная запись читается тем же пайплайном, что и секции
+    missing = missing_key(city)
+    entries = await get_cache_many([*keys.values(), missing])
+    if missing in entries:
+        raise CityNotFound(city)
+    now = time.time()
+    stale = [s for s, key in keys.items() if not entries.get(key) or now >= entries[key]["soft"]]
+    shared = _SharedFetch(resolve_place(city), client, stale or sections)
+
+    parts = await asyncio.gather(*(
+        cached_fetch(key, shared.loader(section), section_ttl(section), entry=entries.get(key))
+        for section, key in keys.items()
+    ))
+    return merge_sections(city, parts)
 
 
-async def get_weather(city: str, client: httpx.AsyncClient):
-    key = f"weather:{city.strip().lower()}"
+async def peek_weather(city: str, sections=SECTIONS):
+    """Погода только из кэша (пока не истёк hard) или None — без запроса к API."""
+    keys = [weather_key(city, section) for section in sections]
+    entries = await get_cache_many(keys)
+    now = time.time()
+    if any(key not in entries or now >= entries[key]["hard"] for key in keys):
+        return None
+    return merge_sections(city, [entries[key]["value"] for key in keys])
 
-    cached = await get_cache(key)
-    if cached:
-        return cached
 
+async def get_weather_many(cities: list[str], client: httpx.AsyncClient, sections=SECTIONS) -> dict:
+    """
+    Погода для нескольких городов: {city: результат или исключение}.
+    Негативные записи и все секции читаются одним пайплайном, результаты
+    (вместе с рядами прогноза) пишутся обратно одним пайплайном. В API идёт
+    по одному запросу на город — только за устаревшими секциями; concurrency
+    и timeout считаются на город, а не на секцию.
+    """
+    places = {resolve_place(city) for city in cities}
+    keys = {place: {section: weather_key(place, section) for section in sections} for place in places}
+    entries = await get_cache_many([
+        *(missing_key(place) for place in places),
+        *(key for place_keys in keys.values() for key in place_keys.values()),
+    ])
+
+    now = time.time()
+    loaders = {}
+    # ряды прогноза и негативные записи из загрузок этого пакета
+    writes = {}
+    for place in places:
+        if missing_key(place) in entries:
+            continue
+        stale = [s for s, key in keys[place].items() if not entries.get(key) or now >= entries[key]["soft"]]
+        expired = any(not entries.get(key) or now >= entries[key]["hard"] for key in keys[place].values())
+        # если секции только обновляются в фоне, загрузка закончится после записи пакета —
+        # тогда загрузчик пишет сам
+        shared = _SharedFetch(place, client, stale or sections, writes if expired else None)
+        for section, key in keys[place].items():
+            loaders[key] = shared.loader(section)
+            weather_popularity.record(key)
+
+    loaded = await cached_fetch_many(
+        loaders,
+        lambda key: section_ttl(parse_weather_key(key)[1]),
+        concurrency=settings.weather_batch_concurrency,
+        timeout=settings.weather_batch_timeout,
+        entries=entries,
+        group=lambda key: parse_weather_key(key)[0],
+        extra=writes,
+    )
+
+    results = {}
+    for city in cities:
+        place = resolve_place(city)
+        if missing_key(place) in entries:
+            results[city] = CityNotFound(city)
+            continue
+        parts = [loaded[key] for key in keys[place].values()]
+        error = next((part for part in parts if isinstance(part, BaseException)), None)
+        results[city] = error if error is not None else merge_sections(city, parts)
+    return results
+
+
+async def load_sections(city: str, sections, client: httpx.AsyncClient, writes: dict | None = None) -> dict:
+    """
+    {секция: сжатые данные} одним запросом к API.
+    writes — {key: (value, ttl)}, куда сложить ряды прогноза и негативную запись
+    вместо отдельной записи в кэш (пакетная загрузка пишет их своим пайплайном).
+    """
     try:
-        data = await fetch_weather(city, client)
+        data = await fetch_weather(city, client, sections)
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code in _NOT_FOUND_STATUSES:
+            if writes is None:
+                await set_cache(missing_key(city), 1, settings.cache_ttl_weather_missing)
+            else:
+                writes[missing_key(city)] = (1, settings.cache_ttl_weather_missing)
+            raise CityNotFound(city) from e
+        raise ValueError("Weather API error") from e
     except httpx.HTTPError as e:
         raise ValueError("Weather API error") from e
 
+    # ряды прогноза на numpy — модуль грузится при первой загрузке погоды
+    from src.services.forecast import ForecastSeries
+
+    with span("shape"):
+        shaped = {section: SHAPERS[section](data) for section in sections}
+        # полные ряды сохраняются из того же ответа — без отдельного запроса к API
+        series = {
+            section: ForecastSeries.from_payload(section, data).pack()
+            for section in sections if section in FORECAST_SECTIONS
+        }
+    for section, packed in series.items():
+        if writes is None:
+            await set_cache(forecast_key(city, section), packed, section_ttl(section))
+        else:
+            writes[forecast_key(city, section)] = (packed, section_ttl(section))
+    return shaped
+
+
+async def load_weather_section(city: str, section: str, client: httpx.AsyncClient):
+    return (await load_sections(city, (section,), client))[section]
+
+
+async def get_forecast(city: str, section: str, client: httpx.AsyncClient) -> "ForecastSeries":
+    """
+    Полный ряд hourly / daily. Ряд пишется при каждой загрузке секции;
+    если его нет в кэше, секция обновляется принудительно (со склейкой).
+    """
+    key = forecast_key(city, section)
+    missing = missing_key(city)
+    found = await get_cache_many([key, missing])
+    if missing in found:
+        raise CityNotFound(city)
+
+    packed = found.get(key)
+    if not isinstance(packed, bytes):
+        place = resolve_place(city)
+        weather_popularity.record(weather_key(place, section))
+        await refresh_key(
+            weather_key(place, section),
+            lambda: load_weather_section(place, section, client),
+            section_ttl(section),
+        )
+        packed = (await get_cache_many([key])).get(key)
+
+    from src.services.forecast import ForecastSeries
+
+    series = ForecastSeries.unpack(packed) if isinstance(packed, bytes) else None
+    if series is None:
+        raise ValueError("Forecast unavailable")
+    return series
+
+
+def merge_sections(city: str, parts) -> dict:
+    result = {"city": city}
+    for part in parts:
+        result.update(part)
+    return result
+
+
+def shape_current(data: dict) -> dict:
     if "current" not in data:
         raise ValueError("Invalid weather response")
+    current = data["current"]
+    return {
+        "temperature": current["temperature"],
+        "description": current["summary"],
+        "icon": current["icon_num"],
+        "wind_speed": current["wind"]["speed"],
+        "wind_dir": current["wind"]["dir"],
+        "cloud_cover": current["cloud_cover"],
+        "precipitation": current["precipitation"]["total"],
+        "precip_type": current["precipitation"]["type"],
+    }
 
-    result = {
-        "city": city,
-        
-        # Current conditions
-        "temperature": data["current"]["temperature"],
-        "description": data["current"]["summary"],
-        "icon": data["current"]["icon_num"],
-        "wind_speed": data["current"]["wind"]["speed"],
-        "wind_dir": data["current"]["wind"]["dir"],
-        "cloud_cover": data["current"]["cloud_cover"],
-        "precipitation": data["current"]["precipitation"]["total"],
-        "precip_type": data["current"]["precipitation"]["type"],
 
+def shape_daily(data: dict) -> dict:
+    if "daily" not in data:
+        raise ValueError("Invalid weather response")
+    today, tomorrow = data["daily"]["data"][:2]
+    return {
         # Today's forecast
-        "temp_min": data["daily"]["data"][0]["all_day"]["temperature_min"],
-        "temp_max": data["daily"]["data"][0]["all_day"]["temperature_max"],
-        "summary_today": data["daily"]["data"][0]["summary"],
+        "temp_min": today["all_day"]["temperature_min"],
+        "temp_max": today["all_day"]["temperature_max"],
+        "summary_today": today["summary"],
 
         # Tomorrow's forecast
-        "summary_tomorrow": data["daily"]["data"][1]["summary"],
-        "temp_min_tomorrow": data["daily"]["data"][1]["all_day"]["temperature_min"],
-        "temp_max_tomorrow": data["daily"]["data"][1]["all_day"]["temperature_max"],
+        "summary_tomorrow": tomorrow["summary"],
+        "temp_min_tomorrow": tomorrow["all_day"]["temperature_min"],
+        "temp_max_tomorrow": tomorrow["all_day"]["temperature_max"],
+    }
+
 
+def shape_hourly(data: dict) -> dict:
+    if "hourly" not in data:
+        raise ValueError("Invalid weather response")
+    return {
         # Hourly strip (next 6 hours for a chart)
         "hourly": [
             {
-                "time": h["date"][11:16],  
+                "time": h["date"][11:16],
                 "temp": h["temperature"],
                 "weather": h["summary"],
                 "icon": h["icon"],
@@ -55,5 +293,14 @@ async def get_weather(city: str, client: httpx.AsyncClient):
         ],
     }
 
-    await set_cache(key, result, settings.cache_ttl_weather)
-    return result
\ No newline at end of file
+
+SHAPERS = {
+    "current": shape_current,
+    "daily": shape_daily,
+    "hourly": shape_hourly,
+}
+
+
+def shape_weather(city: str, data: dict, sections=SECTIONS) -> dict:
+    """Сжимает ответ meteosource до полей WeatherResponse."""
+    return merge_sections(city, [SHAPERS[section](data) for section in sections])
@@ -0,0 +1,92 @@
+import json
+import logging
+import zlib
+from decimal import Decimal
+
+from src.core.config import settings
+
+try:
+    import msgpack
+except ImportError:  # msgpack необязателен — без него остаётся JSON
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+# Формат значения в Redis: 1 байт кодека + 1 байт сжатия + тело.
+# Старые записи (чистый JSON без заголовка) по-прежнему читаются.
+JSON = b"J"
+MSGPACK = b"M"
+RAW = b"R"
+
+PLAIN = b"0"
+ZLIB = b"z"
+
+_DECIMAL_EXT = 1
+
+
+def _msgpack_default(obj):
+    if isinstance(obj, Decimal):
+        return msgpack.ExtType(_DECIMAL_EXT, str(obj).encode())
+    raise TypeError(f"Cannot serialize {type(obj).__name__}")
+
+
+def _msgpack_ext_hook(code, data):
+    if code == _DECIMAL_EXT:
+        return Decimal(data.decode())
+    return msgpack.ExtType(code, data)
+
+
+def _json_default(obj):
+    if isinstance(obj, Decimal):
+        return str(obj)
+    raise TypeError(f"Cannot serialize {type(obj).__name__}")
+
+
+def _codec_name() -> bytes:
+    if settings.cache_codec == "msgpack":
+        if msgpack is not None:
+            return MSGPACK
+        logger.warning("CACHE_CODEC=msgpack but msgpack is not installed, using JSON")
+        settings.cache_codec = "json"
+    return JSON
+
+
+def _compress(codec: bytes, body: bytes) -> bytes:
+    min_bytes = settings.cache_compress_min_bytes
+    if min_bytes and len(body) >= min_bytes:
+        return codec + ZLIB + zlib.compress(body, settings.cache_compress_level)
+    return codec + PLAIN + body
+
+
+def encode(value) -> bytes:
+    codec = _codec_name()
+    if codec == MSGPACK:
+        body = msgpack.packb(value, default=_msgpack_default, use_bin_type=True)
+    else:
+        body = json.dumps(value, default=_json_default, separators=(",", ":")).encode()
+    return _compress(codec, body)
+
+
+def encode_bytes(data: bytes) -> bytes:
+    """Уже готовые байты (например, тело HTTP-ответа) — без сериализации."""
+    return _compress(RAW, data)
+
+
+def _body(data: bytes) -> tuple[bytes, bytes]:
+    codec, compression, body = data[:1], data[1:2], data[2:]
+    if compression == ZLIB:
+        body = zlib.decompress(body)
+    return codec, body
+
+
+def decode(data: bytes):
+    if data[:1] in (b"{", b"["):
+        return json.loads(data)
+    codec, body = _body(data)
+    if codec == MSGPACK:
+        return msgpack.unpackb(body, ext_hook=_msgpack_ext_hook, raw=False)
+    if codec == JSON:
+        return json.loads(body)
+    if codec == RAW:
+        return body
+    raise ValueError(f"Unknown cache codec {codec!r}")
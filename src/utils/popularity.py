@@ -0,0 +1,75 @@
+import math
+import time
+from array import array
+
+
+class DecayedTopK:
+    """
+    Приближённая популярность ключей: count-min sketch с экспоненциальным
+    затуханием (half_life секунд) плюс небольшой набор кандидатов в top-K.
+
+    Чтобы не пересчитывать все счётчики при затухании, новые попадания
+    добавляются с растущим весом 2^(t / half_life); при отдаче top-K оценки
+    делятся на текущий вес. Когда вес становится слишком большим, всё
+    перемасштабируется.
+    """
+
+    _RESCALE_AT = 1e12
+
+    def __init__(self, k: int = 200, width: int = 2048, depth: int = 4, half_life: float = 3600.0):
+        self.k = k
+        self.width = width
+        self.half_life = half_life
+        self._rows = [array("d", [0.0]) * width for _ in range(depth)]
+        self._seeds = list(range(depth))
+        self._t0 = time.monotonic()
+        self._candidates: dict[str, float] = {}
+
+    def _weight(self, now: float) -> float:
+        return math.pow(2.0, (now - self._t0) / self.half_life)
+
+    def record(self, item: str, now: float | None = None):
+        now = time.monotonic() if now is None else now
+        weight = self._weight(now)
+        if weight > self._RESCALE_AT:
+            self._rescale(now)
+            weight = 1.0
+
+        estimate = math.inf
+        for row, seed in zip(self._rows, self._seeds):
+            idx = hash((seed, item)) % self.width
+            row[idx] += weight
+            if row[idx] < estimate:
+                estimate = row[idx]
+
+        candidates = self._candidates
+        candidates[item] = estimate
+        if len(candidates) > 2 * self.k:
+            keep = sorted(candidates.items(), key=lambda kv: kv[1], reverse=True)[: self.k]
+            self._candidates = dict(keep)
+
+    def top(self, n: int, now: float | None = None) -> list[tuple[str, float]]:
+        """n самых популярных ключей с оценкой числа попаданий (с учётом затухания)."""
+        now = time.monotonic() if now is None else now
+        weight = self._weight(now)
+        ranked = sorted(self._candidates.items(), key=lambda kv: kv[1], reverse=True)[:n]
+        return [(item, score / weight) for item, score in ranked]
+
+    def clear(self):
+        for row in self._rows:
+            for i in range(self.width):
+                row[i] = 0.0
+        self._candidates.clear()
+        self._t0 = time.monotonic()
+
+    def _rescale(self, now: float):
+        factor = 1.0 / self._weight(now)
+        for row in self._rows:
+            for i in range(self.width):
+                row[i] *= factor
+        self._candidates = {item: score * factor for item, score in self._candidates.items()}
+        self._t0 = now
+
+
+weather_popularity = DecayedTopK()
+currency_popularity = DecayedTopK(k=50)
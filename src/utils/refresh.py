@@ -0,0 +1,228 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable
+
+from src.core.config import settings
+from src.utils.utils import get_cache, set_cache, get_cache_many, set_cache_many
+from src.utils.singleflight import singleflight
+from src.integrations.policy import UpstreamUnavailable
+
+logger = logging.getLogger(__name__)
+
+# фоновые обновления держим здесь, иначе задачу может собрать GC
+_background: set[asyncio.Task] = set()
+
+_UNSET = object()
+
+
+def make_entry(value, ttl: int, now: float | None = None) -> dict:
+    """
+    Запись кэша с двумя сроками:
+    soft — до него значение свежее;
+    hard — до него значение отдаётся сразу, а обновляется в фоне.
+    """
+    now = time.time() if now is None else now
+    return {
+        "value": value,
+        "soft": now + ttl,
+        "hard": now + ttl + settings.cache_stale_window,
+    }
+
+
+def _redis_ttl(ttl: int) -> int:
+    # в Redis запись живёт ещё grace секунд после hard — на случай сбоя API
+    return ttl + settings.cache_stale_window + settings.cache_stale_grace
+
+
+async def store_cached(key: str, value, ttl: int):
+    await set_cache(key, make_entry(value, ttl), _redis_ttl(ttl))
+    return value
+
+
+async def read_cached(key: str):
+    """Значение из кэша без похода во внешний API (None, если истёк hard)."""
+    entry = await get_cache(key)
+    if entry and time.time() < entry["hard"]:
+        return entry["value"]
+    return None
+
+
+async def _read_fresh(key: str):
+    entry = await get_cache(key)
+    if entry and time.time() < entry["soft"]:
+        return entry["value"]
+    return None
+
+
+async def _refresh(key: str, loader: Callable[[], Awaitable], ttl: int):
+    value = await loader()
+    return await store_cached(key, value, ttl)
+
+
+async def refresh_key(key: str, loader: Callable[[], Awaitable], ttl: int):
+    """Принудительное обновление ключа (со склейкой с параллельными загрузками)."""
+    return await singleflight.do(
+        key,
+        lambda: _refresh(key, loader, ttl),
+        wait_for=lambda: _read_fresh(key),
+    )
+
+
+def _refresh_in_background(key: str, loader, ttl: int):
+    if singleflight.in_flight(key):
+        return
+
+    async def run():
+        try:
+            await refresh_key(key, loader, ttl)
+        except Exception as e:
+            logger.warning("Background refresh failed for key=%s: %s", key, e)
+
+    task = asyncio.create_task(run())
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+def _can_serve_stale(entry: dict, error: BaseException, now: float) -> bool:
+    # API заведомо недоступен (breaker открыт) — лучше любое последнее значение
+    if isinstance(error, UpstreamUnavailable):
+        return True
+    return now < entry["hard"] + settings.cache_stale_grace
+
+
+async def cached_fetch(key: str, loader: Callable[[], Awaitable], ttl: int, entry=_UNSET):
+    """
+    Stale-while-revalidate поверх кэша:
+    - до soft отдаём закэшированное значение;
+    - между soft и hard отдаём его же и обновляем ключ в фоне;
+    - после hard ждём загрузку, а если API упал — отдаём старое
+      значение ещё settings.cache_stale_grace секунд
+      (при открытом breaker — без ограничения по возрасту).
+    entry — уже прочитанная вызывающим кодом запись, чтобы не читать кэш дважды.
+    """
+    if entry is _UNSET:
+        entry = await get_cache(key)
+
+    now = time.time()
+    if entry:
+        if now < entry["soft"]:
+            return entry["value"]
+        if now < entry["hard"]:
+            _refresh_in_background(key, loader, ttl)
+            return entry["value"]
+
+    try:
+        return await refresh_key(key, loader, ttl)
+    except Exception as e:
+        if entry and _can_serve_stale(entry, e, now):
+            logger.warning("Serving stale value for key=%s after upstream error: %s", key, e)
+            return entry["value"]
+        raise
+
+
+async def cached_fetch_many(
+    loaders: dict[str, Callable[[], Awaitable]],
+    ttl: int | Callable[[str], int],
+    concurrency: int,
+    timeout: float,
+    entries: dict | None = None,
+    group: Callable[[str], object] | None = None,
+    extra: dict | None = None,
+) -> dict:
+    """
+    Пакетный вариант cached_fetch: все ключи читаются одним пайплайном,
+    загружаются только промахи, а результаты пишутся обратно одним пайплайном.
+    Возвращает {key: значение или исключение} — сбой одного ключа не роняет остальные.
+    ttl — число или функция от ключа, если у ключей разный срок жизни.
+    entries — уже прочитанные вызывающим кодом записи (тогда кэш не читается).
+    group — функция от ключа: ключи одной группы (например, секции одного города)
+    загружаются вместе — один слот из concurrency и один общий timeout;
+    загрузка, не уложившаяся в timeout, не отменяется и пишется в кэш, когда закончится.
+    extra — {key: (value, ttl)}, куда загрузчики складывают побочные записи;
+    они уходят в тот же пайплайн записи.
+    """
+    ttl_of = ttl if callable(ttl) else (lambda key: ttl)
+    group_of = group or (lambda key: key)
+    if entries is None:
+        entries = await get_cache_many(list(loaders))
+    now = time.time()
+
+    results = {}
+    misses: dict[object, list[str]] = {}
+    for key, loader in loaders.items():
+        entry = entries.get(key)
+        if entry and now < entry["hard"]:
+            if now >= entry["soft"]:
+                _refresh_in_background(key, loader, ttl_of(key))
+            results[key] = entry["value"]
+        else:
+            misses.setdefault(group_of(key), []).append(key)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def load(keys):
+        async with semaphore:
+            group_load = asyncio.ensure_future(
+                asyncio.gather(*(singleflight.do(key, loaders[key]) for key in keys), return_exceptions=True)
+            )
+            try:
+                # shield: по таймауту пакет перестаёт ждать, но запрос к API уже оплачен —
+                # загрузка доходит до конца, и её результат пишется в кэш
+                return await asyncio.wait_for(asyncio.shield(group_load), timeout=timeout)
+            except asyncio.TimeoutError:
+                _store_when_loaded(group_load, keys, ttl_of, extra)
+                raise
+
+    groups = list(misses.values())
+    loaded = await asyncio.gather(*(load(keys) for keys in groups), return_exceptions=True)
+
+    items = {}
+    ttls = {}
+    for keys, values in zip(groups, loaded):
+        if isinstance(values, BaseException):
+            values = [values] * len(keys)
+        for key, value in zip(keys, values):
+            if not isinstance(value, BaseException):
+                _add_fresh(items, ttls, key, value, ttl_of(key), now)
+                results[key] = value
+                continue
+            entry = entries.get(key)
+            if entry and _can_serve_stale(entry, value, now):
+                logger.warning("Serving stale value for key=%s after upstream error: %s", key, value)
+                results[key] = entry["value"]
+            else:
+                results[key] = value
+
+    _add_extra(items, ttls, extra)
+    await set_cache_many(items, ttls)
+    return results
+
+
+def _add_fresh(items: dict, ttls: dict, key: str, value, ttl: int, now: float):
+    items[key] = make_entry(value, ttl, now)
+    ttls[key] = _redis_ttl(ttl)
+
+
+def _add_extra(items: dict, ttls: dict, extra: dict | None):
+    for key, (value, key_ttl) in (extra or {}).items():
+        items[key] = value
+        ttls[key] = key_ttl
+
+
+def _store_when_loaded(group_load: asyncio.Future, keys: list[str], ttl_of, extra: dict | None):
+    """Пишет результат загрузки, которую пакет перестал ждать по таймауту."""
+    async def run():
+        values = await group_load
+        items, ttls = {}, {}
+        now = time.time()
+        for key, value in zip(keys, values):
+            if not isinstance(value, BaseException):
+                _add_fresh(items, ttls, key, value, ttl_of(key), now)
+        # побочные записи этой загрузки появились уже после записи пакета
+        _add_extra(items, ttls, extra)
+        await set_cache_many(items, ttls)
+
+    task = asyncio.create_task(run())
+    _background.add(task)
+    task.add_done_callback(_background.discard)
@@ -0,0 +1,74 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Optional
+
+from src.core.config import settings
+from src.utils.utils import acquire_lock, release_lock
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    Склеивает одновременные промахи кэша по одному ключу:
+    первый запрос идёт во внешний API, остальные ждут тот же результат.
+
+    В режиме settings.singleflight_mode == "redis" дополнительно берётся
+    Redis-лок, чтобы ключ обновлял только один процесс (все воркеры uvicorn
+    и бот). Остальные процессы ждут, пока значение появится в кэше.
+    """
+
+    def __init__(self):
+        self._calls: dict[str, asyncio.Task] = {}
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._calls
+
+    async def do(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable],
+        wait_for: Optional[Callable[[], Awaitable]] = None,
+    ):
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run(key, fn, wait_for))
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+
+        # shield: отмена одного ожидающего не отменяет общий запрос
+        return await asyncio.shield(task)
+
+    def _done(self, key: str, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # помечаем исключение как полученное, даже если ждать было некому
+            task.exception()
+
+    async def _run(self, key, fn, wait_for):
+        if settings.singleflight_mode != "redis" or wait_for is None:
+            return await fn()
+
+        lock_name = f"lock:{key}"
+        token = await acquire_lock(lock_name, settings.singleflight_lock_ttl)
+        if token is not None:
+            try:
+                return await fn()
+            finally:
+                await release_lock(lock_name, token)
+
+        # ключ обновляет другой процесс — ждём, пока значение появится в кэше
+        deadline = time.monotonic() + settings.singleflight_wait
+        while time.monotonic() < deadline:
+            await asyncio.sleep(settings.singleflight_poll_interval)
+            value = await wait_for()
+            if value:
+                return value
+
+        logger.warning("Single-flight wait expired for key=%s, fetching directly", key)
+        return await fn()
+
+
+singleflight = SingleFlight()
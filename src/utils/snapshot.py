@@ -0,0 +1,239 @@
+import argparse
+import asyncio
+import logging
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+
+from src.core.config import settings
+from src.utils import utils
+from src.utils.popularity import currency_popularity, weather_popularity
+
+logger = logging.getLogger(__name__)
+
+# Снимок горячих ключей кэша на диске — для быстрого холодного старта:
+#   python -m src.utils.snapshot dump [--path FILE]     # Redis -> файл
+#   python -m src.utils.snapshot restore [--path FILE]  # файл -> Redis
+#   python -m src.utils.snapshot info [--path FILE]
+#
+# Формат: заголовок, таблица записей фиксированного размера, затем ключи и значения.
+# Значения лежат в том же виде, что в Redis (с заголовком codec), срок — unix-время.
+_MAGIC = b"WCSN"
+VERSION = 1
+_HEADER = struct.Struct("<4sHHdI")  # метка, версия, резерв, время снимка, число записей
+_ENTRY = struct.Struct("<QIQId")  # смещение и длина ключа, смещение и длина значения, срок
+
+# что попадает в снимок: данные, из которых собираются ответы
+KEY_PATTERNS = ("weather:*", "forecast:*", "currency:rates:*")
+
+
+class CacheSnapshot:
+    """
+    Снимок, открытый через mmap. При открытии читается только таблица записей;
+    значение копируется из файла при первом обращении к ключу.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, self.created, count = _HEADER.unpack_from(self._map)
+        if magic != _MAGIC or version != VERSION:
+            self._map.close()
+            raise ValueError(f"Unsupported snapshot format {magic!r} v{version}")
+
+        self._index: dict[str, tuple[int, int, float]] = {}
+        now = time.time()
+        for i in range(count):
+            key_off, key_len, val_off, val_len, expires = _ENTRY.unpack_from(
+                self._map, _HEADER.size + i * _ENTRY.size
+            )
+            if expires > now:
+                key = self._map[key_off:key_off + key_len].decode()
+                self._index[key] = (val_off, val_len, expires)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def get(self, key: str):
+        """(payload, срок) или None, если ключа нет или он истёк."""
+        item = self._index.get(key)
+        if item is None:
+            return None
+        val_off, val_len, expires = item
+        if expires <= time.time():
+            del self._index[key]
+            return None
+        return self._map[val_off:val_off + val_len], expires
+
+    def items(self):
+        for key in list(self._index):
+            item = self.get(key)
+            if item is not None:
+                yield key, item
+
+    def close(self):
+        self._map.close()
+
+
+def write_snapshot(path, entries: dict[str, tuple[bytes, float]]):
+    """Записывает {key: (payload, срок)} атомарно: читатели старого файла его не теряют."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    keys = [key.encode() for key in entries]
+    offset = _HEADER.size + len(entries) * _ENTRY.size
+
+    table, blobs = [], []
+    for key, (payload, expires) in zip(keys, entries.values()):
+        key_off = offset
+        val_off = key_off + len(key)
+        offset = val_off + len(payload)
+        table.append(_ENTRY.pack(key_off, len(key), val_off, len(payload), expires))
+        blobs.extend((key, payload))
+
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, VERSION, 0, time.time(), len(entries)))
+        f.writelines(table)
+        f.writelines(blobs)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def open_snapshot(path=None) -> CacheSnapshot | None:
+    path = path or settings.snapshot_path
+    try:
+        return CacheSnapshot(path)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, struct.error) as e:
+        logger.warning("Cache snapshot %s not loaded: %s", path, e)
+        return None
+
+
+def load_snapshot() -> int:
+    """Подключает снимок к промахам кэша (utils.get_cache) — без чтения значений."""
+    snapshot = open_snapshot() if settings.snapshot_enabled else None
+    utils.attach_snapshot(snapshot)
+    if snapshot is not None:
+        logger.info("Cache snapshot attached: %d keys from %s", len(snapshot), snapshot.path)
+    return len(snapshot) if snapshot is not None else 0
+
+
+async def _hot_keys(limit: int) -> list[str]:
+    """Сначала популярные ключи этого процесса, затем остальные по SCAN."""
+    keys = [key for tracker in (weather_popularity, currency_popularity) for key, _ in tracker.top(limit)]
+    seen = set(keys)
+    for pattern in KEY_PATTERNS:
+        cursor = 0
+        while len(seen) < limit:
+            cursor, batch = await utils.redis_op(
+                lambda client: client.scan(cursor, match=pattern, count=500)
+            )
+            for key in batch:
+                key = key.decode() if isinstance(key, bytes) else key
+                if key not in seen:
+                    seen.add(key)
+                    keys.append(key)
+            if not cursor:
+                break
+    return keys[:limit]
+
+
+async def collect_entries(limit: int | None = None) -> dict[str, tuple[bytes, float]]:
+    """{key: (payload, срок)} горячих ключей из Redis, пайплайнами по 500."""
+    keys = await _hot_keys(limit or settings.snapshot_max_entries)
+    entries = {}
+    for start in range(0, len(keys), 500):
+        chunk = keys[start:start + 500]
+
+        async def read(client):
+            async with client.pipeline(transaction=False) as pipe:
+                for key in chunk:
+                    pipe.get(key)
+                    pipe.pttl(key)
+                return await pipe.execute()
+
+        results = await utils.redis_op(read)
+        now = time.time()
+        for key, payload, pttl in zip(chunk, results[::2], results[1::2]):
+            if payload and pttl and pttl > 0:
+                entries[key] = (bytes(payload), now + pttl / 1000)
+    return entries
+
+
+async def dump(path=None) -> int:
+    entries = await collect_entries()
+    await asyncio.to_thread(write_snapshot, path or settings.snapshot_path, entries)
+    return len(entries)
+
+
+async def restore(path=None) -> int:
+    """Записывает живые записи снимка в Redis (не перетирая существующие ключи)."""
+    snapshot = open_snapshot(path)
+    if snapshot is None:
+        return 0
+    items = list(snapshot.items())
+    now = time.time()
+
+    async def write(client):
+        async with client.pipeline(transaction=False) as pipe:
+            for key, (payload, expires) in items:
+                pipe.set(key, bytes(payload), px=max(1, int((expires - now) * 1000)), nx=True)
+            await pipe.execute()
+
+    try:
+        if items:
+            await utils.redis_op(write)
+    finally:
+        snapshot.close()
+    return len(items)
+
+
+async def run_snapshotter():
+    """
+    Периодический снимок. Пишет один процесс — тот, кто взял лок на интервал;
+    файл общий для контейнеров через том data.
+    """
+    interval = settings.snapshot_interval
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if await utils.acquire_lock("lock:snapshot", interval * 0.9) is None:
+                continue
+            count = await dump()
+            logger.info("Cache snapshot written: %d keys", count)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Cache snapshot error: %s", e)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src.utils.snapshot", description="Cache snapshots")
+    parser.add_argument("command", choices=("dump", "restore", "info"))
+    parser.add_argument("--path", default=settings.snapshot_path)
+    args = parser.parse_args(argv)
+
+    if args.command == "info":
+        snapshot = open_snapshot(args.path)
+        if snapshot is None:
+            print(f"{args.path}: no snapshot")
+            return 1
+        created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(snapshot.created))
+        print(f"{args.path}: format v{VERSION}, written {created}, {len(snapshot)} live keys")
+        snapshot.close()
+        return 0
+
+    command = dump if args.command == "dump" else restore
+    count = asyncio.run(command(args.path))
+    print(f"{args.command}: {count} keys")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    raise SystemExit(main())
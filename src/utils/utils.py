@@ -1,53 +1,565 @@
 # app/utils.py
-import os
-import json
 import asyncio
+import time
+import uuid
 import logging
+from collections import OrderedDict
+
 import redis.asyncio as redis
 
+from src.core.config import settings
+from src.utils import codec
+from src.core.metrics import CACHE_REQUESTS, Counter, Gauge, keyspace
+from src.core.tracing import span
+
 logger = logging.getLogger(__name__)
 
-REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 # не создаём клиент на уровне импорта, сделаем лениво
 _redis_client = None
 
 def get_redis_client():
     global _redis_client
     if _redis_client is None:
-        # socket_connect_timeout уменьшит время ожидания при недоступном сервере
-        _redis_client = redis.from_url(REDIS_URL, socket_connect_timeout=2)
+        # явный пул: ограничение соединений, короткие таймауты сокета вместо
+        # asyncio.wait_for на каждый вызов и периодическая проверка соединений
+        pool = redis.BlockingConnectionPool.from_url(
+            settings.redis_url,
+            max_connections=settings.redis_max_connections,
+            timeout=settings.redis_pool_timeout,
+            socket_timeout=settings.redis_socket_timeout,
+            socket_connect_timeout=settings.redis_connect_timeout,
+            health_check_interval=settings.redis_health_check_interval,
+        )
+        _redis_client = redis.Redis(connection_pool=pool)
     return _redis_client
 
-async def get_cache(key: str, timeout: float = 2.0):
+
+async def close_redis():
+    """Закрывает соединения пула при остановке; клиент при следующем вызове подключится заново."""
+    if _redis_client is not None:
+        await _redis_client.aclose(close_connection_pool=True)
+
+
+REDIS_UP = Gauge("redis_up", "0 while Redis is marked down by the health breaker")
+REDIS_DROPPED_WRITES = Counter(
+    "redis_dropped_writes_total", "Background Redis writes dropped because the queue or the pool was full"
+)
+REDIS_POOL_EXHAUSTED = Counter(
+    "redis_pool_exhausted_total", "Redis calls that found no free pooled connection within redis_pool_timeout"
+)
+
+# ошибки связи с Redis; остальные (например, ResponseError) значат, что сервер ответил
+_CONNECTION_ERRORS = (redis.ConnectionError, redis.TimeoutError, OSError, asyncio.TimeoutError)
+
+
+def _pool_exhausted(exc: BaseException) -> bool:
     """
-    Попытка получить значение из Redis, но с ограничением по времени.
-    Возвращает None при ошибке / таймауте.
+    BlockingConnectionPool не дождался свободного соединения (redis_pool_timeout).
+    Redis при этом жив — все соединения заняты нашими же запросами,
+    поэтому это перегрузка, а не сбой связи, и breaker её не считает.
+    Пул оборачивает таймаут ожидания в ConnectionError (raise ... from), а таймауты
+    самой связи redis-py поднимает как redis.TimeoutError — их не путаем.
     """
-    client = get_redis_client()
+    return isinstance(exc, redis.ConnectionError) and isinstance(exc.__cause__, asyncio.TimeoutError)
+
+
+class RedisUnavailable(Exception):
+    """Redis помечен недоступным — запрос к нему не отправлялся."""
+
+
+class RedisHealth:
+    """
+    Breaker для Redis: после redis_breaker_threshold ошибок связи подряд
+    Redis считается недоступным на redis_breaker_cooldown секунд — обращения
+    к нему сразу пропускаются, а не ждут таймаут. Потом пропускается одна проба.
+    """
+
+    def __init__(self):
+        self.failures = 0
+        self.down_until = 0.0
+        self._probing = False
+
+    @property
+    def is_down(self) -> bool:
+        return self.down_until > 0
+
+    def available(self) -> bool:
+        if not self.down_until:
+            return True
+        if time.monotonic() < self.down_until or self._probing:
+            return False
+        self._probing = True
+        return True
+
+    def success(self):
+        if self.down_until:
+            logger.info("Redis is reachable again")
+            fallback_cache.clear()
+        self.failures = 0
+        self.down_until = 0.0
+        self._probing = False
+        REDIS_UP.labels().set(1)
+
+    def failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.down_until or self.failures >= settings.redis_breaker_threshold:
+            if not self.down_until:
+                logger.warning("Redis marked down after %d errors", self.failures)
+            self.down_until = time.monotonic() + settings.redis_breaker_cooldown
+            REDIS_UP.labels().set(0)
+
+    def abort_probe(self):
+        self._probing = False
+
+    def reset(self):
+        self.failures = 0
+        self.down_until = 0.0
+        self._probing = False
+
+
+redis_health = RedisHealth()
+
+
+async def redis_op(op):
+    """
+    Выполняет op(client) с учётом состояния Redis:
+    помечен недоступным — сразу RedisUnavailable, ошибки связи копятся в breaker.
+    """
+    if not redis_health.available():
+        raise RedisUnavailable("Redis is marked down")
     try:
-        data = await asyncio.wait_for(client.get(key), timeout=timeout)
-        if data:
-            try:
-                print('get', data)
-                return json.loads(data)
-            except Exception:
-                return None
+        with span("redis"):
+            result = await op(get_redis_client())
+    except _CONNECTION_ERRORS as e:
+        if _pool_exhausted(e):
+            REDIS_POOL_EXHAUSTED.labels().inc()
+            redis_health.abort_probe()
+        else:
+            redis_health.failure()
+        raise
+    except asyncio.CancelledError:
+        redis_health.abort_probe()
+        raise
+    except Exception:
+        redis_health.success()
+        raise
+    redis_health.success()
+    return result
+
+class LocalCache:
+    """
+    In-process кэш (L1) перед Redis: TTL + LRU с ограничением
+    по числу записей и по суммарному размеру сериализованных значений.
+    Значения отдаются без копирования — вызывающий код их не меняет.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, tier: str = "l1"):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.tier = tier
+        self.size_bytes = 0
+        # key -> (value, expires_at, size)
+        self._data: OrderedDict[str, tuple] = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key: str):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at, size = item
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value, ttl: float, size: int):
+        if ttl <= 0 or size > self.max_bytes:
+            self.delete(key)
+            return
+        if key in self._data:
+            self._remove(key)
+        self._data[key] = (value, time.monotonic() + ttl, size)
+        self.size_bytes += size
+
+        while len(self._data) > self.max_entries or self.size_bytes > self.max_bytes:
+            oldest = next(iter(self._data))
+            self._remove(oldest)
+            CACHE_EVICTIONS.labels(self.tier).inc()
+
+    def delete(self, key: str):
+        if key in self._data:
+            self._remove(key)
+
+    def clear(self):
+        self._data.clear()
+        self.size_bytes = 0
+
+    def _remove(self, key: str):
+        _, _, size = self._data.pop(key)
+        self.size_bytes -= size
+
+
+local_cache = LocalCache(settings.l1_max_entries, settings.l1_max_bytes)
+# запасное хранилище на время недоступности Redis (сбрасывается, когда Redis вернулся)
+fallback_cache = LocalCache(
+    settings.redis_fallback_max_entries, settings.redis_fallback_max_bytes, tier="fallback"
+)
+
+# уровни кэша в метриках: l1 — память процесса, l2 — Redis
+CACHE_EVICTIONS = Counter("cache_evictions_total", "Cache evictions by tier", ("tier",))
+Gauge(
+    "cache_l1_entries", "Entries held in the in-process cache",
+    collect=lambda: {(): len(local_cache)},
+)
+Gauge(
+    "cache_l1_bytes", "Serialized size of the in-process cache",
+    collect=lambda: {(): local_cache.size_bytes},
+)
+
+
+def _encode(value) -> bytes:
+    # bytes — уже готовое тело ответа, его не сериализуем повторно
+    if isinstance(value, bytes):
+        return codec.encode_bytes(value)
+    return codec.encode(value)
+
+
+def _count(key: str, tier: str, result: str):
+    CACHE_REQUESTS.labels(keyspace(key), tier, result).inc()
+
+# идентификатор процесса, чтобы не сбрасывать L1 по своим же сообщениям
+NODE_ID = uuid.uuid4().hex
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+
+def _l1_ttl(value, ttl: float) -> float:
+    """
+    Запись stale-while-revalidate (src/utils/refresh.py) живёт в L1 только пока
+    свежая: после soft её надо перечитать из Redis — ключ там мог уже обновить
+    другой воркер, и тогда API не вызывается второй раз.
+    """
+    if isinstance(value, dict) and "soft" in value:
+        return min(ttl, value["soft"] - time.time())
+    return ttl
+
+
+def _from_l1(key: str):
+    if not settings.l1_enabled:
+        return None
+    value = local_cache.get(key)
+    _count(key, "l1", "hit" if value is not None else "miss")
+    return value
+
+
+def cached_locally(keys: list[str]) -> bool:
+    """Все ключи есть в памяти процесса (L1 или запасное хранилище) — без обращения к Redis."""
+    store = fallback_cache if redis_health.is_down else local_cache
+    return all(store.get(key) is not None for key in keys)
+
+
+def _from_fallback(key: str):
+    value = fallback_cache.get(key)
+    _count(key, "fallback", "hit" if value is not None else "miss")
+    return value
+
+
+# снимок кэша с диска (src/utils/snapshot.py): запасной источник при промахе Redis
+_snapshot = None
+
+
+def attach_snapshot(snapshot):
+    global _snapshot
+    _snapshot = snapshot
+
+
+def _from_snapshot(key: str):
+    if _snapshot is None:
+        return None
+    item = _snapshot.get(key)
+    if item is None:
+        _count(key, "snapshot", "miss")
         return None
-    except asyncio.TimeoutError:
-        logger.warning("Redis get timeout for key=%s", key)
+    payload, expires = item
+    try:
+        value = codec.decode(payload)
+    except Exception:
+        _count(key, "snapshot", "error")
         return None
+    _count(key, "snapshot", "hit")
+    ttl = expires - time.time()
+    if settings.l1_enabled:
+        local_cache.set(key, value, _l1_ttl(value, ttl), len(payload))
+    # возвращаем запись в Redis, чтобы её увидели и остальные воркеры
+    payload = bytes(payload)
+    _write_in_background(
+        lambda client: client.set(key, payload, px=max(1, int(ttl * 1000)), nx=True), key
+    )
+    return value
+
+
+def _l2_failed(key: str, e: Exception):
+    if isinstance(e, RedisUnavailable):
+        _count(key, "l2", "skipped")
+    elif isinstance(e, (redis.TimeoutError, asyncio.TimeoutError)):
+        _count(key, "l2", "timeout")
+    else:
+        _count(key, "l2", "error")
+
+
+async def get_cache(key: str):
+    """
+    Сначала L1 в памяти процесса, затем Redis.
+    Пока Redis помечен недоступным — запасное хранилище в памяти, без ожидания.
+    Возвращает None при ошибке.
+    """
+    value = _from_l1(key)
+    if value is not None:
+        return value
+
+    async def read(client):
+        # вместе со значением забираем остаток TTL, чтобы L1 жил не дольше Redis
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.get(key)
+            pipe.pttl(key)
+            return await pipe.execute()
+
+    try:
+        data, pttl = await redis_op(read)
     except Exception as e:
-        logger.warning("Redis get error: %s", e)
+        _l2_failed(key, e)
+        if not isinstance(e, RedisUnavailable):
+            logger.warning("Redis get error: %s", e)
+        value = _from_fallback(key) if redis_health.is_down else None
+        return value if value is not None else _from_snapshot(key)
+
+    if not data:
+        _count(key, "l2", "miss")
+        return _from_snapshot(key)
+    try:
+        value = codec.decode(data)
+    except Exception:
+        _count(key, "l2", "error")
         return None
+    _count(key, "l2", "hit")
+    if settings.l1_enabled and pttl and pttl > 0:
+        local_cache.set(key, value, _l1_ttl(value, pttl / 1000), len(data))
+    return value
+
+
+# фоновые записи в Redis: ответ не ждёт запись, но очередь ограничена
+_pending_writes: set[asyncio.Task] = set()
+
+
+def _write_in_background(write, what: str):
+    if len(_pending_writes) >= settings.redis_max_pending_writes:
+        REDIS_DROPPED_WRITES.labels().inc()
+        logger.warning("Dropping Redis write for %s: too many pending writes", what)
+        return
+
+    async def run():
+        try:
+            await redis_op(write)
+        except RedisUnavailable:
+            pass
+        except redis.ConnectionError as e:
+            if not _pool_exhausted(e):
+                logger.warning("Redis write error for %s: %s", what, e)
+            else:
+                # пул занят — запись отбрасывается, как при переполненной очереди
+                REDIS_DROPPED_WRITES.labels().inc()
+        except Exception as e:
+            logger.warning("Redis write error for %s: %s", what, e)
+
+    task = asyncio.create_task(run())
+    _pending_writes.add(task)
+    task.add_done_callback(_pending_writes.discard)
+
+
+async def flush_writes():
+    """Дождаться фоновых записей (при остановке и в тестах)."""
+    while _pending_writes:
+        await asyncio.gather(*list(_pending_writes), return_exceptions=True)
+
+
+def _key_ttl(ttl, key: str) -> int:
+    return ttl[key] if isinstance(ttl, dict) else ttl
+
+
+def _store_local(items: dict, ttl) -> dict:
+    """Пишет в L1 (и в запасное хранилище, пока Redis недоступен); возвращает payload'ы."""
+    payloads = {}
+    for key, value in items.items():
+        payload = payloads[key] = _encode(value)
+        key_ttl = _key_ttl(ttl, key)
+        if settings.l1_enabled:
+            local_cache.set(key, value, _l1_ttl(value, key_ttl), len(payload))
+        if redis_health.is_down:
+            fallback_cache.set(key, value, key_ttl, len(payload))
+    return payloads
+
+
+async def set_cache(key: str, value, ttl: int = 600):
+    """Запись сразу в L1, в Redis — в фоне (ответ её не ждёт)."""
+    try:
+        payload = _store_local({key: value}, ttl)[key]
+    except Exception as e:
+        logger.warning("Cache encode error for key=%s: %s", key, e)
+        return
+
+    async def write(client):
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.set(key, payload, ex=ttl)
+            if settings.l1_invalidation:
+                pipe.publish(INVALIDATION_CHANNEL, f"{NODE_ID} {key}")
+            await pipe.execute()
+
+    _write_in_background(write, key)
 
-async def set_cache(key: str, value: dict, ttl: int = 600, timeout: float = 2.0):
+
+async def get_cache_many(keys: list[str]) -> dict:
+    """
+    Пакетное чтение: L1, а остальное одним пайплайном (MGET + PTTL).
+    Возвращает {key: value} только для найденных ключей.
+    """
+    found = {}
+    rest = []
+    for key in keys:
+        value = _from_l1(key)
+        if value is not None:
+            found[key] = value
+        else:
+            rest.append(key)
+
+    if not rest:
+        return found
+
+    async def read(client):
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.mget(rest)
+            for key in rest:
+                pipe.pttl(key)
+            return await pipe.execute()
+
+    try:
+        data, *pttls = await redis_op(read)
+    except Exception as e:
+        for key in rest:
+            _l2_failed(key, e)
+        if not isinstance(e, RedisUnavailable):
+            logger.warning("Redis mget error: %s", e)
+        for key in rest:
+            value = _from_fallback(key) if redis_health.is_down else None
+            if value is None:
+                value = _from_snapshot(key)
+            if value is not None:
+                found[key] = value
+        return found
+
+    for key, raw, pttl in zip(rest, data, pttls):
+        if not raw:
+            _count(key, "l2", "miss")
+            value = _from_snapshot(key)
+            if value is not None:
+                found[key] = value
+            continue
+        try:
+            value = codec.decode(raw)
+        except Exception:
+            _count(key, "l2", "error")
+            continue
+        _count(key, "l2", "hit")
+        found[key] = value
+        if settings.l1_enabled and pttl and pttl > 0:
+            local_cache.set(key, value, _l1_ttl(value, pttl / 1000), len(raw))
+    return found
+
+
+async def set_cache_many(items: dict, ttl: int | dict = 600):
+    """
+    Пакетная запись {key: value}: L1 сразу, Redis — одним пайплайном в фоне.
+    ttl — один на все ключи или {key: ttl}.
+    """
+    if not items:
+        return
+    try:
+        payloads = _store_local(items, ttl)
+    except Exception as e:
+        logger.warning("Cache encode error: %s", e)
+        return
+
+    async def write(client):
+        async with client.pipeline(transaction=False) as pipe:
+            for key, payload in payloads.items():
+                pipe.set(key, payload, ex=_key_ttl(ttl, key))
+                if settings.l1_invalidation:
+                    pipe.publish(INVALIDATION_CHANNEL, f"{NODE_ID} {key}")
+            await pipe.execute()
+
+    _write_in_background(write, f"{len(payloads)} keys")
+
+
+async def run_invalidation_listener():
+    """
+    Слушает канал инвалидации: когда другой воркер обновил ключ,
+    выкидываем свою копию из L1, чтобы не отдавать расходящиеся данные.
+    """
     client = get_redis_client()
+    while True:
+        try:
+            async with client.pubsub() as pubsub:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    data = message["data"]
+                    if isinstance(data, bytes):
+                        data = data.decode()
+                    node, _, key = data.partition(" ")
+                    if node != NODE_ID:
+                        local_cache.delete(key)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Cache invalidation listener error: %s", e)
+            # подписка потеряна — L1 мог разойтись с Redis
+            local_cache.clear()
+            await asyncio.sleep(1)
+
+
+# сравнить токен и удалить ключ одной атомарной операцией
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+async def acquire_lock(name: str, ttl: float):
+    """
+    Пытается взять распределённый лок (SET NX PX).
+    Возвращает токен владельца или None, если лок держит кто-то другой.
+    Если Redis недоступен, координировать некому — считаем лок взятым.
+    """
+    token = uuid.uuid4().hex
+    try:
+        acquired = await redis_op(lambda client: client.set(name, token, nx=True, px=int(ttl * 1000)))
+    except RedisUnavailable:
+        return token
+    except Exception as e:
+        logger.warning("Redis lock error: %s", e)
+        return token
+    return token if acquired else None
+
+
+async def release_lock(name: str, token: str):
     try:
-        payload = json.dumps(value)
-        print('set', payload)
-        # асинхронная установка с ограничением по времени
-        await asyncio.wait_for(client.set(key, payload, ex=ttl), timeout=timeout)
-    except asyncio.TimeoutError:
-        logger.warning("Redis set timeout for key=%s", key)
+        await redis_op(lambda client: client.eval(_RELEASE_LOCK_SCRIPT, 1, name, token))
+    except RedisUnavailable:
+        pass
     except Exception as e:
-        logger.warning("Redis set error: %s", e)
+        logger.warning("Redis unlock error: %s", e)
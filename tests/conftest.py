@@ -0,0 +1,46 @@
+import pytest
+
+from src.core.config import settings
+from src.core import admission
+from src.integrations import policy, quota
+from src.utils import utils
+from tests.fakes import FakeRedis
+
+
+@pytest.fixture(autouse=True)
+def clear_local_cache():
+    # L1, breaker'ы и локальные квоты живут в памяти процесса — не даём им протекать между тестами
+    def reset():
+        utils.local_cache.clear()
+        utils.fallback_cache.clear()
+        utils.redis_health.reset()
+        policy.reset_policies()
+        quota.reset_local_quota()
+        admission.reset_gates()
+
+    reset()
+    yield
+    reset()
+
+
+@pytest.fixture(autouse=True)
+def rate_history_dir(tmp_path, monkeypatch):
+    # история курсов пишется на диск — у каждого теста свой каталог
+    path = tmp_path / "rate_history"
+    monkeypatch.setattr(settings, "rate_history_dir", str(path))
+    return path
+
+
+@pytest.fixture(autouse=True)
+def snapshot_path(tmp_path, monkeypatch):
+    path = tmp_path / "cache.snap"
+    monkeypatch.setattr(settings, "snapshot_path", str(path))
+    yield path
+    utils.attach_snapshot(None)
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    client = FakeRedis()
+    monkeypatch.setattr(utils, "_redis_client", client)
+    return client
@@ -0,0 +1,155 @@
+"""
+Redis в памяти для тестов и бенчмарков (benchmarks.run): строки с TTL, хеши,
+пайплайны, SCAN и Lua-скрипты — скрипты выполняет настоящий Lua (lupa),
+поэтому квоты и локи проходят тот же путь, что и с Redis.
+"""
+import fnmatch
+import time
+
+from lupa import LuaRuntime, lua_type
+
+
+class FakeRedis:
+    """Минимальная замена redis.asyncio.Redis для тестов кэша."""
+
+    def __init__(self):
+        self.store = {}
+        self.published = []
+        self.closed = False
+
+    def _alive(self, key):
+        item = self.store.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.store[key]
+            return None
+        return value
+
+    async def get(self, key):
+        return self._alive(key)
+
+    async def set(self, key, value, ex=None, px=None, nx=False):
+        if nx and self._alive(key) is not None:
+            return None
+        if isinstance(value, str):
+            value = value.encode()
+        if px:
+            ex = px / 1000
+        expires_at = time.monotonic() + ex if ex else None
+        self.store[key] = (value, expires_at)
+        return True
+
+    async def mget(self, keys):
+        return [self._alive(key) for key in keys]
+
+    async def incr(self, key):
+        return self._command("INCR", key)
+
+    async def expire(self, key, seconds):
+        return self._command("EXPIRE", key, seconds)
+
+    def _command(self, name, *args):
+        """Синхронные команды — их же вызывают Lua-скрипты через redis.call."""
+        name, key = name.upper(), args[0]
+        value = self._alive(key)
+        expires_at = self.store[key][1] if value is not None else None
+        if name == "GET":
+            return value
+        if name == "DEL":
+            return int(self.store.pop(key, None) is not None)
+        if name == "INCR":
+            value = int(value or 0) + 1
+            self.store[key] = (str(value).encode(), expires_at)
+            return value
+        if name in ("EXPIRE", "PEXPIRE"):
+            if value is None:
+                return 0
+            seconds = float(args[1]) / (1000 if name == "PEXPIRE" else 1)
+            self.store[key] = (value, time.monotonic() + seconds)
+            return 1
+        if name == "HMGET":
+            fields = value or {}
+            return [fields.get(str(field), False) for field in args[1:]]
+        if name == "HSET":
+            fields = dict(value or {})
+            pairs = args[1:]
+            fields.update((str(f), str(v).encode()) for f, v in zip(pairs[::2], pairs[1::2]))
+            self.store[key] = (fields, expires_at)
+            return len(pairs) // 2
+        raise NotImplementedError(f"{name} is not emulated")
+
+    async def pttl(self, key):
+        if self._alive(key) is None:
+            return -2
+        _, expires_at = self.store[key]
+        if expires_at is None:
+            return -1
+        return int((expires_at - time.monotonic()) * 1000)
+
+    async def publish(self, channel, message):
+        self.published.append((channel, message))
+        return 0
+
+    async def aclose(self, close_connection_pool=None):
+        self.closed = True
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def delete(self, *keys):
+        return sum(self.store.pop(key, None) is not None for key in keys)
+
+    async def scan(self, cursor=0, match="*", count=None):
+        # весь обход за один вызов
+        keys = [k.encode() for k in list(self.store) if self._alive(k) is not None and fnmatch.fnmatch(k, match)]
+        return 0, keys
+
+    async def eval(self, script, numkeys, *args):
+        # скрипт выполняется настоящим Lua (lupa), redis.call — команды заглушки;
+        # аргументы приходят строками, как от redis-py
+        lua = LuaRuntime(encoding=None)
+
+        def call(name, *command):
+            result = self._command(name.decode(), *(a.decode() if isinstance(a, bytes) else a for a in command))
+            return lua.table_from(result) if isinstance(result, list) else result
+
+        lua_globals = lua.globals()
+        lua_globals.KEYS = lua.table_from([str(a).encode() for a in args[:numkeys]])
+        lua_globals.ARGV = lua.table_from([str(a).encode() for a in args[numkeys:]])
+        lua_globals.redis = lua.table_from({b"call": call})
+        return _from_lua(lua.execute(script))
+
+
+def _from_lua(value):
+    """Ответ скрипта так, как его вернул бы Redis: числа — целые, таблицы — списки."""
+    if lua_type(value) == "table":
+        return [_from_lua(item) for item in value.values()]
+    if isinstance(value, bool):
+        return 1 if value else None
+    if isinstance(value, float):
+        return int(value)
+    return value
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+        return queue
+
+    async def execute(self):
+        commands, self.commands = self.commands, []
+        return [await getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in commands]
@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+
+from src.core import admission
+from src.core.admission import CACHED, UPSTREAM, AdmissionGate, Overloaded
+from src.core.config import settings
+from tests.test_api import make_client
+
+
+@pytest.mark.asyncio
+async def test_gate_limits_concurrency_and_prefers_cached():
+    gate = AdmissionGate("test", limit=1, max_queue=10)
+    await gate.acquire(UPSTREAM)
+    order = []
+
+    async def waiter(name, priority):
+        await gate.acquire(priority)
+        order.append(name)
+        gate.release()
+
+    tasks = [
+        asyncio.create_task(waiter("upstream", UPSTREAM)),
+        asyncio.create_task(waiter("cached", CACHED)),
+    ]
+    await asyncio.sleep(0)
+    assert gate.waiting == 2 and order == []
+
+    gate.release()
+    await asyncio.gather(*tasks)
+
+    assert order == ["cached", "upstream"]
+    assert gate.active == 0 and gate.waiting == 0
+
+
+@pytest.mark.asyncio
+async def test_gate_sheds_when_queue_full_or_deadline_missed(monkeypatch):
+    monkeypatch.setattr(settings, "admission_queue_timeout", 1.0)
+    gate = AdmissionGate("test", limit=1, max_queue=1)
+    await gate.acquire(UPSTREAM)
+    queued = asyncio.create_task(gate.acquire(UPSTREAM))
+    await asyncio.sleep(0)
+
+    with pytest.raises(Overloaded) as exc:
+        await gate.acquire(CACHED)
+    assert exc.value.reason == "queue_full"
+
+    # по средней длительности место освободится позже допустимого ожидания
+    gate.max_queue = 10
+    gate.service_time = 5.0
+    with pytest.raises(Overloaded) as exc:
+        await gate.acquire(UPSTREAM)
+    assert exc.value.reason == "deadline"
+    assert exc.value.retry_after >= 5
+
+    queued.cancel()
+    await asyncio.gather(queued, return_exceptions=True)
+    gate.release()
+    assert gate.active == 0
+
+
+@pytest.mark.asyncio
+async def test_gate_times_out_waiters(monkeypatch):
+    monkeypatch.setattr(settings, "admission_queue_timeout", 0.05)
+    gate = AdmissionGate("test", limit=1, max_queue=10)
+    gate.service_time = 0.001
+    await gate.acquire(UPSTREAM)
+    rejected = admission.ADMISSION_REJECTED.labels("test", "timeout")
+    before = rejected.value
+
+    with pytest.raises(Overloaded):
+        await gate.acquire(UPSTREAM)
+
+    assert rejected.value == before + 1
+    gate.release()
+    assert gate.active == 0 and gate.waiting == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_passes_slot_on():
+    gate = AdmissionGate("test", limit=1, max_queue=10)
+    await gate.acquire(UPSTREAM)
+    first = asyncio.create_task(gate.acquire(UPSTREAM))
+    second = asyncio.create_task(gate.acquire(UPSTREAM))
+    await asyncio.sleep(0)
+
+    # место выдано first, но его отменили раньше, чем он проснулся
+    gate.release()
+    first.cancel()
+    (result,) = await asyncio.gather(first, return_exceptions=True)
+    if not isinstance(result, BaseException):
+        # wait_for может вернуть уже готовый результат вместо отмены — тогда место у first
+        gate.release()
+
+    await asyncio.wait_for(second, 1)
+    assert gate.active == 1
+    gate.release()
+    assert gate.active == 0
+
+
+def test_route_returns_503_with_retry_after(fake_redis, monkeypatch):
+    monkeypatch.setattr(settings, "admission_limits", "weather=1")
+    monkeypatch.setattr(settings, "admission_max_queue", 0)
+    admission.get_gate("weather").active = 1
+
+    with make_client() as client:
+        shed = client.get("/weather", params={"city": "oslo"})
+        # другие маршруты не затронуты
+        other = client.get("/currency", params={"from_cur": "USD", "to": "EUR", "amount": 1})
+
+    assert shed.status_code == 503
+    assert shed.headers["retry-after"] == "1"
+    assert shed.json()["code"] == "overloaded"
+    assert other.status_code == 200
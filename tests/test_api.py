@@ -0,0 +1,349 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from src.core.config import settings
+from src.main import app
+from src.routes import routes
+from src.services.weather_service import get_weather_many
+from src.utils import refresh, utils
+from src.utils.utils import flush_writes
+from tests.fakes import FakePipeline
+from tests.test_validation import weather_success_handler, currency_success_handler
+
+
+def upstream_handler(request: httpx.Request) -> httpx.Response:
+    if "meteosource" in request.url.host:
+        return weather_success_handler(request)
+    return currency_success_handler(request)
+
+
+def make_client(handler=upstream_handler) -> TestClient:
+    app.state.http_transport = httpx.MockTransport(handler)
+    return TestClient(app)
+
+
+def test_app_reuses_one_pooled_client():
+    seen = []
+
+    def handler(request: httpx.Request):
+        seen.append(request)
+        return upstream_handler(request)
+
+    with make_client(handler) as client:
+        pooled = app.state.http_client
+        assert client.get("/weather", params={"city": "oslo"}).status_code == 200
+        assert client.get("/currency", params={"from_cur": "usd", "to": "eur", "amount": 10}).status_code == 200
+        assert app.state.http_client is pooled
+
+    assert pooled.is_closed
+    assert len(seen) == 2
+
+
+def test_currency_route_converts_float_amount():
+    with make_client() as client:
+        response = client.get("/currency", params={"from_cur": "USD", "to": "GBP", "amount": 2.5})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["to_currency"] == "GBP"
+    assert float(body["converted_amount"]) == 1.88
+
+
+def test_currency_amounts_do_not_grow_cache(fake_redis):
+    params = {"from_cur": "USD", "to": "GBP"}
+    with make_client() as client:
+        first = client.get("/currency", params={**params, "amount": 1})
+    # фоновые записи дописаны при остановке приложения
+    redis_keys = set(fake_redis.store)
+
+    with make_client() as client:
+        client.get("/currency", params={**params, "amount": 1})
+        l1_size = len(utils.local_cache)
+        for i in range(50):
+            assert client.get("/currency", params={**params, "amount": 1 + i / 100}).status_code == 200
+        assert len(utils.local_cache) == l1_size
+
+        # тело не кэшируется, но ETag и свежесть по таблице курсов остаются
+        again = client.get("/currency", params={**params, "amount": 1}, headers={"If-None-Match": first.headers["ETag"]})
+
+    assert set(fake_redis.store) == redis_keys
+    assert again.status_code == 304
+    assert int(first.headers["Cache-Control"].rsplit("=", 1)[1]) > 0
+
+
+def test_currency_batch_items_with_row_errors():
+    calls = []
+
+    def handler(request: httpx.Request):
+        calls.append(request.url.path)
+        return upstream_handler(request)
+
+    payload = {"items": [
+        {"from_currency": "usd", "to_currency": "EUR", "amount": 100},
+        {"from_currency": "USD", "to_currency": "GBP", "amount": 10},
+        {"from_currency": "USD", "to_currency": "XXX", "amount": 1},
+        {"from_currency": "US", "to_currency": "EUR", "amount": 1},
+        {"from_currency": "USD", "to_currency": "EUR", "amount": -5},
+    ]}
+
+    with make_client(handler) as client:
+        response = client.post("/currency/batch", json=payload)
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["converted_amount"] for r in results] == ["85.00", "7.50", None, None, None]
+    assert results[0]["rate"] == "0.85"
+    assert [r["error"] for r in results] == [
+        None, None, "Currency not found", "Invalid currency code", "Amount must be greater than 0",
+    ]
+    assert len(calls) == 1
+
+
+def test_currency_batch_columnar_cross_rates():
+    payload = {
+        "from_currency": ["EUR", "GBP"],
+        "to_currency": ["GBP", "USD"],
+        "amount": [85, 75],
+    }
+
+    def handler(request: httpx.Request):
+        if request.url.path.endswith("/EUR"):
+            return httpx.Response(200, json={"conversion_rates": {"EUR": 1, "GBP": 0.882353}})
+        return httpx.Response(200, json={"conversion_rates": {"GBP": 1, "USD": 1.333333}})
+
+    with make_client(handler) as client:
+        response = client.post("/currency/batch", json=payload)
+
+    body = response.json()
+    assert body["converted_amount"] == ["75.00", "100.00"]
+    assert body["error"] == [None, None]
+
+
+def test_currency_batch_matches_single_conversion():
+    # половина цента: округление должно совпадать с GET /currency, а не с float
+    amounts = [10.005, 10.015, 0.125, 2.675, 1.005, 5e-05, 123456.785]
+
+    def handler(request: httpx.Request):
+        return httpx.Response(200, json={"conversion_rates": {"USD": 1, "EUR": 0.85}})
+
+    with make_client(handler) as client:
+        batch = client.post("/currency/batch", json={
+            "from_currency": ["USD"] * 14,
+            "to_currency": ["USD"] * 7 + ["EUR"] * 7,
+            "amount": amounts * 2,
+        }).json()
+        single = [
+            client.get("/currency", params={"from_cur": "USD", "to": to, "amount": amount}).json()
+            for to in ("USD", "EUR") for amount in amounts
+        ]
+
+    assert batch["converted_amount"] == [r["converted_amount"] for r in single]
+    assert batch["rate"] == [r["rate"] for r in single]
+    assert batch["amount"] == [r["amount"] for r in single]
+    assert batch["converted_amount"][0] == "10.00"
+
+
+def test_currency_batch_rejects_mismatched_columns():
+    payload = {"from_currency": ["USD"], "to_currency": [], "amount": [1]}
+
+    with make_client() as client:
+        response = client.post("/currency/batch", json=payload)
+
+    assert response.status_code == 422
+
+
+def test_weather_batch_partial_failure(fake_redis):
+    calls = []
+
+    def handler(request: httpx.Request):
+        place = request.url.params["place_id"]
+        calls.append(place)
+        if place == "atlantis":
+            return httpx.Response(404, json={})
+        return weather_success_handler(request)
+
+    with make_client(handler) as client:
+        first = client.get("/weather/batch", params={"cities": ["Oslo,Rome", "atlantis"]})
+        second = client.post("/weather/batch", json={"cities": ["oslo", "Rome"]})
+
+    assert first.status_code == 200
+    body = first.json()
+    assert [item["city"] for item in body["items"]] == ["Oslo", "Rome"]
+    assert body["errors"] == [{"city": "atlantis", "detail": "City not found"}]
+
+    # второй запрос целиком из кэша
+    assert second.status_code == 200
+    assert len(second.json()["items"]) == 2
+    # в API уходит канонический place_id
+    assert sorted(calls) == ["atlantis", "oslo", "rome"]
+
+
+@pytest.mark.asyncio
+async def test_weather_batch_uses_one_cache_read_and_one_write(fake_redis, monkeypatch):
+    pipelines = []
+    execute = FakePipeline.execute
+
+    async def recording_execute(self):
+        pipelines.append([(name, args[0]) for name, args, _ in self.commands])
+        return await execute(self)
+
+    monkeypatch.setattr(FakePipeline, "execute", recording_execute)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(weather_success_handler)) as client:
+        results = await get_weather_many(["Oslo", "Rome", "oslo"], client)
+        await flush_writes()
+
+    assert all(isinstance(r, dict) for r in results.values())
+    reads = [p for p in pipelines if any(name == "mget" for name, _ in p)]
+    writes = [p for p in pipelines if any(name == "set" for name, _ in p)]
+    assert len(reads) == 1
+    assert len(writes) == 1
+    written = sorted(key for name, key in writes[0] if name == "set")
+    assert written == sorted([
+        *(f"weather:{city}:{section}" for city in ("oslo", "rome") for section in ("current", "daily", "hourly")),
+        *(f"forecast:{city}:{section}" for city in ("oslo", "rome") for section in ("daily", "hourly")),
+    ])
+
+
+@pytest.mark.asyncio
+async def test_weather_batch_concurrency_is_per_city(fake_redis, monkeypatch):
+    # два слота — два города грузятся одновременно, сколько бы секций ни было
+    monkeypatch.setattr(settings, "weather_batch_concurrency", 2)
+    monkeypatch.setattr(settings, "weather_batch_timeout", 1.0)
+    arrived = []
+    both = asyncio.Event()
+
+    async def handler(request: httpx.Request):
+        arrived.append(request.url.params["place_id"])
+        if len(arrived) == 2:
+            both.set()
+        await both.wait()
+        return weather_success_handler(request)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        results = await get_weather_many(["Oslo", "Rome", "Paris"], client)
+
+    assert all(isinstance(r, dict) for r in results.values())
+    assert sorted(arrived) == ["oslo", "paris", "rome"]
+
+
+@pytest.mark.asyncio
+async def test_weather_batch_timed_out_load_is_still_cached(fake_redis, monkeypatch):
+    monkeypatch.setattr(settings, "weather_batch_timeout", 0.05)
+    release = asyncio.Event()
+    calls = []
+
+    async def handler(request: httpx.Request):
+        calls.append(request.url.params["place_id"])
+        await release.wait()
+        return weather_success_handler(request)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        first = await get_weather_many(["Oslo"], client)
+        assert isinstance(first["Oslo"], asyncio.TimeoutError)
+
+        # пакет перестал ждать, но оплаченный запрос доходит до конца и попадает в кэш
+        release.set()
+        await asyncio.gather(*refresh._background)
+        await flush_writes()
+        second = await get_weather_many(["Oslo"], client)
+
+    assert second["Oslo"]["temperature"] == 18
+    assert calls == ["oslo"]
+    assert "forecast:oslo:hourly" in fake_redis.store
+
+
+def test_weather_batch_limits_city_count(monkeypatch):
+    monkeypatch.setattr(settings, "weather_batch_max_cities", 2)
+
+    with make_client() as client:
+        response = client.get("/weather/batch", params={"cities": "a,b,c"})
+
+    assert response.status_code == 422
+
+
+def test_metrics_endpoint_reports_routes_cache_and_upstreams():
+    with make_client() as client:
+        client.get("/weather", params={"city": "oslo"})
+        client.get("/weather", params={"city": "oslo"})
+        body = client.get("/metrics").text
+
+    assert 'http_request_duration_seconds_count{route="/weather",method="GET",status="200"}' in body
+    assert 'cache_requests_total{keyspace="weather",tier="l1",result="hit"}' in body
+    assert 'upstream_request_duration_seconds_bucket{upstream="weather",outcome="ok",le="+Inf"}' in body
+    assert "# TYPE http_requests_in_flight gauge" in body
+
+
+def test_weather_hit_is_served_from_stored_response_bytes(fake_redis, monkeypatch):
+    with make_client() as client:
+        first = client.get("/weather", params={"city": "Oslo"})
+
+        async def must_not_run(*args):
+            raise AssertionError("cached body should short-circuit the service")
+
+        monkeypatch.setattr(routes, "get_weather", must_not_run)
+        second = client.get("/weather", params={"city": "oslo"})
+
+    assert second.status_code == 200
+    assert second.content == first.content
+    assert second.headers["content-type"] == "application/json"
+
+
+def test_weather_sections_fetch_and_cache_only_what_is_needed(fake_redis):
+    requested = []
+
+    def handler(request: httpx.Request):
+        requested.append(request.url.params["sections"])
+        return weather_success_handler(request)
+
+    with make_client(handler) as client:
+        current = client.get("/weather", params={"city": "Oslo", "sections": "current"})
+        full = client.get("/weather", params={"city": "Oslo"})
+        bad = client.get("/weather", params={"city": "Oslo", "sections": "minutely"})
+
+    assert current.status_code == 200
+    assert current.json()["temperature"] == 18
+    assert "hourly" not in current.json() and "temp_min" not in current.json()
+    assert full.json()["summary_tomorrow"] == "Tomorrow"
+    # во втором запросе current уже в кэше — догружаются только прогнозы
+    assert requested == ["current", "daily,hourly"]
+    assert bad.status_code == 422
+
+
+def test_etag_and_cache_control_allow_conditional_requests(fake_redis):
+    with make_client() as client:
+        first = client.get("/weather", params={"city": "Oslo"})
+        etag = first.headers["etag"]
+        max_age = int(first.headers["cache-control"].split("max-age=")[1])
+
+        cached = client.get("/weather", params={"city": "Oslo"}, headers={"If-None-Match": etag})
+        other = client.get("/weather", params={"city": "Oslo"}, headers={"If-None-Match": '"other"'})
+
+    assert 0 < max_age <= settings.cache_ttl_weather_current
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["etag"] == etag
+    assert other.status_code == 200
+
+
+def test_large_responses_are_compressed(monkeypatch):
+    monkeypatch.setattr(settings, "compression_min_size", 100)
+
+    with make_client() as client:
+        response = client.get("/weather", params={"city": "Oslo"}, headers={"Accept-Encoding": "gzip"})
+        etag = response.headers["etag"]
+        again = client.get(
+            "/weather", params={"city": "Oslo"},
+            headers={"Accept-Encoding": "gzip", "If-None-Match": etag},
+        )
+        plain = client.get("/weather", params={"city": "Oslo"}, headers={"Accept-Encoding": "identity"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert etag.endswith('-gzip"')
+    assert response.json()["city"] == "Oslo"
+    assert again.status_code == 304
+    assert "content-encoding" not in plain.headers
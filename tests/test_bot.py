@@ -0,0 +1,61 @@
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import httpx
+import pytest
+
+from src import bot
+from tests.test_validation import weather_success_handler
+
+
+def fake_message(text: str):
+    return SimpleNamespace(text=text, from_user=SimpleNamespace(id=1), reply=AsyncMock(), answer=AsyncMock())
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.params["sections"])
+        return weather_success_handler(request)
+
+    monkeypatch.setattr(bot, "http_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_weather_buttons_are_answered_from_cache(fake_redis, upstream):
+    msg = fake_message("/weather Oslo")
+    await bot.weather_cmd(msg)
+    assert "18°C, Rainy" in msg.reply.call_args.args[0]
+
+    for action in ("weather_now", "weather_today", "weather_tomorrow"):
+        callback = SimpleNamespace(data=f"{action}|Oslo", answer=AsyncMock(), message=fake_message(""))
+        await bot.handle_weather_callback(callback)
+        callback.answer.assert_awaited_once()
+        assert callback.message.answer.await_count == 1
+
+    assert callback.message.answer.call_args.args[0] == "Прогноз на завтра: Tomorrow, 12…22°C"
+    assert upstream == ["current,daily,hourly"]
+
+
+@pytest.mark.asyncio
+async def test_callback_without_cache_fetches_only_needed_section(fake_redis, upstream):
+    callback = SimpleNamespace(data="weather_now|Oslo", answer=AsyncMock(), message=fake_message(""))
+    await bot.handle_weather_callback(callback)
+
+    assert callback.message.answer.call_args.args[0] == "Погода сейчас: Rainy, 18°C"
+    assert upstream == ["current"]
+
+
+@pytest.mark.asyncio
+async def test_convert_command_replies_with_amount(monkeypatch):
+    async def convert(from_cur, to_cur, amount, client):
+        return {"converted": 92.5}
+
+    monkeypatch.setattr(bot, "convert_currency", convert)
+    msg = fake_message("/convert 100 usd eur")
+    await bot.conver_cmd(msg)
+
+    msg.reply.assert_awaited_once_with("100.0 USD = 92.50 EUR")
@@ -0,0 +1,264 @@
+import asyncio
+import time
+from decimal import Decimal
+
+import pytest
+
+from src.core.config import settings
+from src.core.metrics import CACHE_REQUESTS
+from src.utils import codec, refresh, utils
+from src.utils.refresh import cached_fetch
+from src.utils.utils import LocalCache, flush_writes, get_cache, set_cache, local_cache
+
+
+def test_local_cache_evicts_least_recently_used():
+    cache = LocalCache(max_entries=2, max_bytes=1000)
+    cache.set("a", 1, ttl=60, size=10)
+    cache.set("b", 2, ttl=60, size=10)
+    cache.get("a")
+    cache.set("c", 3, ttl=60, size=10)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_local_cache_respects_byte_budget_and_ttl():
+    cache = LocalCache(max_entries=100, max_bytes=25)
+    cache.set("a", 1, ttl=60, size=10)
+    cache.set("b", 2, ttl=60, size=10)
+    cache.set("c", 3, ttl=60, size=10)
+
+    assert len(cache) == 2
+    assert cache.size_bytes == 20
+
+    cache.set("d", 4, ttl=0.0, size=1)
+    assert cache.get("d") is None
+
+
+@pytest.mark.asyncio
+async def test_l1_serves_hits_without_redis(fake_redis):
+    await set_cache("weather:oslo", {"city": "oslo"}, ttl=60)
+    hits = CACHE_REQUESTS.labels("weather", "l1", "hit")
+    hits_before = hits.value
+
+    # значение пропало из Redis, но ещё живо в L1
+    fake_redis.store.clear()
+    assert await get_cache("weather:oslo") == {"city": "oslo"}
+    assert hits.value == hits_before + 1
+
+
+@pytest.mark.asyncio
+async def test_l2_hit_fills_l1_with_remaining_ttl(fake_redis):
+    await fake_redis.set("weather:rome", '{"city": "rome"}', ex=30)
+
+    assert await get_cache("weather:rome") == {"city": "rome"}
+    _, expires_at, _ = local_cache._data["weather:rome"]
+    assert expires_at - utils.time.monotonic() <= 30
+
+
+@pytest.mark.asyncio
+async def test_set_cache_publishes_invalidation(fake_redis, monkeypatch):
+    monkeypatch.setattr(settings, "l1_invalidation", True)
+
+    await set_cache("currency:rates:USD", {"base": "USD", "rates": {}}, ttl=60)
+    await utils.flush_writes()
+
+    assert fake_redis.published == [
+        (utils.INVALIDATION_CHANNEL, f"{utils.NODE_ID} currency:rates:USD")
+    ]
+
+
+# =========================
+# REDIS HEALTH
+# =========================
+
+class DownRedis:
+    """Redis, до которого не достучаться: каждый вызов — ошибка связи."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def pipeline(self, transaction=True):
+        self.calls += 1
+        raise utils.redis.ConnectionError("connection refused")
+
+
+@pytest.mark.asyncio
+async def test_exhausted_pool_does_not_mark_redis_down(monkeypatch):
+    pool = utils.redis.BlockingConnectionPool(max_connections=1, timeout=0.01)
+    # единственное соединение пула занято
+    pool.get_available_connection()
+    monkeypatch.setattr(utils, "_redis_client", utils.redis.Redis(connection_pool=pool))
+    monkeypatch.setattr(settings, "redis_breaker_threshold", 2)
+
+    for i in range(5):
+        assert await get_cache(f"weather:city{i}:current") is None
+        await set_cache(f"weather:city{i}:current", {"city": "oslo"}, ttl=60)
+    await flush_writes()
+
+    assert not utils.redis_health.is_down
+    assert utils.redis_health.failures == 0
+    assert utils.REDIS_POOL_EXHAUSTED.labels().value >= 10
+    # узнаётся по причине (таймаут ожидания пула), а не по тексту сообщения
+    assert not utils._pool_exhausted(utils.redis.ConnectionError("No connection available."))
+
+
+@pytest.mark.asyncio
+async def test_redis_marked_down_after_threshold(monkeypatch):
+    client = DownRedis()
+    monkeypatch.setattr(utils, "_redis_client", client)
+    monkeypatch.setattr(settings, "redis_breaker_threshold", 2)
+
+    for _ in range(5):
+        assert await get_cache("weather:oslo:current") is None
+
+    # после порога Redis пропускается без обращений
+    assert client.calls == 2
+    assert utils.redis_health.is_down
+
+
+@pytest.mark.asyncio
+async def test_fallback_serves_while_redis_down(monkeypatch):
+    monkeypatch.setattr(utils, "_redis_client", DownRedis())
+    monkeypatch.setattr(settings, "redis_breaker_threshold", 1)
+    monkeypatch.setattr(settings, "l1_enabled", False)
+
+    assert await get_cache("weather:oslo:current") is None
+    await set_cache("weather:oslo:current", {"city": "oslo"}, ttl=60)
+    await utils.flush_writes()
+
+    assert await get_cache("weather:oslo:current") == {"city": "oslo"}
+
+
+@pytest.mark.asyncio
+async def test_redis_back_after_cooldown(fake_redis, monkeypatch):
+    monkeypatch.setattr(settings, "redis_breaker_threshold", 1)
+    utils.redis_health.failure()
+    utils.fallback_cache.set("weather:oslo:current", {"city": "old"}, 60, 10)
+    await fake_redis.set("weather:oslo:current", '{"city": "oslo"}', ex=60)
+
+    utils.redis_health.down_until = utils.time.monotonic() - 1
+    assert await get_cache("weather:oslo:current") == {"city": "oslo"}
+    assert not utils.redis_health.is_down
+    assert len(utils.fallback_cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_set_cache_does_not_wait_for_redis(fake_redis):
+    release = asyncio.Event()
+    original = fake_redis.set
+
+    async def slow_set(*args, **kwargs):
+        await release.wait()
+        return await original(*args, **kwargs)
+
+    fake_redis.set = slow_set
+    await asyncio.wait_for(set_cache("weather:oslo:current", {"city": "oslo"}, ttl=60), 0.5)
+    assert "weather:oslo:current" not in fake_redis.store
+
+    release.set()
+    await utils.flush_writes()
+    assert "weather:oslo:current" in fake_redis.store
+
+
+# =========================
+# STALE-WHILE-REVALIDATE
+# =========================
+
+async def put_entry(key, value, soft_in, hard_in):
+    now = refresh.time.time()
+    entry = {"value": value, "soft": now + soft_in, "hard": now + hard_in}
+    await set_cache(key, entry, ttl=3600)
+    # устаревшая запись в L1 не кладётся — дожидаемся записи в Redis
+    await flush_writes()
+
+
+@pytest.mark.asyncio
+async def test_stale_value_served_and_refreshed_in_background(fake_redis):
+    await put_entry("weather:oslo", "old", soft_in=-1, hard_in=60)
+    loads = []
+
+    async def loader():
+        loads.append(1)
+        return "new"
+
+    assert await cached_fetch("weather:oslo", loader, ttl=60) == "old"
+    await asyncio.gather(*refresh._background)
+
+    assert loads == [1]
+    assert await cached_fetch("weather:oslo", loader, ttl=60) == "new"
+
+
+@pytest.mark.asyncio
+async def test_soft_stale_l1_entry_rereads_redis_before_loading(fake_redis):
+    await put_entry("weather:oslo", "old", soft_in=0.05, hard_in=60)
+    assert local_cache.get("weather:oslo")["value"] == "old"
+    await asyncio.sleep(0.1)
+    # ключ тем временем обновил другой воркер
+    now = time.time()
+    fresh = {"value": "new", "soft": now + 60, "hard": now + 120}
+    await fake_redis.set("weather:oslo", codec.encode(fresh), ex=180)
+    loads = []
+
+    async def loader():
+        loads.append(1)
+        return "newest"
+
+    assert await cached_fetch("weather:oslo", loader, ttl=60) == "new"
+    assert loads == []
+    assert not refresh._background
+
+
+@pytest.mark.asyncio
+async def test_hard_expired_value_survives_upstream_error_within_grace(fake_redis):
+    await put_entry("weather:oslo", "old", soft_in=-20, hard_in=-10)
+
+    async def failing_loader():
+        raise ValueError("Weather API error")
+
+    assert await cached_fetch("weather:oslo", failing_loader, ttl=60) == "old"
+
+
+@pytest.mark.asyncio
+async def test_upstream_error_after_grace_is_raised(fake_redis, monkeypatch):
+    monkeypatch.setattr(settings, "cache_stale_grace", 5)
+    await put_entry("weather:oslo", "old", soft_in=-20, hard_in=-10)
+
+    async def failing_loader():
+        raise ValueError("Weather API error")
+
+    with pytest.raises(ValueError):
+        await cached_fetch("weather:oslo", failing_loader, ttl=60)
+
+
+def test_legacy_weather_ttl_is_default_for_sections(caplog):
+    legacy = settings.__class__(_env_file=None, cache_ttl_weather=900, cache_ttl_weather_daily=5)
+
+    assert (legacy.cache_ttl_weather_current, legacy.cache_ttl_weather_hourly) == (900, 900)
+    assert legacy.cache_ttl_weather_daily == 5
+    assert "CACHE_TTL_WEATHER is deprecated" in caplog.text
+
+
+# =========================
+# CODEC
+# =========================
+
+@pytest.mark.parametrize("name", ["json", "msgpack"])
+def test_codec_round_trip_keeps_decimal_and_compresses(monkeypatch, name):
+    monkeypatch.setattr(settings, "cache_codec", name)
+    monkeypatch.setattr(settings, "cache_compress_min_bytes", 64)
+    value = {"base": "USD", "rates": {f"C{i:02d}": Decimal("0.8512") for i in range(50)}}
+
+    encoded = codec.encode(value)
+
+    assert encoded[1:2] == codec.ZLIB
+    decoded = codec.decode(encoded)
+    assert Decimal(decoded["rates"]["C07"]) == Decimal("0.8512")
+    if name == "msgpack":
+        assert decoded == value
+
+
+def test_codec_reads_legacy_json_and_raw_bytes():
+    assert codec.decode(b'{"city": "oslo"}') == {"city": "oslo"}
+    assert codec.decode(codec.encode_bytes(b'{"a":1}')) == b'{"a":1}'
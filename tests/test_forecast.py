@@ -0,0 +1,95 @@
+import json
+
+import httpx
+import numpy as np
+
+from src.services.forecast import ForecastSeries
+from tests.test_api import make_client
+from tests.test_validation import weather_success_handler
+
+HOURS = 72
+
+
+def payload() -> dict:
+    return {
+        "current": weather_success_handler(None).json()["current"],
+        "hourly": {"data": [
+            {
+                "date": f"2024-01-{1 + h // 24:02d}T{h % 24:02d}:00:00",
+                "summary": "Rain" if h % 2 else "Cloudy",
+                "icon": 3,
+                "temperature": 15 + h * 0.1,
+                "precipitation": {"total": None if h == 10 else 0.5},
+            }
+            for h in range(HOURS)
+        ]},
+        "daily": {"data": [
+            {
+                "day": f"2024-01-{d + 1:02d}",
+                "summary": "Cloudy",
+                "icon": 4,
+                "all_day": {"temperature_min": d, "temperature_max": 10 + d, "precipitation": {"total": 1.5}},
+            }
+            for d in range(7)
+        ]},
+    }
+
+
+def test_series_roundtrip_is_compact():
+    data = payload()
+    series = ForecastSeries.from_payload("hourly", data)
+    packed = series.pack()
+    restored = ForecastSeries.unpack(packed)
+
+    assert len(restored) == HOURS
+    assert restored.summaries == ["Cloudy", "Rain"]
+    assert np.array_equal(restored.columns["time"], series.columns["time"])
+    assert len(packed) < len(json.dumps(data["hourly"]["data"])) / 5
+
+    columns = restored.to_columns(restored.window(restored.columns["time"][9], 3))
+    assert columns["time"] == [1704067200 + 3600 * h for h in (9, 10, 11)]
+    assert columns["temperature"] == [15.9, 16.0, 16.1]
+    assert columns["precipitation"] == [0.5, None, 0.5]
+    assert columns["summary"] == ["Rain", "Cloudy", "Rain"]
+
+
+def test_forecast_endpoints_slice_one_upstream_payload(fake_redis):
+    calls = []
+
+    def handler(request: httpx.Request):
+        calls.append(request.url.params["sections"])
+        return httpx.Response(200, json=payload())
+
+    with make_client(handler) as client:
+        assert client.get("/weather", params={"city": "oslo"}).status_code == 200
+        hourly = client.get("/weather/hourly", params={"city": "Oslo", "from": "2024-01-02T00:00:00", "limit": 30})
+        daily = client.get("/weather/daily", params={"city": "oslo", "from": "2024-01-03", "limit": 2})
+
+    assert calls == ["current,daily,hourly"]
+    body = hourly.json()
+    assert len(body["time"]) == 30
+    assert body["time"][0] == 1704153600
+    assert daily.json()["temp_max"] == [12.0, 13.0]
+
+
+def test_forecast_cold_fetches_only_its_section(fake_redis):
+    calls = []
+
+    def handler(request: httpx.Request):
+        calls.append(request.url.params["sections"])
+        return httpx.Response(200, json=payload())
+
+    with make_client(handler) as client:
+        first = client.get("/weather/hourly", params={"city": "oslo", "from": "2024-01-01T00:00:00"})
+        second = client.get("/weather/hourly", params={"city": "oslo", "from": "2024-01-01T00:00:00"})
+
+    assert calls == ["hourly"]
+    assert first.json() == second.json()
+    assert len(first.json()["time"]) == 24
+
+
+def test_forecast_unknown_city(fake_redis):
+    with make_client(lambda request: httpx.Response(404, json={})) as client:
+        response = client.get("/weather/daily", params={"city": "atlantis"})
+
+    assert response.status_code == 404
@@ -0,0 +1,136 @@
+import httpx
+import pytest
+
+from src.services.places import PlaceIndex, normalize, resolve_place
+from src.services.weather_service import CityNotFound, get_weather, get_weather_many, weather_key
+from tests.test_api import make_client
+from tests.test_validation import weather_success_handler
+
+PLACES = [
+    {"place_id": "moscow", "name": "Moscow", "country": "RU", "aliases": ["Москва", "msk"]},
+    {"place_id": "london", "name": "London", "country": "GB", "aliases": ["Лондон"]},
+    {"place_id": "los-angeles", "name": "Los Angeles", "country": "US", "aliases": ["la"]},
+    {"place_id": "sao-paulo", "name": "São Paulo", "country": "BR", "aliases": []},
+]
+
+
+def test_normalize_transliterates_and_strips_diacritics():
+    assert normalize("  Москва ") == "moskva"
+    assert normalize("São Paulo") == "sao-paulo"
+    assert normalize("Rostov-on-Don") == normalize("rostov on  don") == "rostov-on-don"
+
+
+def test_lookup_by_alias_and_typo():
+    index = PlaceIndex(PLACES)
+
+    assert index.lookup("МОСКВА").place_id == "moscow"
+    assert index.lookup("moskva").place_id == "moscow"
+    assert index.lookup("Sao Paulo").place_id == "sao-paulo"
+    # опечатки исправляются только в подсказках, не в ключе кэша
+    assert index.lookup("Londn") is None
+    assert [p.place_id for p in index.suggest("Londn")] == ["london"]
+    # в коротких названиях опечатки не угадываются
+    assert index.suggest("Lndn") == []
+    assert index.lookup("Atlantis") is None
+
+
+def test_suggest_by_prefix_in_list_order():
+    index = PlaceIndex(PLACES)
+
+    assert [p.place_id for p in index.suggest("lo")] == ["london", "los-angeles"]
+    assert [p.place_id for p in index.suggest("лон")] == ["london"]
+    assert [p.place_id for p in index.suggest("lo", limit=1)] == ["london"]
+    assert index.suggest("  ") == []
+
+
+def test_bundled_index_resolves_aliases():
+    assert resolve_place("Москва") == resolve_place("Moscow") == "moscow"
+    assert resolve_place("Нью-Йорк") == "new-york-city"
+    # городов вне справочника API всё равно получает, в нормализованном виде
+    assert resolve_place("Some Town") == "some-town"
+    # города вне справочника не подменяются похожими из него
+    assert resolve_place("Tomsk") == "tomsk"
+    assert resolve_place("Pinsk") == "pinsk"
+    # без латиницы и кириллицы — не пустой ключ, а сам ввод
+    assert resolve_place("北京") == "北京"
+    assert resolve_place(" Αθήνα ") == "αθήνα"
+
+
+@pytest.mark.asyncio
+async def test_non_latin_cities_do_not_share_cache(fake_redis):
+    calls = []
+
+    def handler(request: httpx.Request):
+        calls.append(request.url.params["place_id"])
+        return weather_success_handler(request)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        await get_weather("北京", client)
+        await get_weather("東京", client)
+
+    assert calls == ["北京", "東京"]
+
+
+@pytest.mark.asyncio
+async def test_aliases_share_cache(fake_redis):
+    calls = []
+
+    def handler(request: httpx.Request):
+        calls.append(request.url.params["place_id"])
+        return weather_success_handler(request)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        await get_weather("Москва", client)
+        result = await get_weather("moscow", client)
+
+    assert calls == ["moscow"]
+    assert result["city"] == "moscow"
+    assert weather_key("Moskva", "current") == "weather:moscow:current"
+
+
+@pytest.mark.asyncio
+async def test_city_not_found_is_cached(fake_redis):
+    calls = []
+
+    def handler(request: httpx.Request):
+        calls.append(request.url.params["place_id"])
+        return httpx.Response(404, json={"detail": "Invalid place_id"})
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        for _ in range(3):
+            with pytest.raises(CityNotFound):
+                await get_weather("Atlantis", client)
+        results = await get_weather_many(["atlantis", "ATLANTIS"], client)
+
+    assert calls == ["atlantis"]
+    assert all(isinstance(r, CityNotFound) for r in results.values())
+
+
+@pytest.mark.asyncio
+async def test_upstream_errors_are_not_negative_cached(fake_redis):
+    calls = []
+
+    def handler(request: httpx.Request):
+        calls.append(request)
+        return httpx.Response(500, json={})
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        for _ in range(2):
+            with pytest.raises(Exception) as exc:
+                await get_weather("Atlantis", client)
+            assert not isinstance(exc.value, CityNotFound)
+
+    assert len(calls) >= 2
+
+
+def test_suggest_route_is_local():
+    def handler(request: httpx.Request):
+        raise AssertionError("suggest must not call external APIs")
+
+    with make_client(handler) as client:
+        response = client.get("/weather/suggest", params={"q": "мос"})
+        empty = client.get("/weather/suggest", params={"q": "zzzzzz"})
+
+    assert response.status_code == 200
+    assert response.json()["items"][0] == {"place_id": "moscow", "name": "Moscow", "country": "RU"}
+    assert empty.json() == {"items": []}
@@ -0,0 +1,90 @@
+import httpx
+import pytest
+
+from src.core.config import settings
+from src.integrations import policy
+from src.integrations.policy import LatencyTracker, RetryBudget, UpstreamUnavailable
+from src.services.weather_service import get_weather, weather_key
+from src.utils import refresh
+from src.utils.utils import flush_writes, set_cache
+from tests.test_validation import weather_success_handler
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(settings, "retry_backoff_base", 0)
+
+
+def test_adaptive_timeout_follows_observed_latency(monkeypatch):
+    monkeypatch.setattr(settings, "adaptive_timeout_min_samples", 5)
+    monkeypatch.setattr(settings, "adaptive_timeout_min", 0.5)
+    tracker = LatencyTracker(max_timeout=10.0)
+
+    assert tracker.timeout() == 10.0
+    for _ in range(10):
+        tracker.observe(0.4)
+    assert tracker.timeout() == pytest.approx(0.8)
+
+
+def test_retry_budget_limits_retries():
+    budget = RetryBudget(ratio=0.5, max_tokens=1)
+    assert budget.withdraw()
+    assert not budget.withdraw()
+    budget.deposit()
+    budget.deposit()
+    assert budget.withdraw()
+
+
+@pytest.mark.asyncio
+async def test_transient_errors_are_retried():
+    responses = iter([httpx.Response(503), weather_success_handler(None)])
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return next(responses)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        result = await get_weather("oslo", client)
+
+    assert result["temperature"] == 18
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_open_breaker_serves_last_cached_value(fake_redis, monkeypatch):
+    monkeypatch.setattr(settings, "breaker_failure_threshold", 2)
+    monkeypatch.setattr(settings, "retry_max_attempts", 0)
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        for city in ("a", "b"):
+            with pytest.raises(ValueError):
+                await get_weather(city, client)
+
+        # запись старше hard + grace, но breaker открыт — отдаём её без запроса
+        now = refresh.time.time()
+        old = {"value": {"temperature": 1}, "soft": now - 9000, "hard": now - 8000}
+        await set_cache(weather_key("oslo", "current"), old, ttl=60)
+        await flush_writes()
+        assert await get_weather("oslo", client, ["current"]) == {"city": "oslo", "temperature": 1}
+
+        with pytest.raises(UpstreamUnavailable):
+            await get_weather("rome", client)
+
+    assert len(calls) == 2
+    assert "breaker:weather" in fake_redis.store
+
+
+@pytest.mark.asyncio
+async def test_breaker_state_is_shared_through_redis(fake_redis):
+    await fake_redis.set("breaker:weather", "open", px=30000)
+
+    with pytest.raises(UpstreamUnavailable) as info:
+        await policy.get_policy("weather").breaker.before_call()
+
+    assert 0 < info.value.retry_after <= 30
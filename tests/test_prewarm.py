@@ -0,0 +1,80 @@
+import httpx
+import pytest
+
+from src.core.config import settings
+from src.services import prewarm
+from src.services.weather_service import weather_key
+from src.utils.popularity import DecayedTopK
+from src.utils.refresh import store_cached
+from tests.test_validation import weather_success_handler
+
+
+def test_decayed_top_k_ranks_recent_hits_higher():
+    tracker = DecayedTopK(k=10, half_life=10.0)
+    for _ in range(12):
+        tracker.record("weather:old", now=0.0)
+    for _ in range(5):
+        tracker.record("weather:new", now=30.0)
+    tracker.record("weather:rare", now=30.0)
+
+    ranked = [key for key, _ in tracker.top(3, now=30.0)]
+    assert ranked == ["weather:new", "weather:old", "weather:rare"]
+
+
+@pytest.fixture
+def trackers(monkeypatch):
+    weather = DecayedTopK(k=10)
+    monkeypatch.setattr(prewarm, "weather_popularity", weather)
+    monkeypatch.setattr(prewarm, "currency_popularity", DecayedTopK(k=10))
+    return weather
+
+
+@pytest.mark.asyncio
+async def test_prewarm_refreshes_only_keys_close_to_expiry(fake_redis, trackers):
+    for city in ("oslo", "rome", "oslo"):
+        trackers.record(weather_key(city, "current"))
+    await store_cached(weather_key("rome", "current"), {"temperature": 1}, ttl=3600)
+
+    calls = []
+
+    def handler(request):
+        calls.append((request.url.params["place_id"], request.url.params["sections"]))
+        return weather_success_handler(request)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        assert await prewarm.prewarm_once(client) == 1
+
+    # прогревается только нужная секция — запрос без daily и hourly
+    assert calls == [("oslo", "current")]
+
+
+@pytest.mark.asyncio
+async def test_prewarm_fetches_stale_sections_of_a_city_in_one_request(fake_redis, trackers):
+    for section in ("current", "daily", "hourly"):
+        trackers.record(weather_key("oslo", section))
+    trackers.record(weather_key("rome", "current"))
+    await store_cached(weather_key("oslo", "hourly"), {"hourly": []}, ttl=3600)
+
+    calls = []
+
+    def handler(request):
+        calls.append((request.url.params["place_id"], set(request.url.params["sections"].split(","))))
+        return weather_success_handler(request)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        assert await prewarm.prewarm_once(client) == 3
+
+    # одна загрузка на город и только за устаревшими секциями
+    assert sorted(calls) == [("oslo", {"current", "daily"}), ("rome", {"current"})]
+
+
+@pytest.mark.asyncio
+async def test_prewarm_stops_at_quota_share(fake_redis, trackers, monkeypatch):
+    monkeypatch.setattr(settings, "weather_daily_quota", 4)
+    monkeypatch.setattr(settings, "prewarm_quota_share", 0.5)
+    for city in ("a", "b", "c", "d"):
+        trackers.record(weather_key(city, "current"))
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(weather_success_handler)) as client:
+        assert await prewarm.prewarm_once(client) == 2
+        assert await prewarm.prewarm_once(client) == 0
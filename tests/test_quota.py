@@ -0,0 +1,131 @@
+import httpx
+import pytest
+
+from src.core.config import settings
+from src.integrations import quota
+from src.integrations.quota import QuotaExceeded, acquire_api_key, calls_today
+from src.services.weather_service import get_weather, weather_key
+from src.utils import refresh
+from src.utils.utils import flush_writes
+from tests.test_api import make_client
+from tests.test_validation import weather_success_handler
+
+
+@pytest.mark.asyncio
+async def test_minute_quota_rejects_without_request(monkeypatch):
+    monkeypatch.setattr(settings, "weather_minute_quota", 2)
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return weather_success_handler(request)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        await get_weather("oslo", client)
+        await get_weather("rome", client)
+        with pytest.raises(QuotaExceeded) as exc:
+            await get_weather("riga", client)
+
+    assert len(calls) == 2
+    assert exc.value.reason == "rate limit"
+    assert await calls_today("weather") == 2
+
+
+@pytest.mark.asyncio
+async def test_load_is_spread_across_keys(monkeypatch):
+    monkeypatch.setattr(settings, "weather_api_keys", "k1,k2")
+    monkeypatch.setattr(settings, "weather_daily_quota", 2)
+
+    used = [await acquire_api_key("weather") for _ in range(4)]
+
+    assert sorted(used) == ["k1", "k1", "k2", "k2"]
+    with pytest.raises(QuotaExceeded) as exc:
+        await acquire_api_key("weather")
+    assert exc.value.reason == "daily quota exhausted"
+
+
+@pytest.mark.asyncio
+async def test_exhausted_quota_serves_stale_value(fake_redis, monkeypatch):
+    monkeypatch.setattr(settings, "weather_daily_quota", 1)
+    await refresh.store_cached(weather_key("oslo", "current"), {"temperature": 1}, ttl=-1)
+    await flush_writes()
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(weather_success_handler)) as client:
+        await quota.acquire_api_key("weather")
+        result = await get_weather("oslo", client, ["current"])
+
+    assert result["temperature"] == 1
+
+
+def test_route_returns_429_with_retry_after(monkeypatch):
+    monkeypatch.setattr(settings, "weather_daily_quota", 0)
+
+    with make_client(weather_success_handler) as client:
+        response = client.get("/weather", params={"city": "oslo"})
+
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) > 0
+
+
+# =========================
+# LUA TOKEN BUCKET (через Redis)
+# =========================
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_700_000_000.0]
+    monkeypatch.setattr(quota.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.mark.asyncio
+async def test_script_enforces_minute_limit_and_refills(fake_redis, clock, monkeypatch):
+    monkeypatch.setattr(settings, "weather_minute_quota", 2)
+
+    await acquire_api_key("weather")
+    await acquire_api_key("weather")
+    with pytest.raises(QuotaExceeded) as exc:
+        await acquire_api_key("weather")
+    assert exc.value.reason == "rate limit"
+
+    # 2 запроса в минуту — за 30 секунд возвращается один токен
+    clock[0] += 30
+    await acquire_api_key("weather")
+    with pytest.raises(QuotaExceeded):
+        await acquire_api_key("weather")
+
+    # учёт шёл в Redis, локальный запасной вариант не понадобился
+    assert quota._local == {}
+    bucket = next(v for k, (v, _) in fake_redis.store.items() if k.endswith(":bucket"))
+    assert float(bucket["tokens"]) < 1
+    assert await calls_today("weather") == 3
+
+
+@pytest.mark.asyncio
+async def test_script_enforces_daily_limit(fake_redis, clock, monkeypatch):
+    monkeypatch.setattr(settings, "weather_minute_quota", 100)
+    monkeypatch.setattr(settings, "weather_daily_quota", 3)
+
+    for _ in range(3):
+        await acquire_api_key("weather")
+    with pytest.raises(QuotaExceeded) as exc:
+        await acquire_api_key("weather")
+
+    assert exc.value.reason == "daily quota exhausted"
+    assert quota._local == {}
+    day_key = next(k for k in fake_redis.store if k.startswith("quota:weather:") and not k.endswith(":bucket"))
+    assert fake_redis.store[day_key][0] == b"3"
+    # счётчик суток живёт до полуночи UTC (+ час запаса)
+    assert 0 < await fake_redis.pttl(day_key) <= (quota._seconds_to_midnight() + 3600) * 1000
+
+
+@pytest.mark.asyncio
+async def test_quota_is_shared_between_workers(fake_redis, clock, monkeypatch):
+    monkeypatch.setattr(settings, "weather_minute_quota", 2)
+
+    await acquire_api_key("weather")
+    # другой процесс: своей памяти о квоте нет, но Redis общий
+    quota.reset_local_quota()
+    await acquire_api_key("weather")
+    with pytest.raises(QuotaExceeded):
+        await acquire_api_key("weather")
@@ -0,0 +1,90 @@
+import time
+
+import numpy as np
+import pytest
+
+from src.core.config import settings
+from src.services import rate_history
+from src.services.rate_history import RateHistory, record_rate_table
+from tests.test_api import make_client
+
+
+def test_append_and_range(rate_history_dir):
+    store = RateHistory(rate_history_dir)
+    assert store.append(1000, {"USD": 1.0, "EUR": 0.9})
+    assert not store.append(1010, {"USD": 1.0, "EUR": 0.8})  # чаще min_interval
+    assert store.append(1100, {"USD": 1.0, "EUR": 0.8, "GBP": 0.5})
+
+    times, rates = store.rates("USD", "EUR", 0, 2000)
+    assert times.tolist() == [1000, 1100]
+    assert rates.tolist() == pytest.approx([0.9, 0.8])
+
+    # валюта появилась позже — в старых снимках её курса нет
+    _, gbp = store.rates("EUR", "GBP", 0, 2000)
+    assert np.isnan(gbp[0]) and gbp[1] == pytest.approx(0.625)
+
+
+def test_step_uses_last_snapshot_before_each_point(rate_history_dir):
+    store = RateHistory(rate_history_dir)
+    for i in range(5):
+        store.append(1000 + i * 60, {"USD": 1.0, "EUR": 1.0 + i})
+
+    times, rates = store.rates("USD", "EUR", 900, 1240, step=120)
+
+    assert times.tolist() == [900, 1020, 1140]
+    assert np.isnan(rates[0])
+    assert rates[1:].tolist() == [1.0, 3.0]
+
+
+def test_year_of_minute_snapshots_scans_fast(rate_history_dir):
+    store = RateHistory(rate_history_dir)
+    n = 365 * 24 * 60
+    rate_history_dir.mkdir()
+    np.arange(n, dtype="<f8").tofile(rate_history_dir / "ts.f8")
+    np.ones(n, dtype="<f8").tofile(rate_history_dir / "USD.f8")
+    np.linspace(0.8, 1.0, n).astype("<f8").tofile(rate_history_dir / "EUR.f8")
+
+    start = time.perf_counter()
+    times, rates = store.rates("USD", "EUR", 0, n, step=3600)
+    elapsed = time.perf_counter() - start
+
+    assert len(times) == n // 3600 + 1
+    assert rates[-1] == pytest.approx(1.0)
+    assert elapsed < 0.05
+
+
+@pytest.mark.asyncio
+async def test_fetched_tables_are_recorded_relative_to_pivot(rate_history_dir):
+    await record_rate_table({"base": "EUR", "rates": {"EUR": 1, "USD": 2, "GBP": 1}}, ts=500)
+
+    store = rate_history.get_rate_history()
+    assert store.at(500, "USD")[1] == {"EUR": 0.5, "GBP": 0.5, "USD": 1.0}
+
+
+def test_history_endpoints(rate_history_dir, monkeypatch):
+    store = RateHistory(rate_history_dir)
+    store.append(1_700_000_000, {"USD": 1.0, "EUR": 0.5})
+    store.append(1_700_000_600, {"USD": 1.0, "EUR": 0.25})
+
+    def no_upstream(request):
+        raise AssertionError("history must not call the upstream API")
+
+    client = make_client(no_upstream)
+    response = client.get("/currency/history", params={
+        "from": "eur", "to": "usd", "start": 1_699_999_000, "end": 1_700_001_000, "amount": 10,
+    })
+    assert response.status_code == 200
+    assert response.json()["rates"] == [2.0, 4.0]
+    assert response.json()["converted_amount"] == [20.0, 40.0]
+
+    response = client.get("/currency/at", params={"ts": "2023-11-14T22:25:00Z", "to": "EUR"})
+    assert response.status_code == 200
+    assert response.json()["timestamp"] == 1_700_000_600
+    assert response.json()["rates"] == {"EUR": 0.25}
+
+    assert client.get("/currency/at", params={"ts": 0}).status_code == 404
+    assert client.get("/currency/history", params={"from": "USD", "to": "XXX"}).status_code == 404
+    monkeypatch.setattr(settings, "rate_history_max_points", 1)
+    assert client.get("/currency/history", params={
+        "from": "USD", "to": "EUR", "start": 1_699_999_000, "end": 1_700_001_000,
+    }).status_code == 422
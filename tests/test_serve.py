@@ -0,0 +1,38 @@
+import subprocess
+import sys
+
+from src import serve
+from src.core.config import settings
+from tests.test_api import make_client
+
+
+def test_workers_default_to_cpu_count(monkeypatch):
+    monkeypatch.setattr(settings, "web_workers", 0)
+    monkeypatch.setattr(serve.os, "cpu_count", lambda: 3)
+    assert serve.worker_count() == 3
+
+    monkeypatch.setattr(settings, "web_workers", 2)
+    assert serve.worker_count() == 2
+
+
+def test_loop_falls_back_without_uvloop(monkeypatch):
+    monkeypatch.setattr(serve, "find_spec", lambda name: None)
+    assert serve.loop_setup() == ("asyncio", "h11")
+
+
+def test_shutdown_closes_redis(fake_redis):
+    with make_client() as client:
+        assert client.get("/weather", params={"city": "oslo"}).status_code == 200
+        assert not fake_redis.closed
+
+    assert fake_redis.closed
+
+
+def test_app_and_bot_import_without_heavy_modules():
+    # numpy, aiogram и профайлер грузятся лениво — при первом использовании
+    script = (
+        "import sys, src.main, src.bot; "
+        "print(sorted(m for m in ('numpy', 'aiogram', 'src.core.profiler') if m in sys.modules))"
+    )
+    out = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True).stdout
+    assert out.strip() == "[]"
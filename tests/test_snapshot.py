@@ -0,0 +1,65 @@
+import time
+
+import pytest
+
+from src.core.config import settings
+from src.utils import snapshot, utils
+from src.utils.refresh import store_cached
+from src.utils.utils import get_cache, get_cache_many
+
+
+def test_snapshot_roundtrip_skips_expired(snapshot_path):
+    now = time.time()
+    snapshot.write_snapshot(snapshot_path, {
+        "weather:oslo:current": (b"payload", now + 60),
+        "weather:rome:current": (b"old", now - 1),
+    })
+
+    snap = snapshot.open_snapshot()
+    assert len(snap) == 1
+    payload, expires = snap.get("weather:oslo:current")
+    assert payload == b"payload" and expires == pytest.approx(now + 60)
+    assert snap.get("weather:rome:current") is None
+    snap.close()
+
+
+def test_unknown_format_is_ignored(snapshot_path):
+    snapshot_path.write_bytes(b"garbage" * 10)
+    assert snapshot.open_snapshot() is None
+
+
+@pytest.mark.asyncio
+async def test_fresh_worker_serves_from_snapshot(fake_redis, monkeypatch):
+    monkeypatch.setattr(settings, "l1_enabled", False)
+    await store_cached("weather:oslo:current", {"temperature": 5}, ttl=600)
+    await store_cached("currency:rates:USD", {"base": "USD", "rates": {}}, ttl=600)
+    await utils.flush_writes()
+    await fake_redis.set("http:weather:oslo:all", "body", ex=60)
+
+    assert await snapshot.dump() == 2
+
+    # новый воркер и пустой Redis
+    fake_redis.store.clear()
+    assert snapshot.load_snapshot() == 2
+
+    entry = await get_cache("weather:oslo:current")
+    assert entry["value"] == {"temperature": 5}
+    found = await get_cache_many(["currency:rates:USD", "weather:rome:current"])
+    assert list(found) == ["currency:rates:USD"]
+
+    # записи возвращаются в Redis для остальных воркеров
+    await utils.flush_writes()
+    assert "weather:oslo:current" in fake_redis.store
+    assert fake_redis.store["weather:oslo:current"][1] > time.monotonic() + 500
+
+
+def test_cli_dump_and_restore(fake_redis, snapshot_path, capsys):
+    fake_redis.store["weather:oslo:current"] = (b"payload", time.monotonic() + 60)
+
+    assert snapshot.main(["dump"]) == 0
+    assert snapshot.main(["info"]) == 0
+    assert "1 live keys" in capsys.readouterr().out
+
+    fake_redis.store.clear()
+    assert snapshot.main(["restore", "--path", str(snapshot_path)]) == 0
+    assert fake_redis.store["weather:oslo:current"][0] == b"payload"
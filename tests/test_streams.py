@@ -0,0 +1,98 @@
+import asyncio
+
+import httpx
+import pytest
+
+from src.core.config import settings
+from src.routes import routes
+from src.services.streams import StreamHub
+from tests.test_api import make_client
+
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(settings, "stream_poll_interval", 0.01)
+    monkeypatch.setattr(settings, "stream_pubsub", False)
+
+
+class Ticks:
+    """Опросы хаба по команде теста, а не по таймеру."""
+
+    def __init__(self):
+        self._tick = asyncio.Semaphore(0)
+        self._waiting = asyncio.Semaphore(0)
+
+    async def wait(self, topic):
+        self._waiting.release()
+        await self._tick.acquire()
+
+    async def ready(self):
+        await asyncio.wait_for(self._waiting.acquire(), 1)
+
+    async def step(self):
+        # один опрос: отпускаем цикл и ждём, пока он вернётся к ожиданию
+        self._tick.release()
+        await self.ready()
+
+
+@pytest.mark.asyncio
+async def test_hub_polls_once_per_topic_and_pushes_only_changes():
+    ticks = Ticks()
+    hub = StreamHub(wait=ticks.wait)
+    value = {"v": b"1"}
+    loads = []
+
+    async def load():
+        loads.append(1)
+        return value["v"]
+
+    async with hub.subscribe("t", load, b"1") as first, hub.subscribe("t", load, b"1") as second:
+        assert await first.get() == b"1" and await second.get() == b"1"
+        await ticks.ready()
+        assert loads == []
+
+        # подписчиков двое, а опрос один: загрузка на тик, без изменений — без рассылки
+        for _ in range(3):
+            await ticks.step()
+        assert len(loads) == 3
+        assert first.empty() and second.empty()
+
+        value["v"] = b"2"
+        await ticks.step()
+        assert len(loads) == 4
+        assert first.get_nowait() == b"2"
+        assert second.get_nowait() == b"2"
+
+    assert hub.topics == 0
+
+
+@pytest.mark.asyncio
+async def test_sse_stream_starts_with_current_value(fake_redis):
+    with make_client() as client:
+        response = await routes.stream_currency("usd", client.app.state.http_client)
+
+    chunk = await response.body_iterator.__anext__()
+    await response.body_iterator.aclose()
+
+    assert response.media_type == "text/event-stream"
+    assert chunk.startswith(b"event: update\ndata: ")
+    assert b'"base":"USD"' in chunk
+
+
+def test_websocket_stream_sends_weather():
+    with make_client() as client:
+        with client.websocket_connect("/stream/weather?city=Oslo&sections=current") as ws:
+            message = ws.receive_json()
+
+    assert message == {
+        "city": "Oslo", "temperature": 18.0, "description": "Rainy", "icon": 1, "wind_speed": 5.0,
+        "wind_dir": "N", "cloud_cover": 50, "precipitation": 1.0, "precip_type": "rain",
+    }
+
+
+def test_stream_of_unknown_city_is_404():
+    def handler(request):
+        return httpx.Response(404, json={})
+
+    with make_client(handler) as client:
+        assert client.get("/stream/weather", params={"city": "atlantis"}).status_code == 404
@@ -0,0 +1,89 @@
+import time
+
+import httpx
+import pytest
+
+from src.core import tracing
+from src.core.config import settings
+from tests.test_api import make_client, upstream_handler
+
+
+@pytest.fixture(autouse=True)
+def clear_buffers():
+    tracing.recent_traces.clear()
+    tracing.profiles.clear()
+    yield
+    tracing.recent_traces.clear()
+    tracing.profiles.clear()
+
+
+def timings(response) -> dict:
+    result = {}
+    for part in response.headers["server-timing"].split(","):
+        name, _, dur = part.strip().partition(";dur=")
+        result[name] = float(dur)
+    return result
+
+
+def test_server_timing_breaks_down_request(fake_redis):
+    with make_client() as client:
+        first = client.get("/weather", params={"city": "oslo"})
+        second = client.get("/weather", params={"city": "oslo"})
+
+    assert {"weather_api", "shape", "serialize", "redis", "total"} <= timings(first).keys()
+    # повторный ответ — готовое тело из кэша, без API и сериализации
+    assert "weather_api" not in timings(second)
+    assert "serialize" not in timings(second)
+    assert "x-trace-id" not in first.headers
+
+
+def test_span_outside_request_is_noop():
+    with tracing.span("redis") as s:
+        pass
+    assert s is None
+    assert tracing.current_trace() is None
+
+
+def test_sampled_traces_are_buffered(fake_redis, monkeypatch):
+    monkeypatch.setattr(settings, "tracing_sample_rate", 1.0)
+    monkeypatch.setattr(settings, "admin_token", "secret")
+
+    with make_client() as client:
+        response = client.get("/currency", params={"from_cur": "USD", "to": "EUR", "amount": 1})
+        traces = client.get("/debug/traces", headers={"X-Admin-Token": "secret"}).json()["items"]
+
+    trace = next(t for t in traces if t["id"] == response.headers["x-trace-id"])
+    assert trace["path"] == "/currency"
+    assert trace["status"] == 200
+    assert "currency_api" in {s["name"] for s in trace["spans"]}
+
+
+def test_profile_requires_admin_token(fake_redis, monkeypatch):
+    monkeypatch.setattr(settings, "admin_token", "secret")
+    monkeypatch.setattr(settings, "profile_interval", 0.0005)
+
+    def slow_handler(request: httpx.Request):
+        time.sleep(0.02)
+        return upstream_handler(request)
+
+    with make_client(slow_handler) as client:
+        anonymous = client.get("/weather", params={"city": "oslo", "profile": "1"})
+        profiled = client.get(
+            "/weather", params={"city": "rome"},
+            headers={"X-Profile": "1", "X-Admin-Token": "secret"},
+        )
+        profile_id = profiled.headers["x-profile-id"]
+        folded = client.get(f"/debug/profiles/{profile_id}", headers={"X-Admin-Token": "secret"})
+        forbidden = client.get(f"/debug/profiles/{profile_id}")
+
+    assert "x-profile-id" not in anonymous.headers
+    assert folded.status_code == 200
+    assert "slow_handler" in folded.text
+    assert forbidden.status_code == 404
+
+
+def test_debug_disabled_without_admin_token():
+    with make_client() as client:
+        response = client.get("/debug/traces", headers={"X-Admin-Token": ""})
+
+    assert response.status_code == 404
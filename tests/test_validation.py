@@ -1,7 +1,13 @@
+import asyncio
+
 import pytest
 import httpx
 from decimal import Decimal
 
+from src.core.config import settings
+from src.utils import utils
+from src.utils.refresh import store_cached
+
 from src.services.weather_service import get_weather
 from src.services.currency_service import convert_currency
 
@@ -168,4 +174,94 @@ async def test_multiple_requests_same_client():
         currency = await convert_currency("USD", "EUR", Decimal("50"), client)
 
     assert weather["city"] == "madrid"
-    assert currency["converted"] == Decimal("42.5")
\ No newline at end of file
+    assert currency["converted"] == Decimal("42.5")
+
+# =========================
+# RATE TABLE CACHE TESTS
+# =========================
+
+@pytest.mark.asyncio
+async def test_rate_table_serves_all_pairs_from_one_call(fake_redis):
+    calls = []
+
+    def handler(request: httpx.Request):
+        calls.append(request.url.path)
+        return currency_success_handler(request)
+
+    transport = httpx.MockTransport(handler)
+
+    async with httpx.AsyncClient(transport=transport) as client:
+        eur = await convert_currency("USD", "EUR", Decimal("100"), client)
+        gbp = await convert_currency("USD", "GBP", Decimal("100"), client)
+
+    assert eur["converted"] == Decimal("85")
+    assert gbp["converted"] == Decimal("75")
+    assert len(calls) == 1
+    await utils.flush_writes()
+    assert "currency:rates:USD" in fake_redis.store
+
+
+@pytest.mark.asyncio
+async def test_cross_rate_through_pivot_table(fake_redis):
+    calls = []
+
+    def handler(request: httpx.Request):
+        calls.append(request.url.path)
+        return currency_success_handler(request)
+
+    transport = httpx.MockTransport(handler)
+
+    async with httpx.AsyncClient(transport=transport) as client:
+        await convert_currency("USD", "EUR", Decimal("1"), client)
+        result = await convert_currency("EUR", "GBP", Decimal("85"), client)
+
+    assert len(calls) == 1
+    assert result["converted"] == Decimal("75")
+    assert result["rate"] == Decimal("0.8823529412")
+
+
+# =========================
+# SINGLE-FLIGHT TESTS
+# =========================
+
+@pytest.mark.asyncio
+async def test_concurrent_weather_misses_share_one_upstream_call():
+    calls = []
+
+    async def handler(request: httpx.Request):
+        calls.append(request.url)
+        await asyncio.sleep(0.05)
+        return weather_success_handler(request)
+
+    transport = httpx.MockTransport(handler)
+
+    async with httpx.AsyncClient(transport=transport) as client:
+        results = await asyncio.gather(*(get_weather("lisbon", client) for _ in range(10)))
+
+    assert len(calls) == 1
+    assert all(r["temperature"] == 18 for r in results)
+
+
+@pytest.mark.asyncio
+async def test_redis_single_flight_waits_for_other_worker(fake_redis, monkeypatch):
+    monkeypatch.setattr(settings, "singleflight_mode", "redis")
+    monkeypatch.setattr(settings, "singleflight_poll_interval", 0.01)
+
+    # лок держит другой процесс, который вскоре положит таблицу в кэш
+    await fake_redis.set("lock:currency:rates:USD", "other-worker", px=5000)
+
+    async def other_worker_refresh():
+        await asyncio.sleep(0.05)
+        await store_cached("currency:rates:USD", {"base": "USD", "rates": {"EUR": "0.9"}}, 60)
+
+    def handler(request):
+        raise AssertionError("upstream must not be called")
+
+    transport = httpx.MockTransport(handler)
+
+    async with httpx.AsyncClient(transport=transport) as client:
+        refresh = asyncio.create_task(other_worker_refresh())
+        result = await convert_currency("USD", "EUR", Decimal("10"), client)
+        await refresh
+
+    assert result["converted"] == Decimal("9")